@@ -1,14 +1,26 @@
 import streamlit as st
 import pandas as pd
-import time
+import numpy as np
+import os
 import hashlib
-import calendar
-from datetime import datetime, date
-import re
-from streamlit_gsheets import GSheetsConnection
+import math
+from collections import deque
+from datetime import datetime, date, timedelta
+from planilhas import PlanilhaGoogle, COLUNA_ID
+from repositorio import Repositorio, COLUNAS_LANCAMENTOS, tipar_lancamentos, atualizar_tipados, juntar_tipados
+from instantaneos import Instantaneos
+from diagnostico import (
+    PlanilhaInstrumentada, iniciar_medicao, encerrar_medicao, medicao_atual, secao, cronometrado,
+    historico_para_quadro, SECOES, CONTADORES
+)
+from dados import iniciar_rodada, encerrar_rodada, conjunto, altera_dados
 
 # --- CONFIGURAÇÕES INICIAIS ---
 st.set_page_config(page_title="Sistema Mercadinho", layout="wide")
+# Mede este rerun (tempos por seção e chamadas ao Sheets) para a aba Diagnóstico
+iniciar_medicao()
+# Até o menu ser escolhido (ex.: tela de login) nenhum conjunto de dados é lido
+iniciar_rodada("login")
 
 # Lista Padrão Inicial (Caso a planilha esteja vazia)
 CATEGORIAS_PADRAO = [
@@ -27,62 +39,259 @@ MESES_PT = {
 }
 MESES_PT_INV = {v: k for k, v in MESES_PT.items()}
 
-# --- CONEXÃO COM O GOOGLE SHEETS ---
-conn = st.connection("gsheets", type=GSheetsConnection)
+# Quantos reruns a aba Diagnóstico guarda por sessão
+HISTORICO_DIAGNOSTICO = 100
+
+# Páginas do menu e os conjuntos de dados que cada uma lê ao ser montada (ver dados.py).
+# "Lançar Receita" só grava: não lê lançamentos nem cadastros.
+PAGINAS = {
+    "Lançar Despesa": {"fornecedores", "categorias", "particoes", "lancamentos", "conciliacoes"},
+    "Lançar Receita": set(),
+    "Relatórios": {"particoes", "lancamentos", "cubo", "fornecedores", "categorias", "conciliacoes"},
+    "Conciliação Bancária": {"conciliacoes", "lancamentos", "particoes", "sugestoes", "fornecedores", "categorias"},
+    "Configurações": {"fornecedores", "categorias"},
+}
 
-# --- FUNÇÕES DE DADOS COM CACHE ATIVADO ---
-def carregar_dados():
+# --- CONEXÃO COM O GOOGLE SHEETS E BASE LOCAL ---
+# Os dados ficam numa base SQLite local; a planilha é atualizada em segundo plano.
+# A conexão (e o pacote do Sheets) só é aberta depois do login, em obter_repositorio().
+CAMINHO_BANCO_LOCAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mercadinho.db")
+CAMINHO_INSTANTANEOS = os.path.join(os.path.dirname(CAMINHO_BANCO_LOCAL), "instantaneos")
+
+@st.cache_resource
+def obter_repositorio():
+    from streamlit_gsheets import GSheetsConnection
+    conn = st.connection("gsheets", type=GSheetsConnection)
+    repo = Repositorio(CAMINHO_BANCO_LOCAL, PlanilhaInstrumentada(PlanilhaGoogle(conn)))
+    repo.iniciar_sincronizacao()
+    return repo
+
+# --- FUNÇÕES DE DADOS COM CACHE POR VERSÃO ---
+# Cada aba tem um número de versão que sobe a cada gravação. O cache é indexado por (aba, versão):
+# gravar numa aba invalida só ela, e as demais continuam com a cópia já carregada.
+def _do_instantaneo(nome, versao, montar):
+    """Quadro da versão lido do instantâneo em disco; sem ele, montado e gravado para o próximo início."""
+    assinatura = f"{repo.id_base}-{versao}"
+    with secao("carga"):
+        df = instantaneos.ler(nome, assinatura)
+    if df is None:
+        df = montar()
+        instantaneos.gravar_em_segundo_plano(nome, assinatura, df)
+    return df
+
+@st.cache_data(max_entries=6, show_spinner=False)
+@cronometrado("carga")
+def _ler_aba(aba, versao):
+    return _do_instantaneo(f"aba_{aba}", versao, lambda: repo.ler(aba))
+
+# Último quadro tipado de cada partição montado neste processo: a versão seguinte sai dele relendo
+# só os lançamentos alterados desde então (ex.: o que outro operador mudou na planilha).
+@st.cache_resource
+def _ultimo_tipado():
+    return {}
+
+# Lançamentos já tipados ficam em cache_resource, um quadro por partição (ano de competência) e
+# versão, compartilhado (somente leitura) por todas as sessões. Uma gravação só remonta o ano que
+# ela tocou. Quem precisar alterar colunas deve trabalhar numa cópia.
+@st.cache_resource(max_entries=24, show_spinner=False)
+def _particao_tipada(ano, versao):
+    def montar():
+        anterior = _ultimo_tipado().get((repo.id_base, ano))
+        ids = None
+        if anterior is not None and anterior[0] < versao:
+            ids = repo.ids_alterados("lancamentos", anterior[0], versao)
+        # Muitas alterações: remontar tudo sai mais barato do que reler por id
+        if ids is not None and len(ids) * 4 <= len(anterior[1]):
+            with secao("carga"):
+                brutos = repo.ler_lancamentos_por_id(ids, anos=[ano])
+            with secao("conversao"):
+                return atualizar_tipados(anterior[1], ids, brutos, MESES_PT)
+        with secao("carga"):
+            bruto = repo.ler_particoes([ano])
+        with secao("conversao"):
+            return tipar_lancamentos(bruto, MESES_PT)
+    df = _do_instantaneo(f"lancamentos_{ano}", versao, montar)
+    anterior = _ultimo_tipado().get((repo.id_base, ano))
+    if anterior is None or anterior[0] < versao:
+        _ultimo_tipado()[(repo.id_base, ano)] = (versao, df)
+    return df
+
+# `particoes` é uma tupla de (ano, versão): muda só quando algum dos anos pedidos muda
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _lancamentos_tipados(particoes):
+    if not particoes:
+        return tipar_lancamentos(pd.DataFrame(columns=COLUNAS_LANCAMENTOS), MESES_PT)
+    quadros = [_particao_tipada(ano, versao) for ano, versao in particoes]
+    with secao("conversao"):
+        return juntar_tipados(quadros)
+
+@st.cache_resource(max_entries=20, show_spinner=False)
+def _consultar_lancamentos(versao, **filtros):
+    with secao("carga"):
+        bruto = repo.consultar_lancamentos(**filtros)
+    with secao("conversao"):
+        return tipar_lancamentos(bruto, MESES_PT)
+
+@cronometrado("carga")
+def ler_aba(aba):
+    repo.garantir_carregada(aba)
+    return _ler_aba(aba, repo.versao(aba))
+
+@conjunto("particoes")
+@cronometrado("carga")
+def carregar_particoes():
+    """Partições de lançamentos (ano de competência, versão, quantidade e faixa de datas de liquidação)."""
+    return repo.particoes()
+
+def anos_de_competencia():
+    """Anos de competência com lançamentos, para as opções dos filtros (sem ler os lançamentos)."""
+    anos = carregar_particoes()['ano']
+    return anos[anos.str.fullmatch(r"\d{4}")].tolist()
+
+def anos_com_liquidacao(inicio, fim):
+    """Partições que podem ter datas de liquidação entre `inicio` e `fim` (datas)."""
+    particoes = carregar_particoes()
+    return particoes.loc[
+        (particoes['liquidacao_min'] <= str(fim)) & (particoes['liquidacao_max'] >= str(inicio)), 'ano'
+    ].tolist()
+
+def _chave_particoes(anos):
+    # None: todas as partições
+    particoes = carregar_particoes()
+    if anos is not None:
+        particoes = particoes[particoes['ano'].isin(list(anos))]
+    return tuple(zip(particoes['ano'], particoes['versao'].astype(int)))
+
+@conjunto("lancamentos")
+@cronometrado("carga")
+def carregar_dados(anos=None):
+    """Lançamentos tipados dos anos de competência pedidos (todos, sem `anos`), juntando as partições."""
     try:
-        df = conn.read(worksheet="lancamentos", ttl=600)
-        return df
+        return _lancamentos_tipados(_chave_particoes(anos))
+    except Exception as e:
+        st.error(f"Erro de conexão com o banco de dados (Lançamentos): {e}")
+        return pd.DataFrame()
+
+COLUNAS_FILTRO = ['tipo', 'categoria', 'status', 'fornecedor', 'ano_comp', 'mes_comp_nome']
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+@cronometrado("indices")
+def _indice_filtros(particoes):
+    from indices import IndiceFiltros
+    return IndiceFiltros(_lancamentos_tipados(particoes), COLUNAS_FILTRO)
+
+@conjunto("lancamentos")
+@cronometrado("carga")
+def carregar_indice_filtros(anos=None):
+    """Índice dos filtros do Relatório sobre o quadro de carregar_dados(anos), da mesma versão."""
+    return _indice_filtros(_chave_particoes(anos))
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+@cronometrado("indices")
+def _indice_vencimentos(particoes):
+    from indices import IndiceVencimentos
+    return IndiceVencimentos(_lancamentos_tipados(particoes))
+
+@conjunto("lancamentos")
+@cronometrado("carga")
+def carregar_indice_vencimentos(anos=None):
+    """Despesas por dia de liquidação (posições e totais) sobre o quadro de carregar_dados(anos), da mesma versão."""
+    return _indice_vencimentos(_chave_particoes(anos))
+
+@st.cache_data(max_entries=2, show_spinner=False)
+@cronometrado("agregacao")
+def _cubo_mensal(versao):
+    cubo = repo.ler_cubo()
+    competencia = pd.to_datetime(cubo['competencia'].str[:7], format="%Y-%m", errors="coerce")
+    cubo['ano_comp'] = competencia.dt.strftime("%Y")
+    cubo['mes_comp_num'] = competencia.dt.month.astype("Int8")
+    cubo['mes_comp_nome'] = cubo['mes_comp_num'].map(MESES_PT)
+    return cubo, repo.limites_data_liquidacao()
+
+@conjunto("cubo")
+@cronometrado("carga")
+def carregar_cubo():
+    """Somas mensais por competência/tipo/categoria/fornecedor/status e o intervalo de datas de liquidação."""
+    repo.garantir_carregada("lancamentos")
+    return _cubo_mensal(repo.versao("lancamentos"))
+
+def agregar_lancamentos(df):
+    """Resume lançamentos no mesmo formato do cubo mensal (usado quando o cubo não atende o filtro)."""
+    return (
+        df.assign(competencia=df['competencia'].astype(str))
+        .groupby(['competencia', 'tipo', 'categoria'], observed=True, dropna=False)['valor']
+        .agg(valor='sum', qtd='size')
+        .reset_index()
+    )
+
+@conjunto("lancamentos")
+@cronometrado("carga")
+def consultar_lancamentos(**filtros):
+    try:
+        repo.garantir_carregada("lancamentos")
+        # Restrita a alguns anos, a consulta só é refeita quando uma dessas partições muda
+        versao = _chave_particoes(filtros['anos']) if filtros.get('anos') is not None else repo.versao("lancamentos")
+        return _consultar_lancamentos(versao, **filtros)
     except Exception as e:
         st.error(f"Erro de conexão com o banco de dados (Lançamentos): {e}")
         return pd.DataFrame()
 
 # === FUNÇÕES DE FORNECEDORES ===
+@conjunto("fornecedores")
 def carregar_fornecedores_df():
     try:
-        df = conn.read(worksheet="fornecedores", ttl=600)
-        colunas_necessarias = ['nome', 'cnpj', 'telefone', 'login_app', 'senha_app']
-        for col in colunas_necessarias:
-            if col not in df.columns:
-                df[col] = pd.Series(dtype='str')
+        df = ler_aba("fornecedores")
         df = df.fillna("")
         df = df.astype(str)
         return df
     except Exception as e:
         return pd.DataFrame(columns=['nome', 'cnpj', 'telefone', 'login_app', 'senha_app'])
 
+@conjunto("fornecedores")
 def carregar_lista_nomes_fornecedores():
     df = carregar_fornecedores_df()
     return df['nome'].dropna().unique().tolist()
 
+def _nomes_novos(nomes, existentes):
+    """Nomes ainda não cadastrados, sem repetição e ignorando maiúsculas/minúsculas (fica a primeira grafia)."""
+    vistos = {str(n).strip().lower() for n in existentes if pd.notna(n)}
+    novos = []
+    for nome in nomes:
+        nome = str(nome).strip() if pd.notna(nome) else ""
+        if nome and nome.lower() not in vistos:
+            vistos.add(nome.lower())
+            novos.append(nome)
+    return novos
+
+@altera_dados
+@cronometrado("gravacao")
+def cadastrar_fornecedores(nomes):
+    """Cadastra numa única gravação todos os fornecedores da lista que ainda não existem. Devolve os novos."""
+    novos = _nomes_novos(nomes, ler_aba("fornecedores")['nome'].dropna())
+    if novos:
+        repo.anexar("fornecedores", pd.DataFrame([{"nome": nome, "cnpj": "", "telefone": "", "login_app": "", "senha_app": ""} for nome in novos]))
+    return novos
+
 def salvar_fornecedor_rapido(novo_nome):
-    try:
-        df = conn.read(worksheet="fornecedores", ttl=0)
-        if novo_nome and novo_nome.strip().lower() not in df['nome'].dropna().str.lower().values:
-            novo_registro = pd.DataFrame([{"nome": novo_nome, "cnpj": "", "telefone": "", "login_app": "", "senha_app": ""}])
-            df_atualizado = pd.concat([df, novo_registro], ignore_index=True)
-            conn.update(worksheet="fornecedores", data=df_atualizado)
-    except:
-        novo_registro = pd.DataFrame([{"nome": novo_nome, "cnpj": "", "telefone": "", "login_app": "", "senha_app": ""}])
-        conn.update(worksheet="fornecedores", data=novo_registro)
+    cadastrar_fornecedores([novo_nome])
 
+@altera_dados
+@cronometrado("gravacao")
 def salvar_tabela_fornecedores(df_editado):
-    conn.update(worksheet="fornecedores", data=df_editado)
+    repo.substituir("fornecedores", df_editado)
 
 # === FUNÇÕES DE CATEGORIAS ===
+@conjunto("categorias")
 def carregar_categorias_df():
     try:
-        df = conn.read(worksheet="categorias", ttl=600)
-        if 'nome' not in df.columns:
-            df['nome'] = pd.Series(dtype='str')
+        df = ler_aba("categorias")
         df = df.fillna("")
         df = df.astype(str)
         return df
     except Exception as e:
         return pd.DataFrame({'nome': CATEGORIAS_PADRAO})
 
+@conjunto("categorias")
 def carregar_lista_categorias():
     df = carregar_categorias_df()
     lista = df['nome'].dropna().unique().tolist()
@@ -90,70 +299,132 @@ def carregar_lista_categorias():
         return CATEGORIAS_PADRAO
     return lista
 
+@altera_dados
+@cronometrado("gravacao")
+def cadastrar_categorias(nomes):
+    """Cadastra numa única gravação todas as categorias da lista que ainda não existem. Devolve as novas."""
+    df = ler_aba("categorias")
+    if df['nome'].dropna().empty:
+        # Planilha ainda vazia: grava a lista padrão junto com as novas categorias
+        novos = _nomes_novos(nomes, CATEGORIAS_PADRAO)
+        repo.substituir("categorias", pd.DataFrame({'nome': CATEGORIAS_PADRAO + novos}))
+        return novos
+    novos = _nomes_novos(nomes, df['nome'].dropna())
+    if novos:
+        repo.anexar("categorias", pd.DataFrame({'nome': novos}))
+    return novos
+
 def salvar_categoria_rapida(nova_categoria):
-    try:
-        df = conn.read(worksheet="categorias", ttl=0)
-        if 'nome' not in df.columns:
-             df = pd.DataFrame({'nome': CATEGORIAS_PADRAO})
-
-        if nova_categoria and nova_categoria.strip().lower() not in df['nome'].dropna().str.lower().values:
-            novo_registro = pd.DataFrame([{"nome": nova_categoria}])
-            df_atualizado = pd.concat([df, novo_registro], ignore_index=True)
-            conn.update(worksheet="categorias", data=df_atualizado)
-    except Exception as e:
-        novo_registro = pd.DataFrame([{"nome": nova_categoria}])
-        conn.update(worksheet="categorias", data=novo_registro)
+    cadastrar_categorias([nova_categoria])
 
+@altera_dados
+@cronometrado("gravacao")
 def salvar_tabela_categorias(df_editado):
-    conn.update(worksheet="categorias", data=df_editado)
+    repo.substituir("categorias", df_editado)
 
 # === FUNÇÕES DE LANÇAMENTOS ===
+@altera_dados
+@cronometrado("gravacao")
 def salvar_lancamento(dados):
-    try:
-        df = conn.read(worksheet="lancamentos", ttl=0)
-        novo_df = pd.DataFrame([dados])
-        df_atualizado = pd.concat([df, novo_df], ignore_index=True)
-        conn.update(worksheet="lancamentos", data=df_atualizado)
-    except:
-        novo_df = pd.DataFrame([dados])
-        conn.update(worksheet="lancamentos", data=novo_df)
+    repo.salvar_lancamentos(pd.DataFrame([dados]))
 
+@altera_dados
+@cronometrado("gravacao")
 def salvar_lote_lancamentos(df_novos):
-    try:
-        df = conn.read(worksheet="lancamentos", ttl=0)
-        df_atualizado = pd.concat([df, df_novos], ignore_index=True)
-        conn.update(worksheet="lancamentos", data=df_atualizado)
-    except:
-        conn.update(worksheet="lancamentos", data=df_novos)
+    """Grava os lançamentos numa única operação e devolve os ids gerados, na ordem das linhas."""
+    return repo.salvar_lancamentos(df_novos)
 
-def excluir_lancamentos(indices_para_excluir):
+@altera_dados
+@cronometrado("gravacao")
+def excluir_lancamentos(ids_para_excluir):
     try:
-        df = conn.read(worksheet="lancamentos", ttl=0)
-        df_atualizado = df.drop(indices_para_excluir).reset_index(drop=True)
-        conn.update(worksheet="lancamentos", data=df_atualizado)
+        nao_encontrados = repo.excluir_lancamentos(ids_para_excluir)
+        if nao_encontrados:
+            st.warning(f"{len(nao_encontrados)} lançamento(s) já não existiam.")
     except Exception as e:
         st.error(f"Erro ao excluir: {e}")
 
-def editar_lancamento(indice, novos_dados):
-    try:
-        df = conn.read(worksheet="lancamentos", ttl=0)
-        for chave, valor in novos_dados.items():
-            df.at[indice, chave] = valor
-        conn.update(worksheet="lancamentos", data=df)
-    except Exception as e:
-        st.error(f"Erro ao editar: {e}")
+def editar_lancamento(id_lancamento, novos_dados):
+    editar_multiplos_lancamentos({id_lancamento: novos_dados})
 
+@altera_dados
+@cronometrado("gravacao")
 def editar_multiplos_lancamentos(atualizacoes_dict):
-    """Função otimizada para salvar múltiplas edições no Google Sheets de uma só vez"""
+    """Salva várias edições ({id: {coluna: valor}}) alterando apenas as linhas envolvidas"""
     try:
-        df = conn.read(worksheet="lancamentos", ttl=0)
-        for indice, novos_dados in atualizacoes_dict.items():
-            for chave, valor in novos_dados.items():
-                df.at[indice, chave] = valor
-        conn.update(worksheet="lancamentos", data=df)
+        nao_encontrados = repo.atualizar_lancamentos(atualizacoes_dict)
+        if nao_encontrados:
+            st.warning(f"{len(nao_encontrados)} lançamento(s) não foram encontrados (talvez excluídos por outro usuário).")
     except Exception as e:
         st.error(f"Erro ao salvar as edições: {e}")
 
+# === FUNÇÕES DA CONCILIAÇÃO ===
+@conjunto("conciliacoes")
+def carregar_livro_conciliacao():
+    try:
+        return ler_aba("conciliacoes")
+    except Exception as e:
+        st.error(f"Erro ao ler o histórico de conciliações: {e}")
+        return pd.DataFrame(columns=['conta', 'fitid', 'lancamento_id', 'situacao', 'data_registro', 'historico'])
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def _situacao_por_lancamento(versao):
+    from conciliacao import ROTULOS_SITUACAO
+    livro = _ler_aba("conciliacoes", versao)
+    livro = livro[livro['lancamento_id'].notna()].drop_duplicates('lancamento_id', keep='last')
+    return livro.set_index('lancamento_id')['situacao'].map(ROTULOS_SITUACAO)
+
+@conjunto("conciliacoes")
+@cronometrado("carga")
+def situacao_por_lancamento():
+    """Série id do lançamento -> rótulo da conciliação bancária (só os lançamentos já conciliados)."""
+    repo.garantir_carregada("conciliacoes")
+    return _situacao_por_lancamento(repo.versao("conciliacoes"))
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+@cronometrado("indices")
+def _indice_sugestoes(particoes, versao_livro):
+    from conciliacao import IndiceSugestoes
+    return IndiceSugestoes.treinar(_lancamentos_tipados(particoes), _ler_aba("conciliacoes", versao_livro))
+
+@conjunto("sugestoes")
+@cronometrado("carga")
+def carregar_indice_sugestoes():
+    """Índice histórico do banco -> (fornecedor, categoria), refeito só quando lançamentos ou livro mudam."""
+    repo.garantir_carregada("conciliacoes")
+    return _indice_sugestoes(_chave_particoes(None), repo.versao("conciliacoes"))
+
+@st.cache_data(max_entries=4, show_spinner=False)
+@cronometrado("conversao")
+def ler_extratos_ofx(conteudos):
+    """Transações de cada extrato (tupla de bytes); mudar um widget da página não lê os arquivos de novo."""
+    from ofx import ler_varios_ofx
+    return ler_varios_ofx(list(conteudos))
+
+@altera_dados
+@cronometrado("gravacao")
+def registrar_conciliacoes(df_registros):
+    """Grava no livro da conciliação numa única operação, pulando transações já registradas."""
+    livro = carregar_livro_conciliacao()
+    ja_registradas = set(zip(livro['conta'].astype(str), livro['fitid'].astype(str)))
+    novos = df_registros.drop_duplicates(['conta', 'fitid'])
+    novos = novos[[chave not in ja_registradas for chave in zip(novos['conta'], novos['fitid'])]]
+    if not novos.empty:
+        repo.anexar("conciliacoes", novos)
+
+@altera_dados
+@cronometrado("gravacao")
+def desfazer_conciliacoes(transacoes):
+    """Tira do livro as transações (conta_livro, fitid): no próximo envio do extrato elas voltam a ser casadas.
+
+    Um lançamento criado a partir do extrato continua existindo. A aba do livro é regravada inteira,
+    como nos editores de fornecedores e categorias.
+    """
+    livro = carregar_livro_conciliacao()
+    chaves = set(zip(transacoes['conta_livro'].astype(str), transacoes['fitid'].astype(str)))
+    manter = [chave not in chaves for chave in zip(livro['conta'].astype(str), livro['fitid'].astype(str))]
+    repo.substituir("conciliacoes", livro[manter])
+
 # --- FUNÇÕES AUXILIARES ---
 def gerar_lista_anos():
     ano_atual = datetime.now().year
@@ -180,6 +451,48 @@ def formatar_input_br(key):
         st.session_state[key] = formatado
     except: pass
 
+def formatar_valor_curto(valor):
+    """R$ com no máximo 3 algarismos (ex.: 'R$ 1,2 mil'), para caber nas células do calendário."""
+    for limite, sufixo in ((1e6, " mi"), (1e3, " mil")):
+        if abs(valor) >= limite:
+            return f"R$ {valor / limite:.1f}".replace(".", ",") + sufixo
+    return f"R$ {valor:.0f}"
+
+def registrar_medicao():
+    """Fecha a medição deste rerun e guarda no histórico da sessão (aba Diagnóstico)."""
+    encerrar_rodada()
+    resumo = encerrar_medicao()
+    if resumo is None: return
+    historico = st.session_state.setdefault("diagnostico_historico", deque(maxlen=HISTORICO_DIAGNOSTICO))
+    historico.append(resumo)
+    totais = st.session_state.setdefault("diagnostico_sessao", dict.fromkeys(CONTADORES, 0))
+    for nome in CONTADORES:
+        totais[nome] += resumo[f"sheets_{nome}"]
+
+def reexecutar():
+    """st.rerun() que registra a medição antes: a exceção do rerun interromperia o script antes do fim."""
+    registrar_medicao()
+    st.rerun()
+
+def registrar_aviso(mensagem):
+    """Guarda a mensagem para ser exibida depois do reexecutar(), sem pausar a tela."""
+    st.session_state.setdefault("avisos", []).append(mensagem)
+
+def exibir_avisos():
+    for mensagem in st.session_state.pop("avisos", []):
+        st.toast(mensagem, icon="✅")
+
+def exibir_status_sincronizacao():
+    status = repo.status_sincronizacao()
+    if status["erro"]:
+        st.sidebar.error(f"⚠️ {status['pendentes']} envio(s) para a planilha falharam (tentativa {status['tentativas']}): {status['erro']}")
+        if st.sidebar.button("🔁 Tentar enviar agora"):
+            repo.sincronizar_agora()
+    elif status["pendentes"]:
+        st.sidebar.info(f"🔄 Enviando {status['pendentes']} alteração(ões) para a planilha...")
+    else:
+        st.sidebar.caption("☁️ Planilha sincronizada")
+
 def atualizar_data_liq():
     if st.session_state.get("check_repetir_data") and "memoria_data_liq" in st.session_state:
         st.session_state["data_liq_desp"] = st.session_state["memoria_data_liq"]
@@ -210,18 +523,531 @@ def check_password():
             if email == user_email and password == user_pass:
                 st.session_state["password_correct"] = True
                 st.query_params["auth"] = token_esperado
-                st.rerun()
+                reexecutar()
             else:
                 st.error("Dados incorretos.")
     return False
 
+# --- SEÇÕES INTERATIVAS (FRAGMENTOS) ---
+# Cada seção roda de novo sozinha quando um widget dela muda: marcar 'Editar?', clicar num dia
+# ou editar a tabela do extrato OFX não refaz a autenticação, as leituras nem os gráficos.
+# Quem grava dados chama reexecutar(), que recarrega a página inteira com a nova versão.
+@st.fragment
+def exibir_extrato_interativo(df, df_filtered, indice_filtros, mascara_filtros, posicoes_filtradas):
+    from indices import ordenar_posicoes
+    st.subheader("Extrato Detalhado Interativo")
+    st.markdown("Marque a caixa **'Editar?'** ao lado de qualquer lançamento para alterar os seus dados ou excluí-lo.")
+
+    # Ordenação e paginação acontecem aqui; só a página visível vai para o navegador
+    colunas_ordenacao = {"data_liquidacao": "Data Liq.", "valor": "Valor", "fornecedor": "Fornecedor", "categoria": "Categoria", "competencia": "Competência"}
+    col_p1, col_p2, col_p3, col_p4 = st.columns([2, 1, 1, 1])
+    with col_p1:
+        ordenar_por = st.selectbox("Ordenar por", list(colunas_ordenacao), format_func=colunas_ordenacao.get)
+    with col_p2:
+        decrescente = st.toggle("Decrescente", value=True)
+    with col_p3:
+        por_pagina = st.selectbox("Linhas por página", [25, 50, 100, 250], index=1)
+    total_paginas = max(1, math.ceil(len(df_filtered) / por_pagina))
+    with col_p4:
+        pagina = st.number_input(f"Página (de {total_paginas})", min_value=1, max_value=total_paginas, value=1, step=1)
+
+    if ordenar_por == "data_liquidacao":
+        ordem = indice_filtros.ordenar_por_data(mascara_filtros, decrescente)
+    else:
+        ordem = posicoes_filtradas[ordenar_posicoes(df_filtered[ordenar_por], decrescente)]
+    inicio = (pagina - 1) * por_pagina
+    df_pagina = df.iloc[ordem[inicio:inicio + por_pagina]]
+    st.caption(f"Exibindo {inicio + 1 if len(df_pagina) else 0}–{inicio + len(df_pagina)} de {len(df_filtered)} lançamentos")
+
+    df_extrato_view = df_pagina.copy()
+    df_extrato_view.insert(0, "✏️ Editar", False)
+    df_extrato_view.insert(1, "Conciliação", df_extrato_view.index.map(situacao_por_lancamento()).fillna(""))
+
+    colunas_desabilitadas = df_extrato_view.columns.tolist()
+    colunas_desabilitadas.remove("✏️ Editar")
+
+    editor_extrato = st.data_editor(
+        df_extrato_view, 
+        use_container_width=True,
+        hide_index=True,
+        disabled=colunas_desabilitadas,
+        column_config={
+            "✏️ Editar": st.column_config.CheckboxColumn("Editar?", required=True),
+            "data_liquidacao": st.column_config.DateColumn("Data Liq.", format="DD/MM/YYYY"),
+            "valor": st.column_config.NumberColumn("Valor", format="R$ %.2f"),
+            "ano_comp": None, 
+            "mes_comp_num": None, 
+            "mes_comp_nome": None 
+        }
+    )
+
+    linhas_editar = editor_extrato[editor_extrato["✏️ Editar"] == True]
+
+    if not linhas_editar.empty:
+        st.markdown("---")
+        if len(linhas_editar) > 1:
+            st.warning("⚠️ Selecione apenas UM lançamento para editar por vez.")
+        else:
+            idx = linhas_editar.index[0]
+            linha_atual = df_filtered.loc[idx]
+            tipo_lanc = linha_atual['tipo']
+
+            st.markdown(f"### 📝 Editar Lançamento ({tipo_lanc})")
+            with st.form(key=f"form_edit_relatorio_{idx}"):
+                c_ed1, c_ed2 = st.columns(2)
+                with c_ed1:
+                    novo_valor = st.number_input("Valor (R$)", value=float(linha_atual['valor']), min_value=0.0)
+                    nova_data = st.date_input("Data", value=pd.to_datetime(linha_atual['data_liquidacao']).date(), format="DD/MM/YYYY")
+
+                    ano_atual = str(linha_atual['competencia'])[:4]
+                    mes_atual_num = int(str(linha_atual['competencia'])[5:7])
+                    mes_atual_nome = MESES_PT[mes_atual_num]
+
+                    novo_mes = st.selectbox("Mês Comp.", list(MESES_PT.values()), index=list(MESES_PT.values()).index(mes_atual_nome))
+                    novo_ano = st.selectbox("Ano Comp.", gerar_lista_anos(), index=gerar_lista_anos().index(ano_atual))
+
+                    status_atual = str(linha_atual.get('status', 'Pago' if tipo_lanc == 'Despesa' else 'Recebido'))
+                    opcoes_status = ["Pago", "A Pagar"] if tipo_lanc == 'Despesa' else ["Recebido", "A Receber"]
+                    if status_atual not in opcoes_status:
+                        opcoes_status.append(status_atual)
+                    novo_status = st.selectbox("Status", opcoes_status, index=opcoes_status.index(status_atual))
+
+                with c_ed2:
+                    lista_forn = carregar_lista_nomes_fornecedores()
+                    forn_atual = str(linha_atual.get('fornecedor', ''))
+                    if forn_atual and forn_atual not in lista_forn:
+                        lista_forn = [forn_atual] + lista_forn
+                    novo_fornecedor = st.selectbox("Fornecedor/Cliente", lista_forn, index=lista_forn.index(forn_atual) if forn_atual in lista_forn else 0)
+
+                    lista_cats = carregar_lista_categorias()
+                    cat_atual = str(linha_atual.get('categoria', ''))
+                    if cat_atual and cat_atual not in lista_cats:
+                        lista_cats = [cat_atual] + lista_cats
+                    nova_categoria = st.selectbox("Categoria", lista_cats, index=lista_cats.index(cat_atual) if cat_atual in lista_cats else 0)
+
+                    nova_obs = st.text_area("Observação", value=str(linha_atual.get('observacao', '')))
+
+                col_btn1, col_btn2 = st.columns([1, 1])
+                with col_btn1:
+                    submit_edit = st.form_submit_button("💾 Salvar Alterações", type="primary", use_container_width=True)
+                with col_btn2:
+                    submit_del = st.form_submit_button("🗑️ Excluir Lançamento", type="secondary", use_container_width=True)
+
+                if submit_edit:
+                    mes_num = MESES_PT_INV[novo_mes]
+                    nova_comp = f"{novo_ano}-{mes_num:02d}"
+
+                    dados_atualizados = {
+                        "valor": novo_valor,
+                        "fornecedor": novo_fornecedor,
+                        "data_liquidacao": nova_data.strftime("%Y-%m-%d"),
+                        "competencia": nova_comp,
+                        "status": novo_status,
+                        "categoria": nova_categoria,
+                        "observacao": nova_obs
+                    }
+
+                    editar_lancamento(idx, dados_atualizados)
+                    registrar_aviso("Lançamento atualizado com sucesso!")
+                    reexecutar()
+
+                if submit_del:
+                    excluir_lancamentos([idx])
+                    registrar_aviso("Lançamento excluído com sucesso!")
+                    reexecutar()
+
+@st.fragment
+def exibir_calendario_vencimentos():
+    import calendar
+    import altair as alt
+    st.subheader("🗓️ Calendário de Vencimentos")
+    st.markdown("Os dias marcados em destaque (**🚨**) possuem despesas com o status **A Pagar**. Clique num dia para ver os detalhes.")
+
+    col_c1, col_c2 = st.columns(2)
+    with col_c1:
+        cal_mes = st.selectbox("Mês do Calendário", list(MESES_PT.values()), index=datetime.today().month - 1, key="cal_mes")
+    with col_c2:
+        cal_ano = st.selectbox("Ano do Calendário", gerar_lista_anos(), index=gerar_lista_anos().index(str(datetime.today().year)), key="cal_ano")
+
+    mes_num = MESES_PT_INV[cal_mes]
+    ano_num = int(cal_ano)
+
+    # Só as partições (anos de competência) com liquidações no ano do calendário
+    anos = anos_com_liquidacao(date(ano_num, 1, 1), date(ano_num, 12, 31))
+    df = carregar_dados(anos)
+    indice_venc = carregar_indice_vencimentos(anos)
+
+    # Totais por dia já vêm do índice: o mês só recorta a faixa de dias
+    resumo_mes = indice_venc.resumo_periodo(
+        date(ano_num, mes_num, 1), date(ano_num, mes_num, calendar.monthrange(ano_num, mes_num)[1])
+    )
+    resumo_mes = resumo_mes[resumo_mes['qtd_a_pagar'] > 0]
+    pendencias_por_dia = dict(zip(resumo_mes.index.day, resumo_mes[['qtd_a_pagar', 'total_a_pagar']].itertuples(index=False)))
+
+    st.markdown('''
+        <style>
+        div[data-testid="column"] button {
+            width: 100%;
+            height: 60px;
+            font-size: 15px;
+        }
+        </style>
+    ''', unsafe_allow_html=True)
+
+    dias_semana = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
+    cols_header = st.columns(7)
+    for i, dia in enumerate(dias_semana):
+        cols_header[i].markdown(f"<div style='text-align: center; font-weight: bold;'>{dia}</div>", unsafe_allow_html=True)
+
+    cal = calendar.monthcalendar(ano_num, mes_num)
+
+    for semana in cal:
+        cols = st.columns(7)
+        for i, dia in enumerate(semana):
+            if dia == 0:
+                cols[i].write("") 
+            else:
+                data_atual = date(ano_num, mes_num, dia)
+                pendencia = pendencias_por_dia.get(dia)
+
+                if pendencia:
+                    qtd, total = pendencia
+                    if cols[i].button(f"🚨 {dia} · {qtd}x {formatar_valor_curto(total)}", key=f"btn_cal_{data_atual}", type="primary", help=f"{qtd} despesa(s) a pagar neste dia, total R$ {total:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")):
+                        st.session_state['cal_data_selecionada'] = data_atual
+                else:
+                    if cols[i].button(f"{dia}", key=f"btn_cal_{data_atual}", help="Sem pendências para este dia."):
+                        st.session_state['cal_data_selecionada'] = data_atual
+
+    with st.expander(f"🌡️ Visão do ano de {ano_num} (A Pagar por dia)"):
+        resumo_ano = indice_venc.resumo_periodo(date(ano_num, 1, 1), date(ano_num, 12, 31)).reset_index()
+        if resumo_ano.empty:
+            st.info("Nenhuma despesa com data de liquidação neste ano.")
+        else:
+            resumo_ano['mes'] = resumo_ano['dia'].dt.month.map(MESES_PT)
+            resumo_ano['dia_mes'] = resumo_ano['dia'].dt.day
+            mapa_ano = alt.Chart(resumo_ano).mark_rect().encode(
+                x=alt.X("dia_mes:O", title="Dia"),
+                y=alt.Y("mes:O", title=None, sort=list(MESES_PT.values())),
+                color=alt.Color("total_a_pagar:Q", title="A Pagar (R$)", scale=alt.Scale(scheme="orangered")),
+                tooltip=[
+                    alt.Tooltip("dia:T", title="Data", format="%d/%m/%Y"),
+                    alt.Tooltip("qtd_a_pagar:Q", title="Qtd. A Pagar"),
+                    alt.Tooltip("total_a_pagar:Q", title="A Pagar (R$)", format=",.2f"),
+                    alt.Tooltip("qtd:Q", title="Qtd. Despesas"),
+                    alt.Tooltip("total:Q", title="Total (R$)", format=",.2f"),
+                ]
+            )
+            st.altair_chart(mapa_ano, use_container_width=True)
+
+    st.markdown("---")
+
+    if 'cal_data_selecionada' in st.session_state:
+        data_sel = st.session_state['cal_data_selecionada']
+
+        if data_sel.month == mes_num and data_sel.year == ano_num:
+            st.markdown(f"#### 🔎 Despesas para o dia {data_sel.strftime('%d/%m/%Y')}")
+            df_dia = df.iloc[indice_venc.posicoes_dia(data_sel)]
+
+            if not df_dia.empty:
+                st.markdown("💡 **Dica:** Altere qualquer dado (Data, Status, Valor, Fornecedor, etc.) diretamente na tabela abaixo e clique em Salvar.")
+
+                lista_fornecedores_cadastrados = carregar_lista_nomes_fornecedores()
+                lista_categorias_cadastradas = carregar_lista_categorias()
+
+                df_dia_view = df_dia[['data_liquidacao', 'fornecedor', 'categoria', 'status', 'valor', 'observacao']].copy()
+                df_dia_view['data_liquidacao'] = pd.to_datetime(df_dia_view['data_liquidacao']).dt.date
+
+                # --- NOVO BLOCO: TABELA DE EDIÇÃO RÁPIDA TOTAL ---
+                edited_dia = st.data_editor(
+                    df_dia_view,
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config={
+                        "data_liquidacao": st.column_config.DateColumn("Data Liq.", format="DD/MM/YYYY", required=True),
+                        "status": st.column_config.SelectboxColumn("Status", options=["Pago", "A Pagar"], required=True),
+                        "valor": st.column_config.NumberColumn("Valor (R$)", format="R$ %.2f", required=True),
+                        "fornecedor": st.column_config.SelectboxColumn("Fornecedor", options=lista_fornecedores_cadastrados, required=True),
+                        "categoria": st.column_config.SelectboxColumn("Categoria", options=lista_categorias_cadastradas, required=True),
+                        "observacao": st.column_config.TextColumn("Observação")
+                    }
+                )
+
+                mudancas_dict = {}
+                for idx in df_dia_view.index:
+                    linha_original = df_dia_view.loc[idx]
+                    linha_editada = edited_dia.loc[idx]
+
+                    alteracoes_linha = {}
+
+                    if str(linha_original['data_liquidacao']) != str(linha_editada['data_liquidacao']):
+                        alteracoes_linha['data_liquidacao'] = pd.to_datetime(linha_editada['data_liquidacao']).strftime("%Y-%m-%d")
+
+                    if linha_original['fornecedor'] != linha_editada['fornecedor']:
+                        alteracoes_linha['fornecedor'] = linha_editada['fornecedor']
+
+                    if linha_original['categoria'] != linha_editada['categoria']:
+                        alteracoes_linha['categoria'] = linha_editada['categoria']
+
+                    if linha_original['status'] != linha_editada['status']:
+                        alteracoes_linha['status'] = linha_editada['status']
+
+                    if float(linha_original['valor']) != float(linha_editada['valor']):
+                        alteracoes_linha['valor'] = float(linha_editada['valor'])
+
+                    obs_orig = "" if pd.isna(linha_original['observacao']) else str(linha_original['observacao'])
+                    obs_edit = "" if pd.isna(linha_editada['observacao']) else str(linha_editada['observacao'])
+                    if obs_orig != obs_edit:
+                        alteracoes_linha['observacao'] = obs_edit
+
+                    if alteracoes_linha:
+                        mudancas_dict[idx] = alteracoes_linha
+
+                if mudancas_dict:
+                    if st.button(f"💾 Salvar {len(mudancas_dict)} Alteração(ões)", type="primary"):
+                        editar_multiplos_lancamentos(mudancas_dict)
+                        registrar_aviso("Lançamento(s) atualizado(s) com sucesso!")
+                        reexecutar()
+
+                # Cálculos atualizados baseados no estado visual (antes de salvar)
+                total_dia = edited_dia['valor'].sum()
+                total_pendente_view = edited_dia[edited_dia['status'] == 'A Pagar']['valor'].sum()
+
+                c1, c2 = st.columns(2)
+                c1.metric("Total Agendado no Dia", f"R$ {total_dia:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
+                c2.metric("Total A Pagar (Pendente)", f"R$ {total_pendente_view:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), delta_color="inverse")
+
+            else:
+                st.success("Nenhuma despesa lançada para este dia! 🎉")
+
+@st.fragment
+def exibir_pendentes_extrato(df_nao_encontrados):
+    from conciliacao import registros_livro, SITUACAO_IGNORADO, SITUACAO_LANCADO
+    st.warning("Atenção! As seguintes saídas constam no extrato do Banco, mas NÃO foram localizadas no seu Sistema. Preencha os dados abaixo e marque a caixinha para registrá-las.")
+
+    with st.expander("➕ O Fornecedor não está na lista? Cadastre aqui."):
+        c_fn1, c_fn2 = st.columns([3, 1])
+        with c_fn1:
+            novo_forn_extrato = st.text_input("Digite o nome do novo Fornecedor", key="novo_forn_extrato")
+        with c_fn2:
+            st.markdown("<div style='margin-top: 28px;'></div>", unsafe_allow_html=True)
+            if st.button("Cadastrar Fornecedor", use_container_width=True):
+                if novo_forn_extrato.strip():
+                    salvar_fornecedor_rapido(novo_forn_extrato)
+                    registrar_aviso(f"Fornecedor '{novo_forn_extrato}' cadastrado com sucesso!")
+                    reexecutar() 
+                else:
+                    st.error("Digite um nome válido.")
+
+    with st.expander("➕ A Classificação não está na lista? Cadastre aqui."):
+        c_cat1, c_cat2 = st.columns([3, 1])
+        with c_cat1:
+            nova_cat_extrato = st.text_input("Digite o nome da nova Classificação", key="nova_cat_extrato")
+        with c_cat2:
+            st.markdown("<div style='margin-top: 28px;'></div>", unsafe_allow_html=True)
+            if st.button("Cadastrar Classificação", key="btn_nova_cat", use_container_width=True):
+                if nova_cat_extrato.strip():
+                    salvar_categoria_rapida(nova_cat_extrato)
+                    registrar_aviso(f"Classificação '{nova_cat_extrato}' cadastrada com sucesso!")
+                    reexecutar()
+                else:
+                    st.error("Digite um nome válido.")
+
+    mes_atual = MESES_PT[datetime.today().month]
+    ano_atual = str(datetime.today().year)
+    lista_anos = gerar_lista_anos()
+
+    lista_fornecedores_cadastrados = carregar_lista_nomes_fornecedores()
+    lista_categorias_cadastradas = carregar_lista_categorias()
+
+    df_edit_pendentes = df_nao_encontrados[['conta_livro', 'Data', 'Historico', 'Valor_Absoluto']].copy()
+    df_edit_pendentes.columns = ['Conta', 'Data Extrato', 'Descrição do Banco', 'Valor (R$)']
+
+    df_edit_pendentes.insert(0, "Lançar?", False)
+    df_edit_pendentes.insert(1, "Ignorar?", False)
+    df_edit_pendentes['Mês Comp.'] = mes_atual
+    df_edit_pendentes['Ano Comp.'] = ano_atual
+    # Pré-preenche com o que já foi escolhido antes para históricos parecidos,
+    # desde que o fornecedor e a classificação ainda estejam cadastrados
+    sugestoes = carregar_indice_sugestoes().sugerir_varios(df_nao_encontrados['Historico'])
+    validas = sugestoes['fornecedor'].isin(lista_fornecedores_cadastrados) & sugestoes['categoria'].isin(lista_categorias_cadastradas)
+    df_edit_pendentes['Fornecedor'] = sugestoes['fornecedor'].where(validas)
+    df_edit_pendentes['Categoria'] = sugestoes['categoria'].where(validas)
+    df_edit_pendentes['Confiança'] = (sugestoes['confianca'] * 100).where(validas, 0.0)
+    df_edit_pendentes['Observação'] = ""
+
+    edited_pendentes = st.data_editor(
+        df_edit_pendentes,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "Lançar?": st.column_config.CheckboxColumn("Lançar?", required=True),
+            "Ignorar?": st.column_config.CheckboxColumn("Ignorar?", required=True, help="Não é uma despesa: não aparece mais nos próximos envios."),
+            "Conta": st.column_config.TextColumn("Conta", disabled=True),
+            "Data Extrato": st.column_config.DateColumn("Data Extrato", format="DD/MM/YYYY", disabled=True),
+            "Descrição do Banco": st.column_config.TextColumn("Descrição do Banco", disabled=True),
+            "Valor (R$)": st.column_config.NumberColumn("Valor (R$)", format="R$ %.2f", disabled=True),
+            "Mês Comp.": st.column_config.SelectboxColumn("Mês Comp.", options=list(MESES_PT.values()), required=True),
+            "Ano Comp.": st.column_config.SelectboxColumn("Ano Comp.", options=lista_anos, required=True),
+            "Fornecedor": st.column_config.SelectboxColumn(
+                "Fornecedor (Selecione)", 
+                options=lista_fornecedores_cadastrados, 
+                required=True
+            ),
+            "Categoria": st.column_config.SelectboxColumn(
+                "Classificação (Selecione)", 
+                options=lista_categorias_cadastradas, 
+                required=True
+            ),
+            "Confiança": st.column_config.ProgressColumn(
+                "Confiança", help="Quanto a sugestão de Fornecedor/Classificação se apoia em lançamentos anteriores.",
+                min_value=0, max_value=100, format="%.0f%%"
+            ),
+            "Observação": st.column_config.TextColumn("Observação")
+        }
+    )
+
+    if st.button("💾 Lançar Despesas Selecionadas", type="primary"):
+        linhas_marcadas = edited_pendentes[edited_pendentes["Lançar?"] == True]
+        linhas_ignoradas = edited_pendentes[(edited_pendentes["Ignorar?"] == True) & (edited_pendentes["Lançar?"] != True)]
+
+        if linhas_marcadas.empty and linhas_ignoradas.empty:
+            st.warning("Selecione pelo menos uma despesa marcando a caixinha 'Lançar?' ou 'Ignorar?'.")
+        else:
+            lista_dados_finais = []
+            indices_lancados = []
+            erro_encontrado = False
+
+            for index, row in linhas_marcadas.iterrows():
+                if not row['Fornecedor'] or str(row['Fornecedor']).strip() == "":
+                    st.error(f"⚠️ Selecione um Fornecedor na lista para a despesa de R$ {row['Valor (R$)']:.2f}")
+                    erro_encontrado = True
+                    continue
+
+                if not row['Categoria'] or str(row['Categoria']).strip() == "":
+                    st.error(f"⚠️ Selecione uma Classificação na lista para a despesa de R$ {row['Valor (R$)']:.2f}")
+                    erro_encontrado = True
+                    continue
+
+                nome_forn = str(row['Fornecedor']).strip()
+                nome_cat = str(row['Categoria']).strip()
+                mes_num = MESES_PT_INV[row['Mês Comp.']]
+                comp_fmt = f"{row['Ano Comp.']}-{mes_num:02d}"
+
+                dados_linha = {
+                    "data_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "tipo": "Despesa",
+                    "valor": row['Valor (R$)'],
+                    "fornecedor": nome_forn,
+                    "data_liquidacao": pd.to_datetime(row['Data Extrato']).strftime("%Y-%m-%d"),
+                    "competencia": comp_fmt,
+                    "status": "Pago", 
+                    "categoria": nome_cat,
+                    "observacao": str(row['Observação']) if pd.notna(row['Observação']) else ""
+                }
+                lista_dados_finais.append(dados_linha)
+                indices_lancados.append(index)
+
+            if not erro_encontrado:
+                agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                registros = [registros_livro(df_nao_encontrados.loc[linhas_ignoradas.index], None, SITUACAO_IGNORADO, agora)]
+                if lista_dados_finais:
+                    df_lote = pd.DataFrame(lista_dados_finais)
+                    cadastrar_fornecedores(df_lote['fornecedor'].unique())
+                    cadastrar_categorias(df_lote['categoria'].unique())
+                    ids_novos = salvar_lote_lancamentos(df_lote)
+                    registros.append(registros_livro(df_nao_encontrados.loc[indices_lancados], ids_novos, SITUACAO_LANCADO, agora))
+                    registrar_aviso(f"🎉 {len(lista_dados_finais)} despesa(s) lançada(s) com sucesso!")
+                if not linhas_ignoradas.empty:
+                    registrar_aviso(f"{len(linhas_ignoradas)} transação(ões) marcada(s) como ignorada(s).")
+                registrar_conciliacoes(pd.concat(registros, ignore_index=True))
+                reexecutar()
+
+
+@st.fragment
+def exibir_pares_propostos(df_propostos):
+    from conciliacao import registros_livro, SITUACAO_CONCILIADO
+    st.info("Estas saídas do banco parecem corresponder a despesas já lançadas. Os pares exatos (mesmo dia e mesmo valor) vêm marcados; confira os aproximados antes de marcar. Só os pares confirmados entram no histórico da conciliação.")
+    st.caption("Um par proposto não aparece em 'Pendentes de Lançamento'. Se nenhum for o certo, diminua as tolerâncias acima para a transação voltar a ficar pendente.")
+
+    df_view = pd.DataFrame({
+        "Confirmar?": (df_propostos['dif_dias'] == 0) & (df_propostos['dif_valor'] == 0),
+        "Conta": df_propostos['conta_livro'],
+        "Data Extrato": df_propostos['Data'],
+        "Descrição do Banco": df_propostos['Historico'],
+        "Valor (R$)": df_propostos['Valor_Absoluto'],
+        "Data Liq. (Sistema)": pd.to_datetime(df_propostos['data_sistema']),
+        "Valor (Sistema)": df_propostos['valor_sistema'],
+        "Fornecedor (Sistema)": df_propostos['fornecedor'],
+        "Categoria (Sistema)": df_propostos['categoria'],
+        "Dif. Dias": df_propostos['dif_dias'],
+        "Dif. Valor (R$)": df_propostos['dif_valor'],
+    }, index=df_propostos.index)
+
+    editado = st.data_editor(
+        df_view,
+        use_container_width=True,
+        hide_index=True,
+        disabled=[c for c in df_view.columns if c != "Confirmar?"],
+        column_config={
+            "Confirmar?": st.column_config.CheckboxColumn("Confirmar?", required=True),
+            "Data Extrato": st.column_config.DateColumn("Data Extrato", format="DD/MM/YYYY"),
+            "Valor (R$)": st.column_config.NumberColumn("Valor (R$)", format="R$ %.2f"),
+            "Data Liq. (Sistema)": st.column_config.DateColumn("Data Liq. (Sistema)", format="DD/MM/YYYY"),
+            "Valor (Sistema)": st.column_config.NumberColumn("Valor (Sistema)", format="R$ %.2f"),
+            "Dif. Valor (R$)": st.column_config.NumberColumn("Dif. Valor (R$)", format="R$ %.2f"),
+        }
+    )
+
+    marcados = editado[editado["Confirmar?"] == True]
+    if st.button(f"✅ Confirmar {len(marcados)} Conciliação(ões)", type="primary", disabled=marcados.empty):
+        confirmados = df_propostos.loc[marcados.index]
+        registrar_conciliacoes(registros_livro(
+            confirmados, confirmados['lancamento_id'].to_numpy(), SITUACAO_CONCILIADO, datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        ))
+        registrar_aviso(f"{len(confirmados)} conciliação(ões) confirmada(s).")
+        reexecutar()
+
+@st.fragment
+def exibir_conciliados(df_conciliados):
+    st.success("As despesas abaixo foram localizadas tanto no extrato bancário quanto no seu sistema:")
+    view_ok = df_conciliados[['conta_livro', 'Data', 'Historico', 'Valor_Absoluto', 'fornecedor', 'categoria']].copy()
+    view_ok.columns = ['🏦 Conta', '📅 Data', '🏦 Histórico (Banco)', '💵 Valor', '🛒 Fornecedor (Sistema)', '📂 Categoria (Sistema)']
+    view_ok['📅 Data'] = pd.to_datetime(view_ok['📅 Data']).dt.strftime('%d/%m/%Y')
+    view_ok.insert(0, "Desfazer?", False)
+    editado = st.data_editor(
+        view_ok,
+        use_container_width=True,
+        hide_index=True,
+        disabled=[c for c in view_ok.columns if c != "Desfazer?"],
+        column_config={
+            "Desfazer?": st.column_config.CheckboxColumn("Desfazer?", required=True, help="Desliga a transação do lançamento; no próximo envio do extrato ela é conciliada de novo. O lançamento não é excluído."),
+            "💵 Valor": st.column_config.NumberColumn(format="R$ %.2f"),
+        }
+    )
+
+    marcados = editado[editado["Desfazer?"] == True]
+    if not marcados.empty and st.button(f"↩️ Desfazer {len(marcados)} Conciliação(ões)"):
+        desfazer_conciliacoes(df_conciliados.loc[marcados.index])
+        registrar_aviso(f"{len(marcados)} conciliação(ões) desfeita(s).")
+        reexecutar()
+
 # --- INTERFACE PRINCIPAL ---
-if check_password():
+with secao("autenticacao"):
+    autenticado = check_password()
+if autenticado:
+    repo = obter_repositorio()
+    # Quadros prontos de cada versão, em Parquet ao lado da base: um servidor recém-iniciado lê daqui
+    instantaneos = Instantaneos(CAMINHO_INSTANTANEOS)
     st.sidebar.title("Menu")
-    menu = st.sidebar.radio("Navegar", ["Lançar Despesa", "Lançar Receita", "Relatórios", "Conciliação Bancária", "Configurações"])
+    menu = st.sidebar.radio("Navegar", list(PAGINAS))
+    medicao_atual().rotulo = menu
+    iniciar_rodada(menu, PAGINAS[menu])
+    exibir_avisos()
+    exibir_status_sincronizacao()
 
     # --- ABA: LANÇAR DESPESA ---
     if menu == "Lançar Despesa":
+        from importacao import importar_excel, preparar_lote_despesas
         st.header("📉 Gestão de Despesas")
         tab_individual, tab_lote, tab_importar, tab_editar_excluir = st.tabs([
             "📝 Individual", 
@@ -318,14 +1144,12 @@ if check_password():
                         "observacao": obs
                     }
                     salvar_lancamento(dados)
-                    st.success("Despesa registrada com sucesso! A tela será limpa em 3 segundos...")
-                    time.sleep(3) 
+                    registrar_aviso("Despesa registrada com sucesso!")
                     st.session_state["memoria_mes"] = mes_selecionado
                     st.session_state["memoria_ano"] = ano_selecionado
                     st.session_state["memoria_data_liq"] = data_liq
                     st.session_state["limpar_despesa_agora"] = True
-                    st.cache_data.clear()
-                    st.rerun()
+                    reexecutar()
 
         # === 2. LANÇAMENTO EM LOTE ===
         with tab_lote:
@@ -340,10 +1164,8 @@ if check_password():
                     if st.button("Cadastrar Fornecedor", key="btn_novo_forn_lote", use_container_width=True):
                         if novo_forn_lote.strip():
                             salvar_fornecedor_rapido(novo_forn_lote)
-                            st.success(f"Fornecedor '{novo_forn_lote}' cadastrado com sucesso!")
-                            time.sleep(1)
-                            st.cache_data.clear() 
-                            st.rerun() 
+                            registrar_aviso(f"Fornecedor '{novo_forn_lote}' cadastrado com sucesso!")
+                            reexecutar() 
                         else:
                             st.error("Digite um nome válido.")
             
@@ -356,10 +1178,8 @@ if check_password():
                     if st.button("Cadastrar Classificação", key="btn_nova_cat_lote", use_container_width=True):
                         if nova_cat_lote.strip():
                             salvar_categoria_rapida(nova_cat_lote)
-                            st.success(f"Classificação '{nova_cat_lote}' cadastrada com sucesso!")
-                            time.sleep(1)
-                            st.cache_data.clear()
-                            st.rerun()
+                            registrar_aviso(f"Classificação '{nova_cat_lote}' cadastrada com sucesso!")
+                            reexecutar()
                         else:
                             st.error("Digite um nome válido.")
 
@@ -394,46 +1214,18 @@ if check_password():
                 if lote_editado.empty:
                     st.warning("A tabela está vazia.")
                 else:
-                    lista_dados_finais = []
-                    erro_encontrado = False
-                    for index, row in lote_editado.iterrows():
-                        if pd.isna(row['fornecedor']) and pd.isna(row['valor']): continue
-                        
-                        if pd.isna(row['fornecedor']) or str(row['fornecedor']).strip() == "" or pd.isna(row['valor']) or pd.isna(row['data_liquidacao']) or not row['mes_competencia'] or not row['ano_competencia']:
-                            st.warning(f"Linha {index + 1} incompleta. Verifique Valor, Data, Competência e Fornecedor.")
-                            erro_encontrado = True
-                            continue
-                            
-                        if pd.isna(row['categoria']) or str(row['categoria']).strip() == "":
-                            st.warning(f"Linha {index + 1} incompleta. Verifique a Classificação.")
-                            erro_encontrado = True
-                            continue
-                            
-                        nome_forn = str(row['fornecedor']).strip()
-                        nome_cat = str(row['categoria']).strip()
-                        mes_num = MESES_PT_INV[row['mes_competencia']]
-                        comp_fmt = f"{row['ano_competencia']}-{mes_num:02d}"
-                        
-                        dados_linha = {
-                            "data_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            "tipo": "Despesa",
-                            "valor": row['valor'],
-                            "fornecedor": nome_forn,
-                            "data_liquidacao": pd.to_datetime(row['data_liquidacao']).strftime("%Y-%m-%d"),
-                            "competencia": comp_fmt,
-                            "status": row['status'] if row['status'] else "Pago",
-                            "categoria": nome_cat,
-                            "observacao": row['observacao']
-                        }
-                        lista_dados_finais.append(dados_linha)
-                        
-                    if lista_dados_finais and not erro_encontrado:
-                        salvar_lote_lancamentos(pd.DataFrame(lista_dados_finais))
-                        st.success(f"{len(lista_dados_finais)} despesas salvas com sucesso!")
-                        time.sleep(2)
-                        st.cache_data.clear()
-                        st.rerun()
-                    elif not lista_dados_finais and not erro_encontrado:
+                    df_lote, df_problemas = preparar_lote_despesas(lote_editado, MESES_PT_INV, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                    for motivo, linhas in df_problemas.groupby("motivo", sort=False)["linha"]:
+                        st.warning(f"Linha(s) {', '.join(map(str, linhas))} incompleta(s). {motivo}")
+                    erro_encontrado = not df_problemas.empty
+
+                    if not df_lote.empty and not erro_encontrado:
+                        cadastrar_fornecedores(df_lote['fornecedor'].unique())
+                        cadastrar_categorias(df_lote['categoria'].unique())
+                        salvar_lote_lancamentos(df_lote)
+                        registrar_aviso(f"{len(df_lote)} despesas salvas com sucesso!")
+                        reexecutar()
+                    elif df_lote.empty and not erro_encontrado:
                         st.warning("Nenhuma linha preenchida para salvar.")
 
         # === 3. IMPORTAR PLANILHA ===
@@ -458,98 +1250,49 @@ if check_password():
 
             if arquivo_importacao is not None:
                 if st.button("🚀 Processar e Importar Planilha", type="primary"):
+                    barra = st.progress(0.0, text="Lendo a planilha...")
+                    def mostrar_progresso(lidas, total):
+                        fracao = min(lidas / total, 1.0) if total else 0.0
+                        barra.progress(fracao, text=f"Lendo a planilha... {lidas} linha(s) processada(s)")
                     try:
-                        df_import = pd.read_excel(arquivo_importacao)
-                        colunas_esperadas = ['valor', 'data_liquidacao', 'mes_competencia', 'ano_competencia', 'fornecedor']
-                        colunas_faltantes = [c for c in colunas_esperadas if c not in df_import.columns.str.lower()]
-
-                        if colunas_faltantes:
-                            st.error(f"⚠️ Erro: Faltam as seguintes colunas obrigatórias na sua planilha: {', '.join(colunas_faltantes)}")
-                        else:
-                            with st.spinner("Processando dados e cadastrando novos fornecedores/classificações..."):
-                                df_import.columns = df_import.columns.str.lower()
-                                
-                                df_forn_atual = carregar_fornecedores_df()
-                                nomes_forn_existentes = set(df_forn_atual['nome'].dropna().str.lower().values)
-                                
-                                df_cat_atual = carregar_categorias_df()
-                                nomes_cat_existentes = set(df_cat_atual['nome'].dropna().str.lower().values)
-                                
-                                lista_dados_finais = []
-
-                                for index, row in df_import.iterrows():
-                                    if pd.isna(row.get('fornecedor')) or pd.isna(row.get('valor')):
-                                        continue 
-
-                                    nome_forn = str(row['fornecedor']).strip()
-                                    if nome_forn.lower() not in nomes_forn_existentes:
-                                        salvar_fornecedor_rapido(nome_forn)
-                                        nomes_forn_existentes.add(nome_forn.lower())
-
-                                    cat_str = str(row.get('categoria', 'Outros')).strip()
-                                    if cat_str.lower() not in nomes_cat_existentes:
-                                        salvar_categoria_rapida(cat_str)
-                                        nomes_cat_existentes.add(cat_str.lower())
-
-                                    valor_float = converter_moeda_br_para_float(row['valor'])
-                                    mes_nome = str(row['mes_competencia']).strip().capitalize()
-                                    ano = str(row['ano_competencia']).strip().replace(".0", "")
-                                    
-                                    if mes_nome in MESES_PT_INV:
-                                        mes_num = MESES_PT_INV[mes_nome]
-                                        comp_fmt = f"{ano}-{mes_num:02d}"
-                                    else:
-                                        comp_fmt = f"{ano}-01"
-
-                                    try:
-                                        data_fmt = pd.to_datetime(row['data_liquidacao'], dayfirst=True).strftime("%Y-%m-%d")
-                                    except:
-                                        data_fmt = datetime.now().strftime("%Y-%m-%d")
-
-                                    status_str = str(row.get('status', 'Pago')).strip()
-                                    if status_str.lower() not in ['pago', 'a pagar']: status_str = 'Pago'
-
-                                    obs_str = str(row.get('observacao', '')) if pd.notna(row.get('observacao')) else ""
-
-                                    dados_linha = {
-                                        "data_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                        "tipo": "Despesa",
-                                        "valor": valor_float,
-                                        "fornecedor": nome_forn,
-                                        "data_liquidacao": data_fmt,
-                                        "competencia": comp_fmt,
-                                        "status": status_str,
-                                        "categoria": cat_str,
-                                        "observacao": obs_str
-                                    }
-                                    lista_dados_finais.append(dados_linha)
-
-                                if lista_dados_finais:
-                                    salvar_lote_lancamentos(pd.DataFrame(lista_dados_finais))
-                                    st.success(f"🎉 Sucesso! {len(lista_dados_finais)} despesas foram importadas para o banco de dados.")
-                                    time.sleep(3)
-                                    st.cache_data.clear()
-                                    st.rerun()
-                                else:
-                                    st.warning("Nenhuma despesa válida encontrada. Verifique se as células de fornecedor e valor estão preenchidas.")
-                    
+                        df_importados, df_invalidos = importar_excel(arquivo_importacao, MESES_PT_INV, ao_progredir=mostrar_progresso)
+                    except ValueError as e:
+                        barra.empty()
+                        st.error(f"⚠️ Erro: {e}")
                     except Exception as e:
+                        barra.empty()
                         st.error(f"Erro ao ler a planilha. Detalhe técnico: {e}")
+                    else:
+                        barra.progress(1.0, text="Cadastrando novos fornecedores/classificações e gravando...")
+                        if not df_invalidos.empty:
+                            st.warning(f"{len(df_invalidos)} linha(s) ignorada(s) por dados inválidos:")
+                            st.dataframe(df_invalidos, hide_index=True, use_container_width=True)
+
+                        if not df_importados.empty:
+                            cadastrar_fornecedores(df_importados['fornecedor'].unique())
+                            cadastrar_categorias(df_importados['categoria'].unique())
+                            salvar_lote_lancamentos(df_importados)
+                            barra.empty()
+                            mensagem = f"🎉 Sucesso! {len(df_importados)} despesas foram importadas para o banco de dados."
+                            if df_invalidos.empty:
+                                registrar_aviso(mensagem)
+                                reexecutar()
+                            st.success(mensagem)
+                        else:
+                            barra.empty()
+                            st.warning("Nenhuma despesa válida encontrada. Verifique se as células de fornecedor e valor estão preenchidas.")
 
         # === 4. EDITAR OU EXCLUIR DESPESA ===
         with tab_editar_excluir:
             st.subheader("🔍 Localizar, Editar ou Excluir")
-            df_dados = carregar_dados()
+            col_f1, col_f2, col_f3 = st.columns(3)
+            with col_f1:
+                # Os anos vêm das partições; só os anos escolhidos são lidos (nenhum: todos)
+                filtro_ano = st.multiselect("Filtrar por Ano", anos_de_competencia())
+            df_dados = consultar_lancamentos(tipo="Despesa", anos=tuple(filtro_ano) if filtro_ano else None)
             if not df_dados.empty:
-                df_dados['valor'] = pd.to_numeric(df_dados['valor'])
-                df_dados['data_liquidacao'] = pd.to_datetime(df_dados['data_liquidacao'], errors='coerce')
-                
-                col_f1, col_f2, col_f3 = st.columns(3)
-                with col_f1:
-                    anos_disponiveis = sorted(df_dados['competencia'].str[:4].unique())
-                    filtro_ano = st.multiselect("Filtrar por Ano", anos_disponiveis)
                 with col_f2:
-                    meses_disponiveis = sorted(df_dados['competencia'].str[5:].unique())
+                    meses_disponiveis = sorted(df_dados['mes_comp_num'].dropna().unique())
                     filtro_mes = st.multiselect("Filtrar por Mês (Numérico)", meses_disponiveis)
                 with col_f3:
                     if not df_dados['valor'].empty:
@@ -567,11 +1310,10 @@ if check_password():
                     categorias_disponiveis = sorted(df_dados[df_dados['tipo'] == 'Despesa']['categoria'].dropna().unique())
                     filtro_cat = st.multiselect("Filtrar por Categoria", categorias_disponiveis)
 
-                df_filtrado = df_dados.copy()
-                df_filtrado = df_filtrado[df_filtrado['tipo'] == 'Despesa']
+                df_filtrado = df_dados[df_dados['tipo'] == 'Despesa']
                 
-                if filtro_ano: df_filtrado = df_filtrado[df_filtrado['competencia'].str[:4].isin(filtro_ano)]
-                if filtro_mes: df_filtrado = df_filtrado[df_filtrado['competencia'].str[5:].isin(filtro_mes)]
+                if filtro_ano: df_filtrado = df_filtrado[df_filtrado['ano_comp'].isin(filtro_ano)]
+                if filtro_mes: df_filtrado = df_filtrado[df_filtrado['mes_comp_num'].isin(filtro_mes)]
                 df_filtrado = df_filtrado[(df_filtrado['valor'] >= filtro_valor[0]) & (df_filtrado['valor'] <= filtro_valor[1])]
                 if filtro_forn: df_filtrado = df_filtrado[df_filtrado['fornecedor'].isin(filtro_forn)]
                 if filtro_cat: df_filtrado = df_filtrado[df_filtrado['categoria'].isin(filtro_cat)]
@@ -580,14 +1322,18 @@ if check_password():
                 if not df_filtrado.empty:
                     df_filtrado_view = df_filtrado.copy()
                     df_filtrado_view.insert(0, "Selecionar", False)
+                    df_filtrado_view["Conciliação"] = df_filtrado_view.index.map(situacao_por_lancamento()).fillna("")
                     editor_acao = st.data_editor(
                         df_filtrado_view,
                         column_config={
                             "Selecionar": st.column_config.CheckboxColumn(required=True),
                             "data_liquidacao": st.column_config.DateColumn("Data Liq.", format="DD/MM/YYYY"),
-                            "valor": st.column_config.NumberColumn("Valor", format="R$ %.2f")
+                            "valor": st.column_config.NumberColumn("Valor", format="R$ %.2f"),
+                            "ano_comp": None,
+                            "mes_comp_num": None,
+                            "mes_comp_nome": None
                         },
-                        disabled=["tipo", "valor", "fornecedor", "data_liquidacao", "competencia", "categoria", "observacao"],
+                        disabled=["tipo", "valor", "fornecedor", "data_liquidacao", "competencia", "categoria", "observacao", "Conciliação"],
                         hide_index=True,
                         use_container_width=True
                     )
@@ -595,29 +1341,27 @@ if check_password():
                     linhas_marcadas = editor_acao[editor_acao["Selecionar"] == True]
                     
                     if not linhas_marcadas.empty:
-                        indices_selecionados = linhas_marcadas.index.tolist()
-                        qtd_selecionada = len(indices_selecionados)
+                        ids_selecionados = linhas_marcadas.index.tolist()
+                        qtd_selecionada = len(ids_selecionados)
                         
                         st.markdown("---")
                         col_btn1, col_btn2 = st.columns(2)
                         
                         with col_btn1:
                             if st.button("🗑️ CONFIRMAR EXCLUSÃO", type="secondary", use_container_width=True):
-                                excluir_lancamentos(indices_selecionados)
-                                st.success(f"{qtd_selecionada} registro(s) excluído(s) com sucesso!")
-                                time.sleep(2)
-                                st.cache_data.clear()
-                                st.rerun()
+                                excluir_lancamentos(ids_selecionados)
+                                registrar_aviso(f"{qtd_selecionada} registro(s) excluído(s) com sucesso!")
+                                reexecutar()
 
                         with col_btn2:
                             if qtd_selecionada == 1:
                                 if st.button("✏️ EDITAR DESPESA", type="primary", use_container_width=True):
-                                    st.session_state["editando_idx"] = indices_selecionados[0]
+                                    st.session_state["editando_id"] = ids_selecionados[0]
                             elif qtd_selecionada > 1:
                                 st.warning("⚠️ Selecione apenas UMA despesa para editar.")
 
-                        if "editando_idx" in st.session_state and st.session_state["editando_idx"] in indices_selecionados:
-                            idx = st.session_state["editando_idx"]
+                        if "editando_id" in st.session_state and st.session_state["editando_id"] in ids_selecionados:
+                            idx = st.session_state["editando_id"]
                             linha_atual = df_filtrado.loc[idx]
                             
                             st.markdown("### 📝 Editar Informações")
@@ -663,11 +1407,9 @@ if check_password():
                                     }
                                     
                                     editar_lancamento(idx, dados_atualizados)
-                                    st.success("Despesa atualizada com sucesso!")
-                                    del st.session_state["editando_idx"]
-                                    time.sleep(2)
-                                    st.cache_data.clear()
-                                    st.rerun()
+                                    registrar_aviso("Despesa atualizada com sucesso!")
+                                    del st.session_state["editando_id"]
+                                    reexecutar()
 
                 else: st.info("Nenhuma despesa encontrada.")
             else: st.info("Não há dados cadastrados.")
@@ -715,71 +1457,76 @@ if check_password():
                         "observacao": obs
                     }
                     salvar_lancamento(dados)
-                    st.success("Receita registrada! Limpando em 3 segundos...")
-                    time.sleep(3)
+                    registrar_aviso("Receita registrada!")
                     st.session_state["limpar_receita_agora"] = True
-                    st.cache_data.clear()
-                    st.rerun()
+                    reexecutar()
 
     # --- ABA: RELATÓRIOS ---
     elif menu == "Relatórios":
         st.header("📊 Relatórios Gerenciais")
         if st.button("🔄 Atualizar Dados"):
-            st.cache_data.clear()
-            st.rerun()
+            if repo.recarregar_da_planilha(["lancamentos", "fornecedores", "categorias", "conciliacoes"]):
+                reexecutar()
+            else:
+                st.warning("Ainda há alterações sendo enviadas para a planilha. Tente novamente em alguns segundos.")
 
-        df = carregar_dados()
-        
-        if not df.empty:
-            df['valor'] = pd.to_numeric(df['valor'])
-            df['data_liquidacao'] = pd.to_datetime(df['data_liquidacao'], errors='coerce')
-            df['ano_comp'] = df['competencia'].str[:4]
-            df['mes_comp_num'] = df['competencia'].str[5:].astype(int)
-            df['mes_comp_nome'] = df['mes_comp_num'].map(MESES_PT)
+        if not carregar_particoes().empty:
 
             # Abas para separar o Dashboard do Calendário
             tab_dash, tab_calendario = st.tabs(["📊 Dashboard e Extrato", "📅 Calendário de Vencimentos (A Pagar)"])
 
             with tab_dash:
                 st.sidebar.markdown("### Filtros do Relatório")
+                cubo, limites_datas = carregar_cubo()
                 filtro_tipo = st.sidebar.multiselect("Tipo", options=["Receita", "Despesa"], default=["Receita", "Despesa"])
                 
-                categorias_disp = sorted(df['categoria'].dropna().unique())
+                categorias_disp = sorted(cubo['categoria'].dropna().unique())
                 filtro_categoria = st.sidebar.multiselect("Categoria", options=categorias_disp, default=categorias_disp)
                 
-                if 'status' in df.columns:
-                    status_disp = sorted(df['status'].dropna().unique())
-                else:
-                    status_disp = []
+                status_disp = sorted(cubo['status'].dropna().unique())
                 filtro_status = st.sidebar.multiselect("Status", options=status_disp, default=status_disp)
                 
-                if 'fornecedor' in df.columns:
-                    fornecedores_disp = sorted(df['fornecedor'].dropna().astype(str).unique())
-                else:
-                    fornecedores_disp = []
+                fornecedores_disp = sorted(cubo['fornecedor'].dropna().astype(str).unique())
                 filtro_fornecedor = st.sidebar.multiselect("Fornecedor", options=fornecedores_disp, default=fornecedores_disp)
                 
-                anos_disp = sorted(df['ano_comp'].unique())
+                anos_disp = anos_de_competencia()
                 filtro_ano = st.sidebar.multiselect("Ano de Competência", options=anos_disp, default=anos_disp)
-                meses_disp_nome = [MESES_PT[m] for m in sorted(df['mes_comp_num'].unique())]
+                meses_disp_nome = [MESES_PT[m] for m in sorted(cubo['mes_comp_num'].dropna().unique())]
                 filtro_mes = st.sidebar.multiselect("Mês de Competência", options=meses_disp_nome, default=meses_disp_nome)
-                min_date = df['data_liquidacao'].min().date()
-                max_date = df['data_liquidacao'].max().date()
+                min_date = pd.to_datetime(limites_datas[0]).date() if limites_datas[0] else date.today()
+                max_date = pd.to_datetime(limites_datas[1]).date() if limites_datas[1] else date.today()
                 periodo = st.sidebar.date_input("Período (Data Liquidação)", value=(min_date, max_date), min_value=min_date, max_value=max_date)
 
-                df_filtered = df.copy()
-                if filtro_tipo: df_filtered = df_filtered[df_filtered['tipo'].isin(filtro_tipo)]
-                if filtro_categoria: df_filtered = df_filtered[df_filtered['categoria'].isin(filtro_categoria)]
-                if filtro_status: df_filtered = df_filtered[df_filtered['status'].isin(filtro_status)]
-                if filtro_fornecedor: df_filtered = df_filtered[df_filtered['fornecedor'].isin(filtro_fornecedor)]
-                if filtro_ano: df_filtered = df_filtered[df_filtered['ano_comp'].isin(filtro_ano)]
-                if filtro_mes: df_filtered = df_filtered[df_filtered['mes_comp_nome'].isin(filtro_mes)]
-                if isinstance(periodo, tuple) and len(periodo) == 2:
-                    df_filtered = df_filtered[(df_filtered['data_liquidacao'].dt.date >= periodo[0]) & (df_filtered['data_liquidacao'].dt.date <= periodo[1])]
-
-                total_rec = df_filtered[df_filtered['tipo'] == 'Receita']['valor'].sum()
-                total_desp = df_filtered[df_filtered['tipo'] == 'Despesa']['valor'].sum()
-                saldo = total_rec - total_desp
+                filtros = {
+                    'tipo': filtro_tipo, 'categoria': filtro_categoria, 'status': filtro_status,
+                    'fornecedor': filtro_fornecedor, 'ano_comp': filtro_ano, 'mes_comp_nome': filtro_mes
+                }
+                periodo_valido = isinstance(periodo, tuple) and len(periodo) == 2
+                periodo_parcial = periodo_valido and (periodo[0] > min_date or periodo[1] < max_date)
+                # Só as partições dos anos filtrados são carregadas (nenhum ano marcado: todas)
+                anos_relatorio = filtro_ano or None
+                df = carregar_dados(anos_relatorio)
+                indice_filtros = carregar_indice_filtros(anos_relatorio)
+                with secao("filtro"):
+                    mascara_filtros = indice_filtros.mascara(filtros, periodo if periodo_valido else None)
+                    posicoes_filtradas = np.flatnonzero(mascara_filtros)
+                    df_filtered = df.iloc[posicoes_filtradas]
+
+                # Métricas e gráficos saem do cubo mensal (tamanho proporcional a meses x categorias).
+                # O cubo não guarda a data de liquidação, então um período parcial usa as linhas filtradas;
+                # o período inteiro também, se houver linhas sem data válida (o filtro e o extrato as deixam de fora).
+                sem_data_fora = periodo_valido and indice_filtros.qtd_datas < indice_filtros.n
+                with secao("agregacao"):
+                    if periodo_parcial or sem_data_fora:
+                        resumo = agregar_lancamentos(df_filtered)
+                    else:
+                        resumo = cubo
+                        for coluna, valores in filtros.items():
+                            if valores: resumo = resumo[resumo[coluna].isin(valores)]
+
+                    total_rec = resumo[resumo['tipo'] == 'Receita']['valor'].sum()
+                    total_desp = resumo[resumo['tipo'] == 'Despesa']['valor'].sum()
+                    saldo = total_rec - total_desp
                 
                 c1, c2, c3 = st.columns(3)
                 c1.metric("Receitas", f"R$ {total_rec:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
@@ -787,268 +1534,30 @@ if check_password():
                 c3.metric("Resultado", f"R$ {saldo:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
 
                 st.markdown("---")
-                if not df_filtered.empty:
+                if not resumo.empty:
                     col_g1, col_g2 = st.columns(2)
                     with col_g1:
                         st.subheader("Evolução Mensal (Receita x Despesa)")
-                        df_chart1 = df_filtered.groupby(['competencia', 'tipo'])['valor'].sum().unstack().fillna(0)
+                        df_chart1 = resumo.groupby(['competencia', 'tipo'])['valor'].sum().unstack().fillna(0)
                         st.bar_chart(df_chart1, use_container_width=True)
                     with col_g2:
                         st.subheader("Distribuição por Categoria")
-                        df_cat = df_filtered.groupby("categoria")["valor"].sum().sort_values(ascending=False)
+                        df_cat = resumo.groupby("categoria")["valor"].sum().sort_values(ascending=False)
                         st.bar_chart(df_cat, use_container_width=True)
                 else:
                     st.info("Sem dados para exibir nos gráficos com os filtros atuais.")
 
-                st.subheader("Extrato Detalhado Interativo")
-                st.markdown("Marque a caixa **'Editar?'** ao lado de qualquer lançamento para alterar os seus dados ou excluí-lo.")
-                
-                df_extrato_view = df_filtered.copy()
-                df_extrato_view.insert(0, "✏️ Editar", False)
-                df_sorted = df_extrato_view.sort_values("data_liquidacao", ascending=False)
-                
-                colunas_desabilitadas = df_sorted.columns.tolist()
-                colunas_desabilitadas.remove("✏️ Editar")
-                
-                editor_extrato = st.data_editor(
-                    df_sorted, 
-                    use_container_width=True,
-                    hide_index=True,
-                    disabled=colunas_desabilitadas,
-                    column_config={
-                        "✏️ Editar": st.column_config.CheckboxColumn("Editar?", required=True),
-                        "data_liquidacao": st.column_config.DateColumn("Data Liq.", format="DD/MM/YYYY"),
-                        "valor": st.column_config.NumberColumn("Valor", format="R$ %.2f"),
-                        "ano_comp": None, 
-                        "mes_comp_num": None, 
-                        "mes_comp_nome": None 
-                    }
-                )
-
-                linhas_editar = editor_extrato[editor_extrato["✏️ Editar"] == True]
-
-                if not linhas_editar.empty:
-                    st.markdown("---")
-                    if len(linhas_editar) > 1:
-                        st.warning("⚠️ Selecione apenas UM lançamento para editar por vez.")
-                    else:
-                        idx = linhas_editar.index[0]
-                        linha_atual = df_filtered.loc[idx]
-                        tipo_lanc = linha_atual['tipo']
-                        
-                        st.markdown(f"### 📝 Editar Lançamento ({tipo_lanc})")
-                        with st.form(key=f"form_edit_relatorio_{idx}"):
-                            c_ed1, c_ed2 = st.columns(2)
-                            with c_ed1:
-                                novo_valor = st.number_input("Valor (R$)", value=float(linha_atual['valor']), min_value=0.0)
-                                nova_data = st.date_input("Data", value=pd.to_datetime(linha_atual['data_liquidacao']).date(), format="DD/MM/YYYY")
-                                
-                                ano_atual = str(linha_atual['competencia'])[:4]
-                                mes_atual_num = int(str(linha_atual['competencia'])[5:7])
-                                mes_atual_nome = MESES_PT[mes_atual_num]
-                                
-                                novo_mes = st.selectbox("Mês Comp.", list(MESES_PT.values()), index=list(MESES_PT.values()).index(mes_atual_nome))
-                                novo_ano = st.selectbox("Ano Comp.", gerar_lista_anos(), index=gerar_lista_anos().index(ano_atual))
-                                
-                                status_atual = str(linha_atual.get('status', 'Pago' if tipo_lanc == 'Despesa' else 'Recebido'))
-                                opcoes_status = ["Pago", "A Pagar"] if tipo_lanc == 'Despesa' else ["Recebido", "A Receber"]
-                                if status_atual not in opcoes_status:
-                                    opcoes_status.append(status_atual)
-                                novo_status = st.selectbox("Status", opcoes_status, index=opcoes_status.index(status_atual))
-
-                            with c_ed2:
-                                lista_forn = carregar_lista_nomes_fornecedores()
-                                forn_atual = str(linha_atual.get('fornecedor', ''))
-                                if forn_atual and forn_atual not in lista_forn:
-                                    lista_forn = [forn_atual] + lista_forn
-                                novo_fornecedor = st.selectbox("Fornecedor/Cliente", lista_forn, index=lista_forn.index(forn_atual) if forn_atual in lista_forn else 0)
-                                
-                                lista_cats = carregar_lista_categorias()
-                                cat_atual = str(linha_atual.get('categoria', ''))
-                                if cat_atual and cat_atual not in lista_cats:
-                                    lista_cats = [cat_atual] + lista_cats
-                                nova_categoria = st.selectbox("Categoria", lista_cats, index=lista_cats.index(cat_atual) if cat_atual in lista_cats else 0)
-                                
-                                nova_obs = st.text_area("Observação", value=str(linha_atual.get('observacao', '')))
-
-                            col_btn1, col_btn2 = st.columns([1, 1])
-                            with col_btn1:
-                                submit_edit = st.form_submit_button("💾 Salvar Alterações", type="primary", use_container_width=True)
-                            with col_btn2:
-                                submit_del = st.form_submit_button("🗑️ Excluir Lançamento", type="secondary", use_container_width=True)
-                                
-                            if submit_edit:
-                                mes_num = MESES_PT_INV[novo_mes]
-                                nova_comp = f"{novo_ano}-{mes_num:02d}"
-                                
-                                dados_atualizados = {
-                                    "valor": novo_valor,
-                                    "fornecedor": novo_fornecedor,
-                                    "data_liquidacao": nova_data.strftime("%Y-%m-%d"),
-                                    "competencia": nova_comp,
-                                    "status": novo_status,
-                                    "categoria": nova_categoria,
-                                    "observacao": nova_obs
-                                }
-                                
-                                editar_lancamento(idx, dados_atualizados)
-                                st.success("Lançamento atualizado com sucesso!")
-                                time.sleep(2)
-                                st.cache_data.clear()
-                                st.rerun()
-                                
-                            if submit_del:
-                                excluir_lancamentos([idx])
-                                st.success("Lançamento excluído com sucesso!")
-                                time.sleep(2)
-                                st.cache_data.clear()
-                                st.rerun()
+                exibir_extrato_interativo(df, df_filtered, indice_filtros, mascara_filtros, posicoes_filtradas)
 
             with tab_calendario:
-                st.subheader("🗓️ Calendário de Vencimentos")
-                st.markdown("Os dias marcados em destaque (**🚨**) possuem despesas com o status **A Pagar**. Clique num dia para ver os detalhes.")
-                
-                if 'status' not in df.columns:
-                    st.warning("O seu banco de dados ainda não tem a coluna de Status configurada corretamente.")
-                else:
-                    df_a_pagar = df[(df['tipo'] == 'Despesa') & (df['status'] == 'A Pagar')].copy()
-                    
-                    col_c1, col_c2 = st.columns(2)
-                    with col_c1:
-                        cal_mes = st.selectbox("Mês do Calendário", list(MESES_PT.values()), index=datetime.today().month - 1, key="cal_mes")
-                    with col_c2:
-                        cal_ano = st.selectbox("Ano do Calendário", gerar_lista_anos(), index=gerar_lista_anos().index(str(datetime.today().year)), key="cal_ano")
-
-                    mes_num = MESES_PT_INV[cal_mes]
-                    ano_num = int(cal_ano)
-
-                    df_a_pagar_mes = df_a_pagar[
-                        (df_a_pagar['data_liquidacao'].dt.month == mes_num) & 
-                        (df_a_pagar['data_liquidacao'].dt.year == ano_num)
-                    ]
-                    
-                    datas_com_pendencia = df_a_pagar_mes['data_liquidacao'].dt.date.unique()
-
-                    st.markdown('''
-                        <style>
-                        div[data-testid="column"] button {
-                            width: 100%;
-                            height: 60px;
-                            font-size: 18px;
-                        }
-                        </style>
-                    ''', unsafe_allow_html=True)
-
-                    dias_semana = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
-                    cols_header = st.columns(7)
-                    for i, dia in enumerate(dias_semana):
-                        cols_header[i].markdown(f"<div style='text-align: center; font-weight: bold;'>{dia}</div>", unsafe_allow_html=True)
-
-                    cal = calendar.monthcalendar(ano_num, mes_num)
-                    
-                    for semana in cal:
-                        cols = st.columns(7)
-                        for i, dia in enumerate(semana):
-                            if dia == 0:
-                                cols[i].write("") 
-                            else:
-                                data_atual = date(ano_num, mes_num, dia)
-                                tem_pendencia = data_atual in datas_com_pendencia
-                                
-                                if tem_pendencia:
-                                    if cols[i].button(f"🚨 {dia}", key=f"btn_cal_{data_atual}", type="primary", help="Há despesas a pagar neste dia!"):
-                                        st.session_state['cal_data_selecionada'] = data_atual
-                                else:
-                                    if cols[i].button(f"{dia}", key=f"btn_cal_{data_atual}", help="Sem pendências para este dia."):
-                                        st.session_state['cal_data_selecionada'] = data_atual
-
-                    st.markdown("---")
-                    
-                    if 'cal_data_selecionada' in st.session_state:
-                        data_sel = st.session_state['cal_data_selecionada']
-                        
-                        if data_sel.month == mes_num and data_sel.year == ano_num:
-                            st.markdown(f"#### 🔎 Despesas para o dia {data_sel.strftime('%d/%m/%Y')}")
-                            df_dia = df[(df['tipo'] == 'Despesa') & (df['data_liquidacao'].dt.date == data_sel)]
-                            
-                            if not df_dia.empty:
-                                st.markdown("💡 **Dica:** Altere qualquer dado (Data, Status, Valor, Fornecedor, etc.) diretamente na tabela abaixo e clique em Salvar.")
-                                
-                                lista_fornecedores_cadastrados = carregar_lista_nomes_fornecedores()
-                                lista_categorias_cadastradas = carregar_lista_categorias()
-                                
-                                df_dia_view = df_dia[['data_liquidacao', 'fornecedor', 'categoria', 'status', 'valor', 'observacao']].copy()
-                                df_dia_view['data_liquidacao'] = pd.to_datetime(df_dia_view['data_liquidacao']).dt.date
-                                
-                                # --- NOVO BLOCO: TABELA DE EDIÇÃO RÁPIDA TOTAL ---
-                                edited_dia = st.data_editor(
-                                    df_dia_view,
-                                    use_container_width=True,
-                                    hide_index=True,
-                                    column_config={
-                                        "data_liquidacao": st.column_config.DateColumn("Data Liq.", format="DD/MM/YYYY", required=True),
-                                        "status": st.column_config.SelectboxColumn("Status", options=["Pago", "A Pagar"], required=True),
-                                        "valor": st.column_config.NumberColumn("Valor (R$)", format="R$ %.2f", required=True),
-                                        "fornecedor": st.column_config.SelectboxColumn("Fornecedor", options=lista_fornecedores_cadastrados, required=True),
-                                        "categoria": st.column_config.SelectboxColumn("Categoria", options=lista_categorias_cadastradas, required=True),
-                                        "observacao": st.column_config.TextColumn("Observação")
-                                    }
-                                )
-                                
-                                mudancas_dict = {}
-                                for idx in df_dia_view.index:
-                                    linha_original = df_dia_view.loc[idx]
-                                    linha_editada = edited_dia.loc[idx]
-                                    
-                                    alteracoes_linha = {}
-                                    
-                                    if str(linha_original['data_liquidacao']) != str(linha_editada['data_liquidacao']):
-                                        alteracoes_linha['data_liquidacao'] = pd.to_datetime(linha_editada['data_liquidacao']).strftime("%Y-%m-%d")
-                                    
-                                    if linha_original['fornecedor'] != linha_editada['fornecedor']:
-                                        alteracoes_linha['fornecedor'] = linha_editada['fornecedor']
-                                        
-                                    if linha_original['categoria'] != linha_editada['categoria']:
-                                        alteracoes_linha['categoria'] = linha_editada['categoria']
-                                        
-                                    if linha_original['status'] != linha_editada['status']:
-                                        alteracoes_linha['status'] = linha_editada['status']
-                                        
-                                    if float(linha_original['valor']) != float(linha_editada['valor']):
-                                        alteracoes_linha['valor'] = float(linha_editada['valor'])
-                                        
-                                    obs_orig = "" if pd.isna(linha_original['observacao']) else str(linha_original['observacao'])
-                                    obs_edit = "" if pd.isna(linha_editada['observacao']) else str(linha_editada['observacao'])
-                                    if obs_orig != obs_edit:
-                                        alteracoes_linha['observacao'] = obs_edit
-                                        
-                                    if alteracoes_linha:
-                                        mudancas_dict[idx] = alteracoes_linha
-                                
-                                if mudancas_dict:
-                                    if st.button(f"💾 Salvar {len(mudancas_dict)} Alteração(ões)", type="primary"):
-                                        editar_multiplos_lancamentos(mudancas_dict)
-                                        st.success("Lançamento(s) atualizado(s) com sucesso!")
-                                        time.sleep(1.5)
-                                        st.cache_data.clear()
-                                        st.rerun()
-
-                                # Cálculos atualizados baseados no estado visual (antes de salvar)
-                                total_dia = edited_dia['valor'].sum()
-                                total_pendente_view = edited_dia[edited_dia['status'] == 'A Pagar']['valor'].sum()
-                                
-                                c1, c2 = st.columns(2)
-                                c1.metric("Total Agendado no Dia", f"R$ {total_dia:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
-                                c2.metric("Total A Pagar (Pendente)", f"R$ {total_pendente_view:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), delta_color="inverse")
-
-                            else:
-                                st.success("Nenhuma despesa lançada para este dia! 🎉")
+                exibir_calendario_vencimentos()
 
         else:
             st.info("Nenhum dado lançado ainda.")
 
     # --- ABA: CONCILIAÇÃO BANCÁRIA ---
     elif menu == "Conciliação Bancária":
+        from conciliacao import conciliar, conta_do_extrato, SITUACAO_CONCILIADO, SITUACAO_LANCADO, SITUACAO_IGNORADO
         st.header("🏦 Conciliação Bancária Automática (OFX)")
         
         st.markdown("""
@@ -1057,196 +1566,118 @@ if check_password():
         O sistema identificará automaticamente as saídas e as cruzará com as despesas cadastradas no sistema.
         """)
 
-        arquivo_ofx = st.file_uploader("📥 Envie o extrato bancário (.ofx)", type=["ofx"])
+        col_tol1, col_tol2 = st.columns(2)
+        with col_tol1:
+            janela_dias = st.number_input("Tolerância de data (± dias)", min_value=0, max_value=15, value=1, step=1, help="Aceita despesas registradas até N dias antes ou depois da data do extrato.")
+        with col_tol2:
+            tolerancia_valor = st.number_input("Tolerância de valor (R$)", min_value=0.0, max_value=1.0, value=0.0, step=0.01, format="%.2f")
+
+        arquivos_ofx = st.file_uploader("📥 Envie os extratos bancários (.ofx) — pode enviar vários de uma vez", type=["ofx"], accept_multiple_files=True)
 
-        if arquivo_ofx is not None:
-            with st.spinner("Analisando e processando arquivo OFX..."):
+        if arquivos_ofx:
+            with st.spinner("Analisando e processando arquivo(s) OFX..."):
                 try:
-                    conteudo = arquivo_ofx.getvalue().decode('latin1', errors='ignore')
-                    transacoes = re.findall(r'<STMTTRN>(.*?)</STMTTRN>', conteudo, re.DOTALL)
-                    
-                    dados_extrato = []
-                    for t in transacoes:
-                        dt_match = re.search(r'<DTPOSTED>(\d{8})', t)
-                        data_str = dt_match.group(1) if dt_match else None
-                        val_match = re.search(r'<TRNAMT>([\-\d\.]+)', t)
-                        valor_str = val_match.group(1) if val_match else None
-                        memo_match = re.search(r'<MEMO>(.*?)(?:<|\r|\n)', t)
-                        name_match = re.search(r'<NAME>(.*?)(?:<|\r|\n)', t)
-                        
-                        if memo_match: desc = memo_match.group(1).strip()
-                        elif name_match: desc = name_match.group(1).strip()
-                        else: desc = "Sem descrição"
-                        
-                        if data_str and valor_str:
-                            data_obj = datetime.strptime(data_str, '%Y%m%d').date()
-                            valor_float = float(valor_str)
-                            dados_extrato.append({
-                                'Data': data_obj,
-                                'Historico': desc,
-                                'Valor': valor_float
-                            })
-                            
-                    df_extrato = pd.DataFrame(dados_extrato)
+                    # Os arquivos são lidos uma vez (cache pelo conteúdo); a conciliação abaixo roda uma vez só para o lote todo
+                    extratos = ler_extratos_ofx(tuple(arquivo.getvalue() for arquivo in arquivos_ofx))
+                    df_extrato = pd.concat(
+                        [extrato.assign(arquivo=arquivo.name) for arquivo, extrato in zip(arquivos_ofx, extratos)],
+                        ignore_index=True
+                    ).rename(columns={'data': 'Data', 'descricao': 'Historico', 'valor': 'Valor'})
 
                     if not df_extrato.empty:
+                        df_extrato['conta_livro'] = conta_do_extrato(df_extrato)
+                        # Extratos sobrepostos da mesma conta trazem a mesma transação mais de uma vez
+                        df_extrato = df_extrato.drop_duplicates(['conta_livro', 'fitid'])
                         df_ext_saidas = df_extrato[df_extrato['Valor'] < 0].copy()
                         df_ext_saidas['Valor_Absoluto'] = df_ext_saidas['Valor'].abs() 
-                        df_ext_saidas['CHAVE_DATA'] = df_ext_saidas['Data'].astype(str).str.strip()
-                        df_ext_saidas['CHAVE_VALOR'] = df_ext_saidas['Valor_Absoluto'].apply(lambda x: "{:.2f}".format(x))
 
-                        df_sistema = carregar_dados()
-                        df_sistema = df_sistema[df_sistema['tipo'] == 'Despesa'].copy()
-                        df_sistema['valor'] = pd.to_numeric(df_sistema['valor'])
-                        
-                        df_sistema['CHAVE_DATA'] = pd.to_datetime(df_sistema['data_liquidacao']).dt.date.astype(str).str.strip()
-                        df_sistema['CHAVE_VALOR'] = df_sistema['valor'].apply(lambda x: "{:.2f}".format(x))
+                        # Transações já tratadas em envios anteriores vêm do livro e não passam de novo pelo casamento
+                        livro = carregar_livro_conciliacao()
+                        anteriores = df_ext_saidas[['conta_livro', 'fitid']].merge(
+                            livro[['conta', 'fitid', 'lancamento_id', 'situacao']].drop_duplicates(['conta', 'fitid']),
+                            how='left', left_on=['conta_livro', 'fitid'], right_on=['conta', 'fitid']
+                        )
+                        df_ext_saidas['situacao'] = anteriores['situacao'].to_numpy()
+                        df_ext_saidas['lancamento_id'] = anteriores['lancamento_id'].to_numpy()
+                        df_novas = df_ext_saidas[df_ext_saidas['situacao'].isna()]
+                        qtd_vistas = len(df_ext_saidas) - len(df_novas)
+
+                        # Os pares encontrados são só propostas: entram no livro quando o usuário confirma
+                        df_propostos = df_novas.iloc[:0]
+                        if not df_novas.empty:
+                            # Só as despesas do período das transações novas, com a folga da janela de dias (consulta indexada por data)
+                            folga = timedelta(days=janela_dias)
+                            df_sistema = consultar_lancamentos(
+                                tipo="Despesa",
+                                data_de=str(df_novas['Data'].min() - folga),
+                                data_ate=str(df_novas['Data'].max() + folga)
+                            )
+                            # Despesas já ligadas a outra transação do banco não entram de novo
+                            df_sistema = df_sistema[~df_sistema.index.isin(livro['lancamento_id'].dropna())]
+
+                            with secao("conciliacao"):
+                                pares = conciliar(df_novas, df_sistema, dias=janela_dias, tolerancia=tolerancia_valor)
+                            if not pares.empty:
+                                df_propostos = df_novas.loc[pares['saida']].assign(
+                                    lancamento_id=pares['id'].to_numpy(), dif_dias=pares['dif_dias'].to_numpy(),
+                                    dif_valor=pares['dif_valor'].to_numpy(),
+                                    fornecedor=df_sistema.loc[pares['id'], 'fornecedor'].astype(object).to_numpy(),
+                                    categoria=df_sistema.loc[pares['id'], 'categoria'].astype(object).to_numpy(),
+                                    data_sistema=df_sistema.loc[pares['id'], 'data_liquidacao'].to_numpy(),
+                                    valor_sistema=df_sistema.loc[pares['id'], 'valor'].to_numpy()
+                                )
 
-                        df_conciliados = pd.merge(df_ext_saidas, df_sistema, on=['CHAVE_DATA', 'CHAVE_VALOR'], how='inner')
-                        chaves_conciliadas = df_conciliados['CHAVE_DATA'] + df_conciliados['CHAVE_VALOR']
-                        df_ext_saidas['CHAVE_UNICA'] = df_ext_saidas['CHAVE_DATA'] + df_ext_saidas['CHAVE_VALOR']
-                        df_nao_encontrados = df_ext_saidas[~df_ext_saidas['CHAVE_UNICA'].isin(chaves_conciliadas)]
+                        df_conciliados = df_ext_saidas[df_ext_saidas['situacao'].isin([SITUACAO_CONCILIADO, SITUACAO_LANCADO])]
+                        ligados = repo.ler_lancamentos_por_id(df_conciliados['lancamento_id'].dropna().unique()).set_index(COLUNA_ID)
+                        df_conciliados = df_conciliados.reset_index(drop=True).join(
+                            ligados.reindex(df_conciliados['lancamento_id'])[['fornecedor', 'categoria']].reset_index(drop=True)
+                        )
+                        df_ignorados = df_ext_saidas[df_ext_saidas['situacao'] == SITUACAO_IGNORADO]
+                        df_nao_encontrados = df_ext_saidas[df_ext_saidas['situacao'].isna() & ~df_ext_saidas.index.isin(df_propostos.index)]
 
                         st.markdown("---")
-                        c1, c2 = st.columns(2)
+                        c1, c2, c3, c4 = st.columns(4)
                         c1.metric("✅ Despesas Encontradas (Conciliadas)", len(df_conciliados))
-                        c2.metric("⚠️ Despesas NÃO Lançadas no Sistema", len(df_nao_encontrados))
-
-                        tab_pendentes, tab_ok = st.tabs(["🔴 Pendentes de Lançamento (Faltando)", "🟢 Já Conciliados (Tudo Certo)"])
+                        c2.metric("🔎 Pares a Confirmar", len(df_propostos))
+                        c3.metric("⚠️ Despesas NÃO Lançadas no Sistema", len(df_nao_encontrados))
+                        c4.metric("🙈 Ignoradas", len(df_ignorados))
+                        if qtd_vistas:
+                            st.caption(f"{qtd_vistas} transação(ões) destes arquivos já tinham sido tratadas em envios anteriores e não foram conciliadas de novo.")
+
+                        if df_ext_saidas['conta_livro'].nunique() > 1:
+                            st.markdown("**Resumo por conta**")
+                            situacao_contas = df_ext_saidas['situacao'].map({
+                                SITUACAO_CONCILIADO: "✅ Conciliadas", SITUACAO_LANCADO: "✅ Conciliadas", SITUACAO_IGNORADO: "🙈 Ignoradas"
+                            }).fillna("⚠️ Pendentes")
+                            situacao_contas[df_ext_saidas.index.isin(df_propostos.index)] = "🔎 A Confirmar"
+                            resumo_contas = (
+                                df_ext_saidas.assign(Situação=situacao_contas)
+                                .groupby(['conta_livro', 'Situação']).size().unstack(fill_value=0)
+                                .rename_axis(index="Conta (banco/agência/conta)", columns=None)
+                            )
+                            st.dataframe(resumo_contas, use_container_width=True)
+
+                        tab_pendentes, tab_propostos, tab_ok = st.tabs([
+                            "🔴 Pendentes de Lançamento (Faltando)", "🔎 Pares a Confirmar", "🟢 Já Conciliados (Tudo Certo)"
+                        ])
 
                         with tab_pendentes:
                             if not df_nao_encontrados.empty:
-                                st.warning("Atenção! As seguintes saídas constam no extrato do Banco, mas NÃO foram localizadas no seu Sistema. Preencha os dados abaixo e marque a caixinha para registrá-las.")
-                                
-                                with st.expander("➕ O Fornecedor não está na lista? Cadastre aqui."):
-                                    c_fn1, c_fn2 = st.columns([3, 1])
-                                    with c_fn1:
-                                        novo_forn_extrato = st.text_input("Digite o nome do novo Fornecedor", key="novo_forn_extrato")
-                                    with c_fn2:
-                                        st.markdown("<div style='margin-top: 28px;'></div>", unsafe_allow_html=True)
-                                        if st.button("Cadastrar Fornecedor", use_container_width=True):
-                                            if novo_forn_extrato.strip():
-                                                salvar_fornecedor_rapido(novo_forn_extrato)
-                                                st.success(f"Fornecedor '{novo_forn_extrato}' cadastrado com sucesso!")
-                                                time.sleep(1)
-                                                st.cache_data.clear() 
-                                                st.rerun() 
-                                            else:
-                                                st.error("Digite um nome válido.")
-                                
-                                with st.expander("➕ A Classificação não está na lista? Cadastre aqui."):
-                                    c_cat1, c_cat2 = st.columns([3, 1])
-                                    with c_cat1:
-                                        nova_cat_extrato = st.text_input("Digite o nome da nova Classificação", key="nova_cat_extrato")
-                                    with c_cat2:
-                                        st.markdown("<div style='margin-top: 28px;'></div>", unsafe_allow_html=True)
-                                        if st.button("Cadastrar Classificação", key="btn_nova_cat", use_container_width=True):
-                                            if nova_cat_extrato.strip():
-                                                salvar_categoria_rapida(nova_cat_extrato)
-                                                st.success(f"Classificação '{nova_cat_extrato}' cadastrada com sucesso!")
-                                                time.sleep(1)
-                                                st.cache_data.clear()
-                                                st.rerun()
-                                            else:
-                                                st.error("Digite um nome válido.")
-
-                                mes_atual = MESES_PT[datetime.today().month]
-                                ano_atual = str(datetime.today().year)
-                                lista_anos = gerar_lista_anos()
-                                
-                                lista_fornecedores_cadastrados = carregar_lista_nomes_fornecedores()
-                                lista_categorias_cadastradas = carregar_lista_categorias()
-
-                                df_edit_pendentes = df_nao_encontrados[['Data', 'Historico', 'Valor_Absoluto']].copy()
-                                df_edit_pendentes.columns = ['Data Extrato', 'Descrição do Banco', 'Valor (R$)']
-
-                                df_edit_pendentes.insert(0, "Lançar?", False)
-                                df_edit_pendentes['Mês Comp.'] = mes_atual
-                                df_edit_pendentes['Ano Comp.'] = ano_atual
-                                df_edit_pendentes['Fornecedor'] = None 
-                                df_edit_pendentes['Categoria'] = None 
-                                df_edit_pendentes['Observação'] = ""
-
-                                edited_pendentes = st.data_editor(
-                                    df_edit_pendentes,
-                                    use_container_width=True,
-                                    hide_index=True,
-                                    column_config={
-                                        "Lançar?": st.column_config.CheckboxColumn("Lançar?", required=True),
-                                        "Data Extrato": st.column_config.DateColumn("Data Extrato", format="DD/MM/YYYY", disabled=True),
-                                        "Descrição do Banco": st.column_config.TextColumn("Descrição do Banco", disabled=True),
-                                        "Valor (R$)": st.column_config.NumberColumn("Valor (R$)", format="R$ %.2f", disabled=True),
-                                        "Mês Comp.": st.column_config.SelectboxColumn("Mês Comp.", options=list(MESES_PT.values()), required=True),
-                                        "Ano Comp.": st.column_config.SelectboxColumn("Ano Comp.", options=lista_anos, required=True),
-                                        "Fornecedor": st.column_config.SelectboxColumn(
-                                            "Fornecedor (Selecione)", 
-                                            options=lista_fornecedores_cadastrados, 
-                                            required=True
-                                        ),
-                                        "Categoria": st.column_config.SelectboxColumn(
-                                            "Classificação (Selecione)", 
-                                            options=lista_categorias_cadastradas, 
-                                            required=True
-                                        ),
-                                        "Observação": st.column_config.TextColumn("Observação")
-                                    }
-                                )
-
-                                if st.button("💾 Lançar Despesas Selecionadas", type="primary"):
-                                    linhas_marcadas = edited_pendentes[edited_pendentes["Lançar?"] == True]
-
-                                    if linhas_marcadas.empty:
-                                        st.warning("Selecione pelo menos uma despesa marcando a caixinha 'Lançar?'.")
-                                    else:
-                                        lista_dados_finais = []
-                                        erro_encontrado = False
-
-                                        for index, row in linhas_marcadas.iterrows():
-                                            if not row['Fornecedor'] or str(row['Fornecedor']).strip() == "":
-                                                st.error(f"⚠️ Selecione um Fornecedor na lista para a despesa de R$ {row['Valor (R$)']:.2f}")
-                                                erro_encontrado = True
-                                                continue
-                                            
-                                            if not row['Categoria'] or str(row['Categoria']).strip() == "":
-                                                st.error(f"⚠️ Selecione uma Classificação na lista para a despesa de R$ {row['Valor (R$)']:.2f}")
-                                                erro_encontrado = True
-                                                continue
-
-                                            nome_forn = str(row['Fornecedor']).strip()
-                                            nome_cat = str(row['Categoria']).strip()
-                                            mes_num = MESES_PT_INV[row['Mês Comp.']]
-                                            comp_fmt = f"{row['Ano Comp.']}-{mes_num:02d}"
-
-                                            dados_linha = {
-                                                "data_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                                "tipo": "Despesa",
-                                                "valor": row['Valor (R$)'],
-                                                "fornecedor": nome_forn,
-                                                "data_liquidacao": pd.to_datetime(row['Data Extrato']).strftime("%Y-%m-%d"),
-                                                "competencia": comp_fmt,
-                                                "status": "Pago", 
-                                                "categoria": nome_cat,
-                                                "observacao": str(row['Observação']) if pd.notna(row['Observação']) else ""
-                                            }
-                                            lista_dados_finais.append(dados_linha)
-
-                                        if lista_dados_finais and not erro_encontrado:
-                                            salvar_lote_lancamentos(pd.DataFrame(lista_dados_finais))
-                                            st.success(f"🎉 {len(lista_dados_finais)} despesa(s) lançada(s) com sucesso!")
-                                            time.sleep(2)
-                                            st.cache_data.clear()
-                                            st.rerun()
-
+                                exibir_pendentes_extrato(df_nao_encontrados)
                             else:
                                 st.success("🎉 Sensacional! Todas as despesas de saída identificadas neste extrato bancário já estão devidamente lançadas no sistema.")
 
+                        with tab_propostos:
+                            if not df_propostos.empty:
+                                exibir_pares_propostos(df_propostos)
+                            else:
+                                st.info("Nenhum par novo encontrado entre o extrato e as despesas do sistema.")
+
                         with tab_ok:
                             if not df_conciliados.empty:
-                                st.success("As despesas abaixo foram localizadas tanto no extrato bancário quanto no seu sistema:")
-                                view_ok = df_conciliados[['Data', 'Historico', 'Valor_Absoluto', 'fornecedor', 'categoria']].copy()
-                                view_ok.columns = ['📅 Data', '🏦 Histórico (Banco)', '💵 Valor', '🛒 Fornecedor (Sistema)', '📂 Categoria (Sistema)']
-                                view_ok['📅 Data'] = pd.to_datetime(view_ok['📅 Data']).dt.strftime('%d/%m/%Y')
-                                st.dataframe(view_ok, use_container_width=True, column_config={"💵 Valor": st.column_config.NumberColumn(format="R$ %.2f")}, hide_index=True)
+                                exibir_conciliados(df_conciliados)
+                            elif not df_propostos.empty:
+                                st.info("Nenhuma conciliação confirmada ainda: confira a aba 'Pares a Confirmar'.")
                             else:
                                 st.error("Nenhum lançamento foi conciliado. (Talvez o arquivo anexado não contemple os dias das despesas lançadas).")
                     
@@ -1259,7 +1690,7 @@ if check_password():
     # --- ABA: CONFIGURAÇÕES ---
     elif menu == "Configurações":
         st.header("⚙️ Configurações")
-        tab_fornecedores, tab_categorias, tab_outros = st.tabs(["🏭 Fornecedores", "📂 Classificações", "Outros"])
+        tab_fornecedores, tab_categorias, tab_outros, tab_diagnostico = st.tabs(["🏭 Fornecedores", "📂 Classificações", "Outros", "🩺 Diagnóstico"])
         
         with tab_fornecedores:
             st.subheader("Gerenciar Fornecedores")
@@ -1280,9 +1711,8 @@ if check_password():
             )
             if st.button("💾 Salvar Alterações nos Fornecedores"):
                 salvar_tabela_fornecedores(df_editado)
-                st.success("Lista de fornecedores atualizada com sucesso!")
-                st.cache_data.clear()
-                st.rerun()
+                registrar_aviso("Lista de fornecedores atualizada com sucesso!")
+                reexecutar()
                 
         with tab_categorias:
             st.subheader("Gerenciar Classificações (Categorias)")
@@ -1299,8 +1729,54 @@ if check_password():
             )
             if st.button("💾 Salvar Alterações nas Classificações"):
                 salvar_tabela_categorias(df_cat_editado)
-                st.success("Lista de classificações atualizada com sucesso!")
-                st.cache_data.clear()
-                st.rerun()
+                registrar_aviso("Lista de classificações atualizada com sucesso!")
+                reexecutar()
+
+        with tab_diagnostico:
+            st.subheader("Diagnóstico de Desempenho")
+            st.info("Tempo de cada rerun por etapa e operações no Google Sheets feitas pelo próprio rerun (primeiro plano). 'Interface' é o que sobra do total: montar widgets, tabelas e gráficos. O rerun atual entra no histórico quando termina.")
+            historico = st.session_state.get("diagnostico_historico", [])
+            totais_sessao = st.session_state.get("diagnostico_sessao", dict.fromkeys(CONTADORES, 0))
+            totais_processo = repo.planilha.contadores()
+
+            st.markdown("**Google Sheets nesta sessão (só os reruns, em primeiro plano)**")
+            d1, d2, d3, d4 = st.columns(4)
+            d1.metric("Leituras", totais_sessao["leituras"])
+            d2.metric("Gravações", totais_sessao["gravacoes"])
+            d3.metric("Células", f"{totais_sessao['celulas']:,}".replace(",", "."))
+            d4.metric("Bytes (aprox.)", f"{totais_sessao['bytes']:,}".replace(",", "."))
+            bytes_processo = f"{totais_processo['bytes']:,}".replace(",", ".")
+            st.caption(
+                "Os envios das gravações para a planilha saem pela sincronização em segundo plano: não entram nos "
+                "números desta sessão nem nas colunas sheets_* do histórico, só no total do servidor. "
+                f"Desde que o servidor subiu (todas as sessões e a sincronização em segundo plano): "
+                f"{totais_processo['leituras']} leitura(s), {totais_processo['gravacoes']} gravação(ões), {bytes_processo} bytes."
+            )
 
+            if historico:
+                df_historico = historico_para_quadro(historico)
+                colunas_ms = [f"{nome}_ms" for nome in SECOES]
+                ultimo = df_historico.iloc[0]
+                st.markdown(f"**Último rerun** ({ultimo['tela'] or 'login'}, {ultimo['registrada_em']}): {ultimo['total_ms']:.0f} ms")
+                st.bar_chart(pd.Series(ultimo[colunas_ms].to_numpy(dtype=float), index=list(SECOES.values()), name="ms"), horizontal=True)
+
+                st.markdown("**Média por tela (ms)**")
+                st.dataframe(
+                    df_historico.groupby("tela")[["total_ms"] + colunas_ms].mean().round(1)
+                    .rename(columns={f"{nome}_ms": rotulo for nome, rotulo in SECOES.items()} | {"total_ms": "Total"}),
+                    use_container_width=True
+                )
+
+                st.markdown(f"**Histórico** (últimos {len(df_historico)} reruns)")
+                st.dataframe(df_historico, use_container_width=True, hide_index=True)
+                c_exp1, c_exp2, c_exp3 = st.columns(3)
+                c_exp1.download_button("⬇️ Exportar CSV", df_historico.to_csv(index=False).encode("utf-8"), "diagnostico.csv", "text/csv")
+                c_exp2.download_button("⬇️ Exportar JSON", df_historico.to_json(orient="records", force_ascii=False, indent=1).encode("utf-8"), "diagnostico.json", "application/json")
+                if c_exp3.button("🧹 Limpar histórico"):
+                    st.session_state.pop("diagnostico_historico", None)
+                    st.session_state.pop("diagnostico_sessao", None)
+                    reexecutar()
+            else:
+                st.caption("Nenhum rerun medido ainda nesta sessão.")
 
+registrar_medicao()
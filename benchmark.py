@@ -0,0 +1,312 @@
+"""Benchmark dos caminhos críticos do app com dados sintéticos.
+
+Uso:
+    python benchmark.py                                  # 10 mil e 100 mil lançamentos
+    python benchmark.py --tamanhos 10000 100000 1000000 --saida resultados.jsonl
+
+Cada medição vira uma linha JSON (caso, linhas, tempos em segundos, ambiente e commit), anexada
+ao arquivo de saída, para acompanhar regressões ao longo do tempo. Nada toca o Google: a planilha
+é a PlanilhaFake e a base SQLite fica numa pasta temporária.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from planilhas import PlanilhaFake, COLUNA_ID, gerar_id
+from repositorio import Repositorio, tipar_lancamentos, atualizar_tipados, juntar_tipados, COLUNAS_FORNECEDORES
+from indices import IndiceFiltros, IndiceVencimentos
+from instantaneos import Instantaneos
+from importacao import importar_excel
+from ofx import ler_extrato, ler_varios_ofx
+from conciliacao import conciliar, IndiceSugestoes
+
+MESES_PT = {
+    1: "Janeiro", 2: "Fevereiro", 3: "Março", 4: "Abril", 5: "Maio", 6: "Junho",
+    7: "Julho", 8: "Agosto", 9: "Setembro", 10: "Outubro", 11: "Novembro", 12: "Dezembro"
+}
+MESES_PT_INV = {v: k for k, v in MESES_PT.items()}
+# As mesmas colunas de COLUNAS_FILTRO no app
+COLUNAS_FILTRO = ['tipo', 'categoria', 'status', 'fornecedor', 'ano_comp', 'mes_comp_nome']
+CATEGORIAS = [
+    "Mercadoria", "Frete", "Energia", "Comissão", "Manutenção", "Combustível",
+    "Salário", "Simples Nacional", "INSS", "FGTS", "Aluguel", "Internet", "Vendas"
+]
+
+# Escrever um .xlsx grande leva mais que importá-lo: a planilha do teste de importação é limitada
+MAX_LINHAS_EXCEL = 100_000
+TAMANHO_LOTE = 1_000
+# Linhas alteradas na planilha por "outro operador" em cada rodada da revalidação
+ALTERACOES_REMOTAS = 100
+
+
+# --- GERADOR DE DADOS SINTÉTICOS ---
+def gerar_fornecedores(qtd, rng):
+    prefixos = np.array(["Distribuidora", "Comercial", "Atacadão", "Laticínios", "Transportes", "Auto Posto", "Padaria"])
+    nomes = [f"{prefixos[i % len(prefixos)]} {i:04d} Ltda" for i in range(qtd)]
+    return pd.DataFrame({
+        "nome": nomes,
+        "cnpj": [f"{rng.integers(10**13, 10**14)}" for _ in range(qtd)],
+        "telefone": "", "login_app": "", "senha_app": "",
+    }, columns=COLUNAS_FORNECEDORES)
+
+
+def gerar_categorias():
+    return pd.DataFrame({"nome": CATEGORIAS})
+
+
+def gerar_lancamentos(n, fornecedores, rng, inicio="2023-01-01", dias=3 * 365):
+    """Lançamentos como vêm da planilha: 80% despesas, fornecedores com frequência desigual (Zipf)."""
+    despesa = rng.random(n) < 0.8
+    # Poucos fornecedores concentram a maior parte das compras, como num mercadinho de verdade
+    pos_fornecedor = np.minimum(rng.zipf(1.3, n) - 1, len(fornecedores) - 1)
+    fornecedor = np.where(despesa, np.asarray(fornecedores)[pos_fornecedor], "Cliente Final")
+    categoria = np.where(despesa, np.asarray(CATEGORIAS[:-1])[rng.integers(0, len(CATEGORIAS) - 1, n)], "Vendas")
+    data = pd.Timestamp(inicio) + pd.to_timedelta(rng.integers(0, dias, n), unit="D")
+    competencia = (data - pd.to_timedelta(rng.integers(0, 40, n), unit="D")).strftime("%Y-%m")
+    status = np.where(despesa, np.where(rng.random(n) < 0.15, "A Pagar", "Pago"), "Recebido")
+    observacao = np.where(rng.random(n) < 0.1, "NF " + pd.Series(rng.integers(1000, 99999, n)).astype(str), "")
+    return pd.DataFrame({
+        COLUNA_ID: [f"L{i:012x}" for i in range(n)],
+        "data_registro": data.strftime("%Y-%m-%d 09:00:00"),
+        "tipo": np.where(despesa, "Despesa", "Receita"),
+        "valor": np.round(rng.lognormal(4.5, 1.2, n), 2),
+        "fornecedor": fornecedor,
+        "data_liquidacao": data.strftime("%Y-%m-%d"),
+        "competencia": competencia,
+        "status": status,
+        "categoria": categoria,
+        "observacao": observacao,
+    })
+
+
+def gerar_ofx(lancamentos, qtd, rng, proporcao_conhecidas=0.7):
+    """Extrato OFX 1.x (SGML) com `qtd` saídas; parte delas corresponde a despesas existentes."""
+    despesas = lancamentos[lancamentos['tipo'] == "Despesa"]
+    conhecidas = despesas.sample(min(int(qtd * proporcao_conhecidas), len(despesas)), random_state=int(rng.integers(1 << 31)))
+    novas = qtd - len(conhecidas)
+    datas = list(conhecidas['data_liquidacao'].str.replace("-", "")) + list(
+        (pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, novas), unit="D")).strftime("%Y%m%d")
+    )
+    valores = list(conhecidas['valor']) + list(np.round(rng.lognormal(4.5, 1.2, novas), 2))
+    memos = [f"PAG BOLETO {f.upper()}" for f in conhecidas['fornecedor']] + [f"PIX ENVIADO {i:06d}" for i in range(novas)]
+    transacoes = "".join(
+        f"<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>{d}120000[-3:BRT]\n<TRNAMT>-{v:.2f}\n<FITID>{i:010d}\n<MEMO>{m}\n</STMTTRN>\n"
+        for i, (d, v, m) in enumerate(zip(datas, valores, memos))
+    )
+    return (
+        "OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\nENCODING:USASCII\nCHARSET:1252\n\n"
+        "<OFX>\n<BANKMSGSRSV1>\n<STMTTRNRS>\n<STMTRS>\n<CURDEF>BRL\n"
+        "<BANKACCTFROM>\n<BANKID>341\n<BRANCHID>0001\n<ACCTID>12345-6\n</BANKACCTFROM>\n"
+        f"<BANKTRANLIST>\n{transacoes}</BANKTRANLIST>\n</STMTRS>\n</STMTTRNRS>\n</BANKMSGSRSV1>\n</OFX>\n"
+    ).encode("cp1252")
+
+
+def gerar_excel(lancamentos):
+    """Planilha .xlsx no formato da aba 'Importar Planilha' (datas DD/MM/AAAA, valores em texto BR)."""
+    livro = Workbook(write_only=True)
+    aba = livro.create_sheet()
+    aba.append(["valor", "data_liquidacao", "mes_competencia", "ano_competencia", "fornecedor", "categoria", "status", "observacao"])
+    competencia = pd.to_datetime(lancamentos['competencia'], format="%Y-%m")
+    valores = lancamentos['valor'].map(lambda v: f"{v:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
+    datas = pd.to_datetime(lancamentos['data_liquidacao']).dt.strftime("%d/%m/%Y")
+    for linha in zip(valores, datas, competencia.dt.month.map(MESES_PT), competencia.dt.year,
+                     lancamentos['fornecedor'], lancamentos['categoria'], lancamentos['status'], lancamentos['observacao']):
+        aba.append(linha)
+    saida = io.BytesIO()
+    livro.save(saida)
+    saida.seek(0)
+    return saida
+
+
+# --- MEDIÇÃO ---
+def medir(caso, linhas, funcao, repeticoes, preparar=None, **extra):
+    """Roda `funcao(*preparar())` algumas vezes; o preparo de cada rodada fica fora do tempo."""
+    tempos = []
+    for _ in range(repeticoes):
+        argumentos = preparar() if preparar else ()
+        inicio = time.perf_counter()
+        funcao(*argumentos)
+        tempos.append(time.perf_counter() - inicio)
+    resultado = {
+        "caso": caso, "linhas": linhas, "repeticoes": repeticoes,
+        "segundos_min": min(tempos), "segundos_mediana": statistics.median(tempos), "segundos_max": max(tempos),
+        **extra,
+    }
+    print(f"  {caso:<28} {linhas:>9} linhas  {resultado['segundos_min'] * 1000:>10.1f} ms", file=sys.stderr)
+    return resultado
+
+
+def _novo_repositorio(pasta, planilha):
+    caminho = os.path.join(pasta, f"{gerar_id()}.db")
+    return Repositorio(caminho, planilha)
+
+
+def medir_tamanho(n, repeticoes, pasta, rng):
+    fornecedores = gerar_fornecedores(max(50, n // 200), rng)
+    lancamentos = gerar_lancamentos(n, fornecedores['nome'], rng)
+    abas = {"lancamentos": lancamentos, "fornecedores": fornecedores, "categorias": gerar_categorias()}
+    resultados = []
+
+    # Carga: planilha -> SQLite (primeira abertura), SQLite -> quadro tipado (carregar_dados) e o
+    # mesmo quadro vindo do instantâneo Parquet (servidor recém-iniciado)
+    planilha = PlanilhaFake(abas)
+    resultados.append(medir(
+        "carregar_planilha", n, lambda repo: repo.carregar_da_planilha("lancamentos"), repeticoes,
+        preparar=lambda: (_novo_repositorio(pasta, planilha),)
+    ))
+    repo = _novo_repositorio(pasta, planilha)
+    repo.carregar_da_planilha("lancamentos")
+    resultados.append(medir("ler_sqlite", n, lambda: repo.ler("lancamentos"), repeticoes))
+    bruto = repo.ler("lancamentos")
+    resultados.append(medir("tipar_lancamentos", n, lambda: tipar_lancamentos(bruto, MESES_PT), repeticoes))
+    df = tipar_lancamentos(bruto, MESES_PT)
+    # Partições por ano de competência: só o ano mais recente (calendário, edição do ano corrente)
+    # e a junção de todos os anos já tipados (relatório de vários anos)
+    particoes = repo.particoes()
+    ultimo_ano = particoes['ano'].iloc[-1]
+    resultados.append(medir(
+        "ler_particao_ano", int(particoes['qtd'].iloc[-1]),
+        lambda: tipar_lancamentos(repo.ler_particoes([ultimo_ano]), MESES_PT), repeticoes
+    ))
+    quadros = [tipar_lancamentos(repo.ler_particoes([ano]), MESES_PT) for ano in particoes['ano']]
+    resultados.append(medir("juntar_particoes", n, lambda: juntar_tipados(quadros), repeticoes, particoes=len(quadros)))
+    instantaneos = Instantaneos(os.path.join(pasta, "instantaneos"))
+    resultados.append(medir("gravar_instantaneo", n, lambda: instantaneos.gravar("lancamentos_tipados", n, df), repeticoes))
+    resultados.append(medir("ler_instantaneo", n, lambda: instantaneos.ler("lancamentos_tipados", n), repeticoes))
+
+    # Relatórios: índices, filtro da barra lateral, cubo mensal e página do extrato
+    resultados.append(medir("indice_filtros_montar", n, lambda: IndiceFiltros(df, COLUNAS_FILTRO), repeticoes))
+    indice = IndiceFiltros(df, COLUNAS_FILTRO)
+    categorias = [c for c in CATEGORIAS if c != "Energia"]
+    fornecedores_filtro = list(fornecedores['nome'][: len(fornecedores) // 2]) + ["Cliente Final"]
+    periodo = (pd.Timestamp("2024-01-01"), pd.Timestamp("2024-12-31"))
+
+    def filtrar():
+        mascara = indice.mascara({"tipo": ["Despesa", "Receita"], "categoria": categorias, "fornecedor": fornecedores_filtro}, periodo)
+        pagina = indice.ordenar_por_data(mascara, decrescente=True)[:50]
+        return df.iloc[pagina]
+    resultados.append(medir("filtrar_relatorio", n, filtrar, repeticoes))
+    resultados.append(medir(
+        "agregar_cubo", n,
+        lambda: repo.ler_cubo().groupby(["competencia", "tipo", "categoria"], dropna=False)["valor"].sum(), repeticoes
+    ))
+    resultados.append(medir("indice_vencimentos_montar", n, lambda: IndiceVencimentos(df), repeticoes))
+
+    # Conciliação: leitura do OFX, casamento com as despesas e sugestões para as pendentes
+    qtd_ofx = max(100, min(n // 10, 100_000))
+    conteudo = gerar_ofx(lancamentos, qtd_ofx, rng)
+    resultados.append(medir("ofx_ler", qtd_ofx, lambda: ler_extrato(conteudo), repeticoes, bytes=len(conteudo)))
+    resultados.append(medir(
+        "ofx_ler_varios", qtd_ofx * 4, lambda: ler_varios_ofx([conteudo] * 4), repeticoes, arquivos=4, processos=os.cpu_count()
+    ))
+    extrato = ler_extrato(conteudo)
+    saidas = pd.DataFrame({"Data": extrato['data'], "Valor_Absoluto": extrato['valor'].abs(), "Historico": extrato['descricao']})
+    despesas = df[df['tipo'] == "Despesa"]
+    resultados.append(medir("conciliar", qtd_ofx, lambda: conciliar(saidas, despesas, dias=3, tolerancia=0.05), repeticoes, despesas=len(despesas)))
+    livro = pd.DataFrame({"lancamento_id": pd.Series(dtype=object), "historico": pd.Series(dtype=object)})
+    resultados.append(medir("sugestoes_montar", n, lambda: IndiceSugestoes.treinar(df, livro), repeticoes))
+    sugestoes = IndiceSugestoes.treinar(df, livro)
+    resultados.append(medir("sugestoes_consultar", qtd_ofx, lambda: sugestoes.sugerir_varios(saidas['Historico']), repeticoes))
+
+    # Importação de Excel (planilha limitada a MAX_LINHAS_EXCEL linhas)
+    qtd_excel = min(n, MAX_LINHAS_EXCEL)
+    excel = gerar_excel(lancamentos[lancamentos['tipo'] == "Despesa"].head(qtd_excel))
+    resultados.append(medir(
+        "importar_excel", qtd_excel, lambda arquivo: importar_excel(arquivo, MESES_PT_INV), repeticoes,
+        preparar=lambda: (io.BytesIO(excel.getvalue()),), bytes=len(excel.getvalue())
+    ))
+
+    # Gravação pelo mesmo caminho do app (ids gerados, base local, versão e pendência): um lançamento
+    # (formulário) e um lote, e depois o envio da pendência para a planilha falsa
+    lote = lancamentos.drop(columns=[COLUNA_ID]).head(TAMANHO_LOTE)
+    resultados.append(medir("salvar_lancamento_local", 1, lambda: repo.salvar_lancamentos(lote.head(1)), repeticoes))
+    resultados.append(medir("salvar_lote_local", TAMANHO_LOTE, lambda: repo.salvar_lancamentos(lote), repeticoes))
+    repo.sincronizar_pendencias()
+
+    def preparar_envio():
+        repo.salvar_lancamentos(lote)
+        return ()
+    chamadas_antes = len(planilha.chamadas)
+    resultados.append(medir("sincronizar_planilha", TAMANHO_LOTE, repo.sincronizar_pendencias, repeticoes, preparar=preparar_envio))
+    resultados[-1]["chamadas_planilha"] = (len(planilha.chamadas) - chamadas_antes) / repeticoes
+
+    # Revalidação: planilha sem mudança (só o marcador de revisão) e com algumas linhas alteradas por
+    # outro operador (diferença linha a linha), mais a atualização do quadro tipado com essas linhas
+    repo.revalidar()
+    resultados.append(medir("revalidar_sem_mudanca", n, repo.revalidar, repeticoes))
+    cabecalho = planilha.cabecalhos["lancamentos"]
+
+    def preparar_mudanca_remota():
+        for linha in rng.choice(len(planilha.linhas["lancamentos"]), ALTERACOES_REMOTAS, replace=False):
+            planilha.linhas["lancamentos"][linha][cabecalho.index("valor")] = round(float(rng.lognormal(4.5, 1.2)), 2)
+        planilha.revisao += 1
+        return ()
+    resultados.append(medir(
+        "revalidar_diferencas", n, repo.revalidar, repeticoes, preparar=preparar_mudanca_remota, alteradas=ALTERACOES_REMOTAS
+    ))
+    versao = repo.versao("lancamentos")
+    ids = repo.ids_alterados("lancamentos", versao - 1, versao)
+    resultados.append(medir(
+        "atualizar_tipados", len(ids), lambda: atualizar_tipados(df, ids, repo.ler_lancamentos_por_id(ids), MESES_PT), repeticoes
+    ))
+
+    for resultado in resultados:
+        resultado["tamanho"] = n
+    return resultados
+
+
+# --- EXECUÇÃO ---
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dos caminhos críticos do app com dados sintéticos.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000], help="quantidades de lançamentos")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", default="-", help="arquivo JSON Lines (anexa); '-' para a saída padrão")
+    args = parser.parse_args(argv)
+
+    ambiente = {
+        "execucao": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit_atual(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+    rng = np.random.default_rng(args.semente)
+    saida = sys.stdout if args.saida == "-" else open(args.saida, "a", encoding="utf-8")
+    try:
+        with tempfile.TemporaryDirectory() as pasta:
+            for n in args.tamanhos:
+                print(f"{n} lançamentos:", file=sys.stderr)
+                for resultado in medir_tamanho(n, args.repeticoes, pasta, rng):
+                    saida.write(json.dumps({**ambiente, **resultado}, ensure_ascii=False) + "\n")
+                saida.flush()
+    finally:
+        if saida is not sys.stdout: saida.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import math
+import re
+import unicodedata
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+
+# --- CONCILIAÇÃO DO EXTRATO COM AS DESPESAS ---
+# Cada saída do banco é casada com no máximo uma despesa, e cada despesa com no máximo uma saída.
+# Os candidatos vêm de buscas por intervalo numa chave ordenada (centavos, dia), nunca de um
+# produto cruzado: para cada saída só são vistas as despesas com valor e data dentro da janela.
+# Entre os candidatos, vence o mais próximo em dias, depois em centavos, e por fim o fornecedor
+# mais parecido com o histórico do banco.
+
+# Dias desde 1970 cabem com folga em 10^6; a chave junta centavos e dia num único inteiro ordenável
+_ESCALA_DIA = 1_000_000
+
+_PALAVRA = re.compile(r"[A-Z0-9]{3,}")
+
+
+def _palavras(texto):
+    sem_acento = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode()
+    return set(_PALAVRA.findall(sem_acento.upper()))
+
+
+def similaridade(historico, fornecedor):
+    """Fração das palavras do fornecedor (3+ letras, sem acento) que aparecem no histórico do banco."""
+    nomes = _palavras(fornecedor)
+    if not nomes: return 0.0
+    return len(nomes & _palavras(historico)) / len(nomes)
+
+
+def _dias(datas):
+    return pd.to_datetime(pd.Series(datas)).to_numpy(dtype="datetime64[D]").astype(np.int64)
+
+
+def _centavos(valores):
+    return np.round(np.asarray(valores, dtype="float64") * 100).astype(np.int64)
+
+
+def conciliar(saidas, despesas, dias=0, tolerancia=0.0):
+    """Casa saídas do extrato com despesas, um para um.
+
+    `saidas` tem Data, Valor_Absoluto e Historico; `despesas` é o quadro tipado (índice = id) com
+    data_liquidacao, valor e fornecedor. `dias` é a janela ±N dias e `tolerancia` a diferença
+    aceita no valor, em reais. Devolve um DataFrame com `saida` (índice em `saidas`), `id` da
+    despesa, `dif_dias`, `dif_valor` e `similaridade`.
+    """
+    colunas = ["saida", "id", "dif_dias", "dif_valor", "similaridade"]
+    despesas = despesas[despesas['data_liquidacao'].notna() & despesas['valor'].notna()]
+    if saidas.empty or despesas.empty:
+        return pd.DataFrame(columns=colunas)
+
+    chave_despesa = _centavos(despesas['valor']) * _ESCALA_DIA + _dias(despesas['data_liquidacao'])
+    ordem = np.argsort(chave_despesa, kind="stable")
+    chave_ordenada = chave_despesa[ordem]
+
+    centavos_saida = _centavos(saidas['Valor_Absoluto'])
+    dias_saida = _dias(saidas['Data'])
+    tol = int(round(tolerancia * 100))
+
+    # Um intervalo de busca por centavo dentro da tolerância, todos vetorizados
+    pos_saida, pos_despesa = [], []
+    for delta in range(-tol, tol + 1):
+        base = (centavos_saida + delta) * _ESCALA_DIA + dias_saida
+        inicio = np.searchsorted(chave_ordenada, base - dias, side="left")
+        fim = np.searchsorted(chave_ordenada, base + dias, side="right")
+        qtd = fim - inicio
+        if not qtd.any(): continue
+        # Expande cada intervalo [inicio, fim) em posições, sem laço
+        deslocamento = np.arange(qtd.sum()) - np.repeat(np.cumsum(qtd) - qtd, qtd)
+        pos_saida.append(np.repeat(np.arange(len(saidas)), qtd))
+        pos_despesa.append(ordem[np.repeat(inicio, qtd) + deslocamento])
+    if not pos_saida:
+        return pd.DataFrame(columns=colunas)
+
+    candidatos = pd.DataFrame({"s": np.concatenate(pos_saida), "d": np.concatenate(pos_despesa)})
+    dias_despesa = chave_despesa[candidatos['d']] % _ESCALA_DIA
+    centavos_despesa = chave_despesa[candidatos['d']] // _ESCALA_DIA
+    candidatos['dif_dias'] = dias_despesa - dias_saida[candidatos['s']]
+    candidatos['dif_centavos'] = centavos_despesa - centavos_saida[candidatos['s']]
+    historicos = saidas['Historico'].to_numpy()
+    fornecedores = despesas['fornecedor'].astype(object).to_numpy()
+    candidatos['similaridade'] = [similaridade(historicos[s], fornecedores[d]) for s, d in zip(candidatos['s'], candidatos['d'])]
+    candidatos = candidatos.assign(
+        _dias=candidatos['dif_dias'].abs(), _centavos=candidatos['dif_centavos'].abs(), _sim=-candidatos['similaridade']
+    ).sort_values(["_dias", "_centavos", "_sim", "s", "d"], kind="stable")
+
+    # Guloso na ordem de preferência: cada saída e cada despesa entram em um único par
+    usadas_s, usadas_d, pares = set(), set(), []
+    for s, d, dif_dias, dif_centavos, sim in candidatos[["s", "d", "dif_dias", "dif_centavos", "similaridade"]].itertuples(index=False, name=None):
+        if s in usadas_s or d in usadas_d: continue
+        usadas_s.add(s)
+        usadas_d.add(d)
+        pares.append((saidas.index[s], despesas.index[d], dif_dias, dif_centavos / 100, sim))
+    return pd.DataFrame(pares, columns=colunas)
+
+
+# --- LIVRO DA CONCILIAÇÃO ---
+SITUACAO_CONCILIADO = "conciliado"
+SITUACAO_LANCADO = "lancado"
+SITUACAO_IGNORADO = "ignorado"
+ROTULOS_SITUACAO = {SITUACAO_CONCILIADO: "🏦 Conciliado", SITUACAO_LANCADO: "🏦 Lançado do extrato"}
+
+
+def conta_do_extrato(extrato):
+    """Identificação banco/agência/conta de cada transação; com o FITID forma a chave do livro."""
+    return extrato['banco'].astype(str) + "/" + extrato['agencia'].astype(str) + "/" + extrato['conta'].astype(str)
+
+
+def registros_livro(transacoes, lancamento_ids, situacao, data_registro):
+    """Linhas do livro para as transações (com conta_livro, fitid e Historico) e os lançamentos correspondentes."""
+    return pd.DataFrame({
+        "conta": transacoes['conta_livro'].to_numpy(),
+        "fitid": transacoes['fitid'].to_numpy(),
+        "lancamento_id": lancamento_ids,
+        "situacao": situacao,
+        "data_registro": data_registro,
+        "historico": transacoes['Historico'].to_numpy(),
+    })
+
+
+# --- SUGESTÕES DE FORNECEDOR E CATEGORIA ---
+# Índice invertido palavra -> (fornecedor, categoria), aprendido com os históricos do banco já
+# conciliados ou lançados e com os próprios lançamentos (nome do fornecedor e observação).
+# A consulta só percorre as listas das palavras do histórico, sem varrer os lançamentos.
+
+# Uma escolha feita sobre o histórico do banco vale mais que o nome do fornecedor no lançamento
+PESO_LIVRO = 3.0
+# Palavras comuns (PAG, PIX, LTDA) aparecem com quase todos os rótulos e quase não pesam; guardar
+# só os mais frequentes de cada palavra mantém a consulta limitada, não importa o tamanho da base
+MAX_ROTULOS_POR_PALAVRA = 32
+
+
+class IndiceSugestoes:
+    """Sugere (fornecedor, categoria) para um histórico do banco, com uma confiança entre 0 e 1."""
+
+    def __init__(self, textos, fornecedores, categorias, pesos):
+        rotulos = {}
+        self.rotulos = []
+        self.postings = defaultdict(lambda: defaultdict(float))
+        for texto, fornecedor, categoria, peso in zip(textos, fornecedores, categorias, pesos):
+            rotulo = rotulos.setdefault((fornecedor, categoria), len(rotulos))
+            if rotulo == len(self.rotulos): self.rotulos.append((fornecedor, categoria))
+            for termo in _palavras(texto):
+                self.postings[termo][rotulo] += peso
+        # Cada palavra vota com peso idf, repartido entre os rótulos na proporção do que foi visto
+        total = max(len(self.rotulos), 1)
+        self.idf = {termo: math.log(1 + total / len(lista)) for termo, lista in self.postings.items()}
+        self.idf_desconhecido = math.log(1 + total)
+        self.somas = {termo: sum(lista.values()) for termo, lista in self.postings.items()}
+        self.postings = {
+            termo: dict(sorted(lista.items(), key=lambda item: -item[1])[:MAX_ROTULOS_POR_PALAVRA])
+            for termo, lista in self.postings.items()
+        }
+
+    @classmethod
+    def treinar(cls, lancamentos, livro):
+        """Monta o índice a partir do quadro tipado de lançamentos (índice = id) e do livro da conciliação."""
+        despesas = lancamentos.loc[lancamentos['tipo'] == "Despesa", ['fornecedor', 'categoria', 'observacao']]
+        despesas = despesas.dropna(subset=['fornecedor', 'categoria']).astype({'fornecedor': str, 'categoria': str})
+        proprios = (
+            despesas.assign(texto=despesas['fornecedor'] + " " + despesas['observacao'].astype("string").fillna(""))
+            .groupby(['texto', 'fornecedor', 'categoria']).size().rename("peso").reset_index()
+        )
+        # get_indexer usa a tabela de hash do índice, em vez de montar um conjunto com todos os ids
+        livro = livro[livro['historico'].notna() & (despesas.index.get_indexer(livro['lancamento_id']) >= 0)]
+        escolhas = despesas.loc[livro['lancamento_id'], ['fornecedor', 'categoria']].assign(
+            texto=livro['historico'].astype(str).to_numpy(), peso=PESO_LIVRO
+        )
+        base = pd.concat([proprios, escolhas], ignore_index=True)
+        return cls(base['texto'], base['fornecedor'], base['categoria'], base['peso'])
+
+    def sugerir(self, historico):
+        """(fornecedor, categoria, confiança); sem nenhuma palavra conhecida devolve (None, None, 0.0)."""
+        pontos = defaultdict(float)
+        total = 0.0
+        for termo in _palavras(historico):
+            lista = self.postings.get(termo)
+            if lista is None:
+                # Números desconhecidos (datas, documentos) mudam a cada transação: não contam contra
+                if not termo.isdigit(): total += self.idf_desconhecido
+                continue
+            idf, soma = self.idf[termo], self.somas[termo]
+            total += idf
+            for rotulo, peso in lista.items():
+                pontos[rotulo] += idf * peso / soma
+        if not pontos: return None, None, 0.0
+        melhor = max(pontos, key=pontos.get)
+        return (*self.rotulos[melhor], pontos[melhor] / total)
+
+    def sugerir_varios(self, historicos):
+        """DataFrame com fornecedor, categoria e confianca para cada histórico, no mesmo índice."""
+        return pd.DataFrame(
+            [self.sugerir(h) for h in historicos], index=historicos.index, columns=["fornecedor", "categoria", "confianca"]
+        )
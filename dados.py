@@ -0,0 +1,75 @@
+import threading
+from functools import wraps
+
+# --- CONJUNTOS DE DADOS POR PÁGINA ---
+# Cada página do app declara os conjuntos de dados que monta (fornecedores, lançamentos, cubo...).
+# As funções de carga são marcadas com @conjunto: só rodam quando a página pede e, num mesmo rerun,
+# uma vez por combinação de argumentos. A lista de fornecedores usada pelo formulário e pela tabela
+# de edição é a mesma, sem repetir a consulta da versão nem a cópia que o cache_data entrega.
+# Pedir um conjunto que a página não declarou é erro: a declaração diz exatamente o que ela lê.
+# Depois de uma gravação (@altera_dados) a memória do rerun é descartada e tudo é lido de novo.
+# Fora de um rerun completo (ex.: rerun só de um fragmento) as funções rodam direto, sem memória.
+
+_atual = threading.local()
+
+
+class ConjuntoNaoDeclarado(KeyError):
+    pass
+
+
+class Rodada:
+    """Página do rerun, conjuntos que ela declarou e resultados já carregados."""
+
+    def __init__(self, pagina, conjuntos=()):
+        self.pagina = pagina
+        self.conjuntos = frozenset(conjuntos)
+        self.memoria = {}
+
+
+def iniciar_rodada(pagina, conjuntos=()):
+    _atual.rodada = Rodada(pagina, conjuntos)
+    return _atual.rodada
+
+
+def rodada_atual():
+    return getattr(_atual, "rodada", None)
+
+
+def encerrar_rodada():
+    _atual.rodada = None
+
+
+def _congelar(valor):
+    # Listas viram tuplas para servir de chave (ex.: os anos pedidos)
+    if isinstance(valor, (list, tuple)): return tuple(_congelar(v) for v in valor)
+    return valor
+
+
+def conjunto(nome):
+    """Decorador: a função carrega o conjunto `nome`; o resultado vale até o fim do rerun."""
+    def decorador(funcao):
+        @wraps(funcao)
+        def carregar(*args, **kwargs):
+            rodada = rodada_atual()
+            if rodada is None:
+                return funcao(*args, **kwargs)
+            if nome not in rodada.conjuntos:
+                raise ConjuntoNaoDeclarado(f"A página '{rodada.pagina}' não declarou o conjunto '{nome}'")
+            chave = (funcao.__qualname__, _congelar(args), _congelar(sorted(kwargs.items())))
+            if chave not in rodada.memoria:
+                rodada.memoria[chave] = funcao(*args, **kwargs)
+            return rodada.memoria[chave]
+        return carregar
+    return decorador
+
+
+def altera_dados(funcao):
+    """Decorador das gravações: o que foi carregado antes delas não vale mais neste rerun."""
+    @wraps(funcao)
+    def gravar(*args, **kwargs):
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            rodada = rodada_atual()
+            if rodada is not None: rodada.memoria.clear()
+    return gravar
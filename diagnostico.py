@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+import pandas as pd
+
+# --- DIAGNÓSTICO DE DESEMPENHO ---
+# Cada rerun do app abre uma medição na thread que executa o script. As seções medidas descontam
+# o tempo das seções internas, então a soma das seções nunca passa do total; o que sobra é o
+# tempo de montar a interface (widgets, tabelas e gráficos).
+# A planilha instrumentada conta chamadas, células e bytes de cada operação no Sheets, inclusive as
+# leituras auxiliares das gravações (cabeçalho e coluna de ids). As feitas durante um rerun entram na
+# medição dele; todas, inclusive os envios da sincronização em segundo plano, entram no total do processo.
+
+SECOES = {
+    "autenticacao": "Autenticação",
+    "planilha": "Google Sheets",
+    "carga": "Carga (base local)",
+    "conversao": "Conversão (parse)",
+    "indices": "Índices",
+    "filtro": "Filtros",
+    "agregacao": "Agregações",
+    "conciliacao": "Conciliação",
+    "gravacao": "Gravação",
+    "interface": "Interface (render)",
+}
+CONTADORES = ["leituras", "gravacoes", "celulas", "bytes"]
+
+_atual = threading.local()
+
+
+class Medicao:
+    """Tempos (exclusivos) por seção e operações no Sheets de um rerun."""
+
+    def __init__(self, rotulo=""):
+        self.rotulo = rotulo
+        self.registrada_em = datetime.now()
+        self.inicio = time.perf_counter()
+        self.secoes = defaultdict(float)
+        self.planilha = defaultdict(int)
+        self._pilha = []
+
+    def resumo(self):
+        """Linha do histórico: total e seções em milissegundos, mais os contadores do Sheets."""
+        total = time.perf_counter() - self.inicio
+        secoes = dict(self.secoes)
+        secoes["interface"] = max(total - sum(secoes.values()), 0.0)
+        return {
+            "registrada_em": self.registrada_em.isoformat(timespec="seconds"),
+            "tela": self.rotulo,
+            "total_ms": round(total * 1000, 1),
+            **{f"{nome}_ms": round(secoes.get(nome, 0.0) * 1000, 1) for nome in SECOES},
+            **{f"sheets_{nome}": self.planilha[nome] for nome in CONTADORES},
+        }
+
+
+def iniciar_medicao(rotulo=""):
+    _atual.medicao = Medicao(rotulo)
+    return _atual.medicao
+
+
+def medicao_atual():
+    return getattr(_atual, "medicao", None)
+
+
+def encerrar_medicao():
+    """Fecha a medição da thread e devolve o resumo (None se não havia medição aberta)."""
+    medicao = medicao_atual()
+    if medicao is None: return None
+    _atual.medicao = None
+    return medicao.resumo()
+
+
+@contextmanager
+def secao(nome):
+    """Soma o tempo do bloco à seção `nome`; sem medição aberta não faz nada."""
+    medicao = medicao_atual()
+    if medicao is None:
+        yield
+        return
+    # [inicio, tempo das seções internas]
+    quadro = [time.perf_counter(), 0.0]
+    medicao._pilha.append(quadro)
+    try:
+        yield
+    finally:
+        medicao._pilha.pop()
+        decorrido = time.perf_counter() - quadro[0]
+        medicao.secoes[nome] += decorrido - quadro[1]
+        if medicao._pilha:
+            medicao._pilha[-1][1] += decorrido
+
+
+def cronometrado(nome):
+    """Decorador: cada chamada da função conta na seção `nome`."""
+    def decorador(funcao):
+        @wraps(funcao)
+        def medida(*args, **kwargs):
+            with secao(nome):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
+
+
+# === CONTAGEM DAS OPERAÇÕES NO SHEETS ===
+def _bytes_quadro(df):
+    # Aproximação do que trafega: o texto de cada célula
+    return int(sum(df[c].astype("string").str.len().fillna(0).sum() for c in df.columns))
+
+
+def _bytes_valores(valores):
+    return sum(len(str(v)) for v in valores)
+
+
+class PlanilhaInstrumentada:
+    """Envolve uma planilha (PlanilhaGoogle ou PlanilhaFake) contando chamadas, células e bytes."""
+
+    def __init__(self, planilha):
+        self.planilha = planilha
+        self._trava = threading.Lock()
+        self.totais = defaultdict(int)
+        # Atualizar e excluir por id leem antes a coluna de ids (e às vezes o cabeçalho)
+        planilha.ao_ler = lambda valores: self._contar("leituras", len(valores), _bytes_valores(valores))
+
+    def contadores(self):
+        with self._trava:
+            return {nome: self.totais[nome] for nome in CONTADORES}
+
+    def _contar(self, tipo, celulas, bytes_):
+        with self._trava:
+            self.totais[tipo] += 1
+            self.totais["celulas"] += celulas
+            self.totais["bytes"] += bytes_
+        medicao = medicao_atual()
+        if medicao is not None:
+            medicao.planilha[tipo] += 1
+            medicao.planilha["celulas"] += celulas
+            medicao.planilha["bytes"] += bytes_
+
+    def ler(self, aba, ttl=600):
+        with secao("planilha"):
+            df = self.planilha.ler(aba, ttl=ttl)
+        self._contar("leituras", df.size, _bytes_quadro(df))
+        return df
+
+    def ultima_alteracao(self):
+        with secao("planilha"):
+            revisao = self.planilha.ultima_alteracao()
+        self._contar("leituras", 0, 0)
+        return revisao
+
+    def sobrescrever(self, aba, df):
+        with secao("planilha"):
+            self.planilha.sobrescrever(aba, df)
+        self._contar("gravacoes", df.size, _bytes_quadro(df))
+
+    def anexar_linhas(self, aba, df):
+        with secao("planilha"):
+            self.planilha.anexar_linhas(aba, df)
+        self._contar("gravacoes", df.size, _bytes_quadro(df))
+
+    def preencher_coluna(self, aba, coluna, valores):
+        with secao("planilha"):
+            self.planilha.preencher_coluna(aba, coluna, valores)
+        self._contar("gravacoes", len(valores), _bytes_valores(valores))
+
+    def atualizar_por_id(self, aba, atualizacoes):
+        with secao("planilha"):
+            resultado = self.planilha.atualizar_por_id(aba, atualizacoes)
+        valores = [v for dados in atualizacoes.values() for v in dados.values()]
+        self._contar("gravacoes", len(valores), _bytes_valores(valores))
+        return resultado
+
+    def excluir_por_id(self, aba, ids):
+        ids = list(ids)
+        with secao("planilha"):
+            resultado = self.planilha.excluir_por_id(aba, ids)
+        self._contar("gravacoes", len(ids), _bytes_valores(ids))
+        return resultado
+
+
+def historico_para_quadro(historico):
+    """Histórico de medições (lista de resumos) num DataFrame, do rerun mais recente ao mais antigo."""
+    return pd.DataFrame(list(historico)[::-1])
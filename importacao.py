@@ -0,0 +1,167 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# --- IMPORTAÇÃO DE PLANILHAS EXCEL ---
+# A planilha é lida em blocos pelo openpyxl em modo somente leitura (sem carregar o arquivo
+# inteiro num DataFrame) e cada bloco é convertido coluna a coluna, sem laço por linha.
+# Linhas inválidas não interrompem a importação: voltam juntas num relatório com o motivo.
+
+COLUNAS_OBRIGATORIAS = ['valor', 'data_liquidacao', 'mes_competencia', 'ano_competencia', 'fornecedor']
+
+
+def ler_excel_em_blocos(arquivo, tamanho_bloco=5000):
+    """Gera (bloco, total_linhas) com os valores crus da primeira aba; o cabeçalho vem em minúsculo.
+
+    O índice de cada bloco é o número da linha no Excel, para o relatório de erros.
+    `total_linhas` é o que o arquivo declara (pode ser None) e serve só para a barra de progresso.
+    """
+    # O openpyxl só é carregado quando alguém importa uma planilha
+    from openpyxl import load_workbook
+    livro = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        aba = livro.worksheets[0]
+        linhas = aba.iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if cabecalho is None: return
+        cabecalho = [str(c).strip().lower() if c is not None else f"coluna_{i}" for i, c in enumerate(cabecalho)]
+        total = aba.max_row - 1 if aba.max_row else None
+        bloco, inicio = [], 2
+        largura = len(cabecalho)
+        for linha in linhas:
+            # No modo somente leitura as linhas vêm com o tamanho que o arquivo gravou
+            if len(linha) != largura: linha = tuple(linha[:largura]) + (None,) * (largura - len(linha))
+            bloco.append(linha)
+            if len(bloco) == tamanho_bloco:
+                yield pd.DataFrame(bloco, columns=cabecalho, index=range(inicio, inicio + len(bloco))), total
+                inicio += len(bloco)
+                bloco = []
+        if bloco:
+            yield pd.DataFrame(bloco, columns=cabecalho, index=range(inicio, inicio + len(bloco))), total
+    finally:
+        livro.close()
+
+
+def converter_moeda_br(serie):
+    """Versão vetorizada de converter_moeda_br_para_float: números passam direto, textos '1.500,50' viram 1500.5.
+    O que não for número vira NaN."""
+    numeros = pd.to_numeric(serie.where(serie.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool))), errors="coerce")
+    textos = (
+        serie.astype("string").str.replace("R$", "", regex=False).str.replace(" ", "", regex=False)
+        .str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    )
+    return numeros.fillna(pd.to_numeric(textos, errors="coerce")).astype("float64")
+
+
+def converter_datas_br(serie):
+    """Datas do Excel (já datetime) ou textos DD/MM/AAAA; o que não for data vira NaT."""
+    datas = pd.to_datetime(serie.where(serie.map(lambda v: isinstance(v, datetime))), errors="coerce")
+    textos = serie.where(datas.isna()).astype("string").str.strip()
+    faltantes = datas.isna() & textos.notna()
+    if faltantes.any():
+        datas[faltantes] = pd.to_datetime(textos[faltantes], format="%d/%m/%Y", errors="coerce")
+        faltantes = datas.isna() & textos.notna()
+    if faltantes.any():
+        datas[faltantes] = pd.to_datetime(textos[faltantes], format="ISO8601", errors="coerce")
+        faltantes = datas.isna() & textos.notna()
+    if faltantes.any():
+        datas[faltantes] = pd.to_datetime(textos[faltantes], format="mixed", dayfirst=True, errors="coerce")
+    return datas
+
+
+def _texto(serie, padrao=""):
+    return serie.astype("string").str.strip().fillna(padrao).replace("", padrao)
+
+
+def preparar_bloco(bloco, meses_inv, data_registro):
+    """Converte um bloco cru em (lançamentos válidos, linhas inválidas com o motivo)."""
+    # Linhas totalmente vazias no fim da aba são comuns e não contam como erro
+    bloco = bloco.dropna(how="all")
+    vazio = pd.Series("", index=bloco.index, dtype="string")
+    fornecedor = _texto(bloco['fornecedor'])
+    valor = converter_moeda_br(bloco['valor'])
+    data = converter_datas_br(bloco['data_liquidacao'])
+    mes_num = _texto(bloco['mes_competencia']).str.capitalize().map(meses_inv)
+    ano = _texto(bloco['ano_competencia']).str.replace(r"\.0$", "", regex=True)
+    categoria = _texto(bloco['categoria'], "Outros") if 'categoria' in bloco else vazio.replace("", "Outros")
+    status = _texto(bloco['status'], "Pago") if 'status' in bloco else vazio.replace("", "Pago")
+    status = status.str.lower().map({"pago": "Pago", "a pagar": "A Pagar"}).fillna("Pago")
+    observacao = _texto(bloco['observacao']) if 'observacao' in bloco else vazio
+
+    motivos = pd.Series(np.select(
+        [fornecedor == "", bloco['valor'].isna(), valor.isna(), data.isna(), ~ano.str.fullmatch(r"\d{4}")],
+        ["fornecedor vazio", "valor vazio", "valor inválido", "data de liquidação inválida", "ano de competência inválido"],
+        default=""
+    ), index=bloco.index)
+    validas = motivos == ""
+
+    lancamentos = pd.DataFrame({
+        "data_registro": data_registro,
+        "tipo": "Despesa",
+        "valor": valor,
+        "fornecedor": fornecedor,
+        "data_liquidacao": data.dt.strftime("%Y-%m-%d"),
+        # Mês não reconhecido cai em janeiro, como na importação anterior
+        "competencia": ano + "-" + mes_num.fillna(1).astype(int).astype("string").str.zfill(2),
+        "status": status,
+        "categoria": categoria,
+        "observacao": observacao,
+    }, index=bloco.index)[validas]
+    invalidas = pd.DataFrame({"linha": bloco.index[~validas], "motivo": motivos[~validas].to_numpy()})
+    return lancamentos.astype({c: object for c in lancamentos.columns if c != "valor"}), invalidas
+
+
+def importar_excel(arquivo, meses_inv, tamanho_bloco=5000, ao_progredir=None):
+    """Lê e converte a planilha inteira em blocos. Devolve (lançamentos válidos, linhas inválidas).
+
+    `ao_progredir(linhas_lidas, total)` é chamado a cada bloco; nada é gravado aqui.
+    """
+    data_registro = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    validos, invalidos, lidas = [], [], 0
+    for bloco, total in ler_excel_em_blocos(arquivo, tamanho_bloco):
+        faltantes = [c for c in COLUNAS_OBRIGATORIAS if c not in bloco.columns]
+        if faltantes:
+            raise ValueError(f"Faltam as seguintes colunas obrigatórias na sua planilha: {', '.join(faltantes)}")
+        lancamentos, erros = preparar_bloco(bloco, meses_inv, data_registro)
+        validos.append(lancamentos)
+        invalidos.append(erros)
+        lidas += len(bloco)
+        if ao_progredir: ao_progredir(lidas, total)
+    if not validos:
+        raise ValueError("A planilha está vazia.")
+    return pd.concat(validos, ignore_index=True), pd.concat(invalidos, ignore_index=True)
+
+
+def preparar_lote_despesas(lote, meses_inv, data_registro):
+    """Valida e converte a tabela do 'Despesa em Lote' de uma vez.
+
+    Devolve (lançamentos prontos para um único salvamento, problemas com linha e motivo).
+    Linhas sem fornecedor e sem valor são consideradas em branco e ignoradas.
+    """
+    fornecedor = _texto(lote['fornecedor'])
+    categoria = _texto(lote['categoria'])
+    mes_num = lote['mes_competencia'].map(meses_inv)
+    ano = _texto(lote['ano_competencia'])
+    em_branco = lote['fornecedor'].isna() & lote['valor'].isna()
+    lote, fornecedor, categoria, mes_num, ano = (s[~em_branco] for s in (lote, fornecedor, categoria, mes_num, ano))
+
+    motivos = pd.Series(np.select(
+        [(fornecedor == "") | lote['valor'].isna() | lote['data_liquidacao'].isna() | mes_num.isna() | (ano == ""), categoria == ""],
+        ["Verifique Valor, Data, Competência e Fornecedor.", "Verifique a Classificação."],
+        default=""
+    ), index=lote.index)
+    problemas = pd.DataFrame({"linha": lote.index[motivos != ""] + 1, "motivo": motivos[motivos != ""].to_numpy()})
+
+    status = _texto(lote['status'], "Pago")
+    lancamentos = pd.DataFrame({
+        "data_registro": data_registro,
+        "tipo": "Despesa",
+        "valor": pd.to_numeric(lote['valor'], errors="coerce"),
+        "fornecedor": fornecedor,
+        "data_liquidacao": pd.to_datetime(lote['data_liquidacao'], errors="coerce").dt.strftime("%Y-%m-%d"),
+        "competencia": ano + "-" + mes_num.fillna(1).astype(int).astype("string").str.zfill(2),
+        "status": status,
+        "categoria": categoria,
+        "observacao": _texto(lote['observacao']),
+    }, index=lote.index)[motivos == ""]
+    return lancamentos.astype({c: object for c in lancamentos.columns if c != "valor"}).reset_index(drop=True), problemas
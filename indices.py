@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+# --- ÍNDICES EM MEMÓRIA SOBRE O QUADRO DE LANÇAMENTOS ---
+# Montados uma vez por versão dos dados (ficam em cache no app) e consultados a cada rerun.
+# Os filtros viram operações bit a bit sobre bitmaps compactados (1 bit por linha), sem copiar
+# o DataFrame a cada etapa; só o resultado final é recortado do quadro original.
+
+# Acima disso (ex.: fornecedores) um bitmap por valor gastaria memória demais: a coluna guarda
+# só as posições agrupadas por valor e o bitmap é montado na consulta.
+MAX_VALORES_BITMAP = 64
+
+
+class IndiceFiltros:
+    """Bitmap por valor de cada coluna categórica e índice ordenado das datas de liquidação."""
+
+    def __init__(self, df, colunas, coluna_data="data_liquidacao"):
+        self.n = len(df)
+        self.valores = {}
+        self.bitmaps = {}
+        self.postings = {}
+        for coluna in colunas:
+            serie = df[coluna].astype("category")
+            codigos = serie.cat.codes.to_numpy()
+            self.valores[coluna] = {v: k for k, v in enumerate(serie.cat.categories)}
+            if len(serie.cat.categories) <= MAX_VALORES_BITMAP:
+                # O código -1 (vazio) fica na última posição
+                self.bitmaps[coluna] = [np.packbits(codigos == k) for k in range(len(serie.cat.categories))] + [np.packbits(codigos == -1)]
+            else:
+                ordem = np.argsort(codigos, kind="stable").astype(np.int32)
+                limites = np.searchsorted(codigos[ordem], np.arange(-1, len(serie.cat.categories) + 1))
+                self.postings[coluna] = (ordem, limites)
+        datas = df[coluna_data].to_numpy(dtype="datetime64[ns]")
+        # NaT vai para o fim da ordenação e nunca cai dentro de um intervalo
+        self.ordem_datas = np.argsort(datas, kind="stable").astype(np.int32)
+        self.datas_ordenadas = datas[self.ordem_datas]
+        self.qtd_datas = int((~np.isnat(datas)).sum())
+
+    def _bitmap_de_posicoes(self, posicoes):
+        marcadas = np.zeros(self.n, dtype=bool)
+        marcadas[posicoes] = True
+        return np.packbits(marcadas)
+
+    def _bitmap_valores(self, coluna, valores):
+        todos = self.valores[coluna]
+        codigos = {todos[v] for v in valores if v in todos}
+        # Se a maioria dos valores foi escolhida, é mais barato montar o complemento e inverter
+        inverter = len(codigos) > len(todos) / 2
+        if inverter:
+            codigos = [k for k in range(len(todos)) if k not in codigos] + [-1]
+        if coluna in self.bitmaps:
+            bitmaps = self.bitmaps[coluna]
+            resultado = np.zeros((self.n + 7) // 8, dtype=np.uint8)
+            for k in codigos:
+                np.bitwise_or(resultado, bitmaps[k], out=resultado)
+        else:
+            ordem, limites = self.postings[coluna]
+            resultado = self._bitmap_de_posicoes(
+                np.concatenate([ordem[limites[k + 1]:limites[k + 2]] for k in codigos]) if codigos else []
+            )
+        return np.invert(resultado, out=resultado) if inverter else resultado
+
+    def _bitmap_periodo(self, inicio, fim):
+        """Linhas com data em [inicio, fim], ambos inclusivos (datas sem hora)."""
+        de = np.datetime64(pd.Timestamp(inicio), "ns")
+        ate = np.datetime64(pd.Timestamp(fim) + pd.Timedelta(days=1), "ns")
+        lo, hi = np.searchsorted(self.datas_ordenadas, [de, ate], side="left")
+        return self._bitmap_de_posicoes(self.ordem_datas[lo:hi])
+
+    def mascara(self, filtros, periodo=None):
+        """Máscara booleana das linhas que atendem a todos os filtros.
+
+        `filtros` é {coluna: valores aceitos}; listas vazias não filtram (como no multiselect vazio).
+        `periodo` é (inicio, fim) sobre a coluna de datas.
+        """
+        resultado = None
+        bitmaps = [self._bitmap_valores(coluna, valores) for coluna, valores in filtros.items() if valores]
+        if periodo is not None:
+            bitmaps.append(self._bitmap_periodo(*periodo))
+        for bitmap in bitmaps:
+            resultado = bitmap if resultado is None else np.bitwise_and(resultado, bitmap, out=resultado)
+        if resultado is None: return np.ones(self.n, dtype=bool)
+        return np.unpackbits(resultado, count=self.n).view(bool)
+
+    def posicoes(self, filtros, periodo=None):
+        """Posições (iloc) das linhas que atendem aos filtros, na ordem original."""
+        return np.flatnonzero(self.mascara(filtros, periodo))
+
+    def ordenar_por_data(self, mascara, decrescente=False):
+        """Posições das linhas marcadas já em ordem de data (vazias no fim), sem ordenar de novo."""
+        com_data = self.ordem_datas[:self.qtd_datas]
+        com_data = com_data[mascara[com_data]]
+        sem_data = self.ordem_datas[self.qtd_datas:]
+        sem_data = sem_data[mascara[sem_data]]
+        return np.concatenate([com_data[::-1] if decrescente else com_data, sem_data])
+
+
+def ordenar_posicoes(serie, decrescente=False):
+    """Posições (iloc) que ordenam a série, com os vazios no fim."""
+    return serie.reset_index(drop=True).sort_values(ascending=not decrescente, na_position="last", kind="stable").index.to_numpy()
+
+
+class IndiceVencimentos:
+    """Despesas agrupadas por dia de liquidação, com total e quantidade (geral e A Pagar) de cada dia.
+
+    As posições (iloc) das despesas ficam ordenadas por dia; cada dia distinto aponta para a sua
+    faixa, então o calendário e o detalhe de um dia não filtram o quadro inteiro de novo.
+    """
+
+    def __init__(self, df, coluna_data="data_liquidacao"):
+        dias = df[coluna_data].to_numpy(dtype="datetime64[D]")
+        despesa = (df['tipo'] == "Despesa").to_numpy() & ~np.isnat(dias)
+        posicoes = np.flatnonzero(despesa)
+        ordem = np.argsort(dias[posicoes], kind="stable")
+        self.posicoes = posicoes[ordem].astype(np.int32)
+        dias_ordenados = dias[self.posicoes]
+        self.dias, inicio = np.unique(dias_ordenados, return_index=True)
+        self.limites = np.append(inicio, len(dias_ordenados))
+
+        valores = np.nan_to_num(df['valor'].to_numpy(dtype="float64")[self.posicoes])
+        a_pagar = (df['status'] == "A Pagar").to_numpy()[self.posicoes]
+        somar = lambda v: np.add.reduceat(v, inicio) if len(inicio) else np.zeros(0)
+        self.resumo = pd.DataFrame({
+            "qtd": np.diff(self.limites),
+            "total": somar(valores),
+            "qtd_a_pagar": somar(a_pagar.astype(np.int64)),
+            "total_a_pagar": somar(np.where(a_pagar, valores, 0.0)),
+        }, index=pd.DatetimeIndex(self.dias, name="dia"))
+
+    def posicoes_dia(self, dia):
+        """Posições (iloc) das despesas do dia, na ordem original do quadro."""
+        k = np.searchsorted(self.dias, np.datetime64(dia, "D"))
+        if k == len(self.dias) or self.dias[k] != np.datetime64(dia, "D"):
+            return np.zeros(0, dtype=np.int32)
+        return np.sort(self.posicoes[self.limites[k]:self.limites[k + 1]])
+
+    def resumo_periodo(self, inicio, fim):
+        """Totais por dia com despesa em [inicio, fim], ambos inclusivos."""
+        lo = np.searchsorted(self.dias, np.datetime64(inicio, "D"), side="left")
+        hi = np.searchsorted(self.dias, np.datetime64(fim, "D"), side="right")
+        return self.resumo.iloc[lo:hi]
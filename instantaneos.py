@@ -0,0 +1,52 @@
+import glob
+import os
+import threading
+
+import pandas as pd
+
+# --- INSTANTÂNEOS EM DISCO (PARQUET) ---
+# Cópia colunar dos quadros já prontos (tipos, categorias e índice), gravada a cada nova versão
+# dos dados. Num servidor recém-iniciado o primeiro acesso lê o arquivo, mapeado em memória, em
+# vez de ler a base local e converter tudo de novo. O nome do arquivo carrega a assinatura da
+# versão, então um instantâneo de outra versão nunca é usado.
+
+
+class Instantaneos:
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self._trava = threading.Lock()
+        os.makedirs(pasta, exist_ok=True)
+
+    def _caminho(self, nome, assinatura):
+        return os.path.join(self.pasta, f"{nome}@{assinatura}.parquet")
+
+    def ler(self, nome, assinatura):
+        """Quadro gravado para esta assinatura, ou None se não houver."""
+        caminho = self._caminho(nome, assinatura)
+        if not os.path.exists(caminho): return None
+        try:
+            return pd.read_parquet(caminho, memory_map=True)
+        except Exception:
+            # Arquivo ilegível (ex.: disco cheio na gravação): é refeito a partir da base local
+            return None
+
+    def gravar(self, nome, assinatura, df):
+        """Grava o quadro (troca atômica do arquivo) e apaga os instantâneos de versões anteriores."""
+        caminho = self._caminho(nome, assinatura)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._trava:
+            try:
+                df.to_parquet(temporario)
+                os.replace(temporario, caminho)
+            finally:
+                if os.path.exists(temporario): os.remove(temporario)
+            for antigo in glob.glob(os.path.join(glob.escape(self.pasta), f"{glob.escape(nome)}@*.parquet")):
+                if antigo != caminho:
+                    try:
+                        os.remove(antigo)
+                    except OSError:
+                        pass
+
+    def gravar_em_segundo_plano(self, nome, assinatura, df):
+        """Como gravar(), sem segurar o rerun; `df` não pode ser alterado depois (os quadros em cache não são)."""
+        threading.Thread(target=self.gravar, args=(nome, assinatura, df), name=f"instantaneo:{nome}", daemon=True).start()
@@ -0,0 +1,173 @@
+import codecs
+import hashlib
+import html
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import pandas as pd
+from collections import namedtuple
+from datetime import date
+
+# --- LEITURA DE EXTRATOS OFX ---
+# O arquivo é lido em pedaços e percorrido uma única vez por um tokenizador de tags, que
+# serve tanto para o OFX 1.x (SGML, folhas sem tag de fechamento) quanto para o 2.x (XML).
+# Cada transação é entregue assim que a sua tag </STMTTRN> aparece, então a memória usada não
+# cresce com o tamanho do extrato. Extratos com várias contas (<STMTRS>/<CCSTMTRS>) trazem em
+# cada transação o banco, a agência e a conta a que pertencem.
+
+Transacao = namedtuple("Transacao", [
+    "fitid", "tipo", "data", "valor", "descricao", "nome", "memo", "checknum", "banco", "agencia", "conta"
+])
+
+TAMANHO_PEDACO = 64 * 1024
+# A leitura anda a uns 7 MB/s; um processo novo (spawn) leva cerca de um segundo só para importar o
+# pandas. Abaixo disso, no total do lote, ler no próprio processo sai mais barato
+BYTES_MIN_PROCESSOS = 16 * 1024 * 1024
+
+# Cada token é uma tag seguida do texto até a próxima tag
+_TOKEN = re.compile(r"<(/?)([A-Za-z0-9_.]+)[^>]*>([^<]*)")
+_ENCODING_SGML = re.compile(r"^\s*ENCODING:\s*(\S+)", re.MULTILINE)
+_CHARSET_SGML = re.compile(r"CHARSET:\s*(\S+)")
+_ENCODING_XML = re.compile(r"encoding=[\"']([A-Za-z0-9_\-]+)")
+
+_EXTRATOS = {"STMTRS", "CCSTMTRS"}
+# Tags que encerram a transação em andamento
+_FIM_TRANSACAO = {"STMTTRN", "BANKTRANLIST"} | _EXTRATOS
+_CONTAS = {"BANKID": "banco", "BRANCHID": "agencia", "ACCTID": "conta"}
+
+
+def _codificacao(inicio):
+    """Codificação declarada no cabeçalho; sem declaração, latin1 (o padrão dos bancos brasileiros no OFX 1.x)."""
+    texto = inicio.decode("latin1")
+    xml = _ENCODING_XML.search(texto)
+    if xml: return xml.group(1)
+    # No OFX 1.x, ENCODING:UTF-8 vale sozinho; o CHARSET só diz algo quando ENCODING é USASCII ou falta
+    encoding = _ENCODING_SGML.search(texto)
+    if encoding and encoding.group(1).upper().replace("-", "") == "UTF8":
+        return "utf-8"
+    charset = _CHARSET_SGML.search(texto)
+    if charset and charset.group(1).upper() not in ("NONE", "1252"):
+        return charset.group(1)
+    return "cp1252" if charset else "latin1"
+
+
+def _data_ofx(texto):
+    # AAAAMMDD[HHMMSS[.XXX]][[-3:BRT]]: só o dia interessa
+    try:
+        return date(int(texto[0:4]), int(texto[4:6]), int(texto[6:8]))
+    except (ValueError, IndexError):
+        return None
+
+
+def _valor_ofx(texto):
+    try:
+        return float(texto.replace(",", "."))
+    except ValueError:
+        return None
+
+
+def _transacao(campos, conta, repeticoes):
+    data = _data_ofx(campos.get("DTPOSTED", ""))
+    valor = _valor_ofx(campos.get("TRNAMT", ""))
+    if data is None or valor is None: return None
+    memo = campos.get("MEMO", "")
+    nome = campos.get("NAME", "")
+    fitid = campos.get("FITID")
+    if not fitid:
+        # Sem FITID, a transação é identificada pelo conteúdo, que se repete igual nos reenvios do extrato.
+        # Linhas idênticas na mesma conta (ex.: duas tarifas iguais no dia) recebem -2, -3... pela ordem
+        fitid = "SEM-FITID-" + hashlib.sha1(f"{data}|{valor}|{memo}|{nome}".encode()).hexdigest()[:16]
+        chave = (conta.get("banco", ""), conta.get("agencia", ""), conta.get("conta", ""), fitid)
+        repeticoes[chave] = repeticoes.get(chave, 0) + 1
+        if repeticoes[chave] > 1: fitid += f"-{repeticoes[chave]}"
+    return Transacao(
+        fitid=fitid,
+        tipo=campos.get("TRNTYPE", ""),
+        data=data,
+        valor=valor,
+        descricao=memo or nome or "Sem descrição",
+        nome=nome,
+        memo=memo,
+        checknum=campos.get("CHECKNUM", ""),
+        banco=conta.get("banco", ""),
+        agencia=conta.get("agencia", ""),
+        conta=conta.get("conta", ""),
+    )
+
+
+def _tokens(arquivo):
+    """Gera (fechamento, tag, texto) lendo o arquivo em pedaços."""
+    primeiro = arquivo.read(TAMANHO_PEDACO)
+    if isinstance(primeiro, str):
+        decodificar = str
+    else:
+        try:
+            decodificar = codecs.getincrementaldecoder(_codificacao(primeiro))(errors="replace").decode
+        except LookupError:
+            decodificar = codecs.getincrementaldecoder("latin1")(errors="replace").decode
+    buffer = decodificar(primeiro)
+    while True:
+        bruto = arquivo.read(TAMANHO_PEDACO)
+        # O último token pode estar cortado no meio: só é lido quando chegar a próxima tag
+        corte = buffer.rfind("<") if bruto else len(buffer)
+        if corte > 0:
+            for fechamento, tag, texto in _TOKEN.findall(buffer, 0, corte):
+                yield fechamento == "/", tag.upper(), texto
+            buffer = buffer[corte:]
+        if not bruto: break
+        buffer += decodificar(bruto)
+
+
+def ler_transacoes_ofx(arquivo):
+    """Gera as transações (Transacao) de um extrato OFX, na ordem do arquivo.
+
+    Transações sem data ou valor legíveis são descartadas.
+    """
+    conta = {}
+    campos = None
+    repeticoes = {}
+    for fechamento, tag, texto in _tokens(arquivo):
+        if tag in _FIM_TRANSACAO:
+            if campos is not None:
+                # Fecha a transação aberta (no SGML malformado pode faltar o </STMTTRN>)
+                transacao = _transacao(campos, conta, repeticoes)
+                if transacao: yield transacao
+                campos = None
+            if tag == "STMTTRN" and not fechamento:
+                campos = {}
+            elif tag in _EXTRATOS and not fechamento:
+                conta = {}
+        elif not fechamento:
+            valor = texto.strip()
+            if not valor: continue
+            if "&" in valor: valor = html.unescape(valor)
+            if campos is not None:
+                campos[tag] = valor
+            elif tag in _CONTAS:
+                conta[_CONTAS[tag]] = valor
+    if campos is not None:
+        transacao = _transacao(campos, conta, repeticoes)
+        if transacao: yield transacao
+
+
+def ler_extrato(conteudo):
+    """Transações de um extrato (bytes) já num DataFrame com as colunas de Transacao."""
+    return pd.DataFrame.from_records(ler_transacoes_ofx(io.BytesIO(conteudo)), columns=Transacao._fields)
+
+
+def ler_varios_ofx(conteudos, processos=None):
+    """Lê vários extratos (bytes); devolve um DataFrame de transações por arquivo, na ordem de `conteudos`.
+
+    Lotes comuns (alguns extratos mensais) são lidos aqui mesmo. Só acima de BYTES_MIN_PROCESSOS no
+    total vale um processo por arquivo: o tokenizador é Python puro, então threads não ajudariam, e
+    cada processo devolve o DataFrame pronto, bem mais barato de transferir do que milhares de tuplas.
+    """
+    processos = min(len(conteudos), processos or os.cpu_count() or 1)
+    if processos <= 1 or sum(len(c) for c in conteudos) < BYTES_MIN_PROCESSOS:
+        return [ler_extrato(c) for c in conteudos]
+    # spawn: o processo do Streamlit tem várias threads, e fork com threads não é seguro
+    with ProcessPoolExecutor(max_workers=processos, mp_context=get_context("spawn")) as pool:
+        return list(pool.map(ler_extrato, conteudos))
@@ -0,0 +1,283 @@
+import math
+import time
+import uuid
+import numpy as np
+import pandas as pd
+
+# --- ACESSO ÀS ABAS DA PLANILHA ---
+# As funções do app falam com a planilha apenas por estas classes. A PlanilhaGoogle usa a
+# conexão do Streamlit; a PlanilhaFake guarda tudo em memória para testes e benchmarks offline.
+# Lançamentos são localizados pela coluna "id" (nunca pela posição da linha), assim edições e
+# exclusões tocam apenas as linhas afetadas e não dependem da ordem em que a aba foi lida.
+
+COLUNA_ID = "id"
+
+
+def gerar_id():
+    # O prefixo com letra impede que o Sheets interprete o id como número ou data
+    return "L" + uuid.uuid4().hex[:16]
+
+
+def _letra_coluna(coluna):
+    letras = ""
+    while coluna:
+        coluna, resto = divmod(coluna - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _valor_celula(valor):
+    if isinstance(valor, (np.integer, np.floating, np.bool_)): valor = valor.item()
+    if isinstance(valor, (str, bool, int)): return valor
+    if isinstance(valor, float): return "" if math.isnan(valor) else valor
+    if valor is None or pd.isna(valor): return ""
+    return str(valor)
+
+
+def linhas_para_envio(df, cabecalho):
+    """Converte o DataFrame em lista de linhas seguindo a ordem das colunas do cabeçalho."""
+    df = df.reindex(columns=cabecalho)
+    return [[_valor_celula(v) for v in linha] for linha in df.itertuples(index=False, name=None)]
+
+
+class PlanilhaGoogle:
+    """Abas do Google Sheets acessadas pela st.connection (o gspread só é importado ao usar)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._cabecalhos = {}
+        # Chamado com os valores de cada leitura auxiliar (cabeçalho, coluna de ids) feita pelas gravações
+        self.ao_ler = None
+
+    def _leitura_auxiliar(self, valores):
+        if self.ao_ler is not None: self.ao_ler(valores)
+        return valores
+
+    def _aba(self, aba):
+        return self.conn.client._select_worksheet(worksheet=aba)
+
+    def ler(self, aba, ttl=600):
+        from gspread.exceptions import WorksheetNotFound
+        try:
+            return self.conn.read(worksheet=aba, ttl=ttl)
+        except WorksheetNotFound:
+            raise KeyError(f"Aba '{aba}' não encontrada")
+
+    def ultima_alteracao(self):
+        """Marcador de revisão da planilha (data da última modificação no Drive), sem baixar as abas."""
+        return self.conn.client._open_spreadsheet().get_lastUpdateTime()
+
+    def sobrescrever(self, aba, df):
+        self.conn.update(worksheet=aba, data=df)
+        self._cabecalhos[aba] = [str(c) for c in df.columns]
+
+    def _cabecalho(self, ws, aba, colunas_novas):
+        cabecalho = self._cabecalhos.get(aba)
+        if cabecalho is None:
+            cabecalho = [c for c in self._leitura_auxiliar(ws.row_values(1)) if c]
+        faltantes = [c for c in colunas_novas if c not in cabecalho]
+        if faltantes:
+            cabecalho = cabecalho + faltantes
+            ws.update("A1", [cabecalho])
+        self._cabecalhos[aba] = cabecalho
+        return cabecalho
+
+    def anexar_linhas(self, aba, df):
+        """Envia apenas as linhas novas para o fim da aba (sem baixar a aba inteira)."""
+        if df.empty: return
+        from gspread.exceptions import WorksheetNotFound
+        try:
+            ws = self._aba(aba)
+        except WorksheetNotFound:
+            # Abas novas (ex.: conciliacoes) são criadas no primeiro envio, já com o cabeçalho
+            self.conn.create(worksheet=aba, data=df)
+            self._cabecalhos[aba] = [str(c) for c in df.columns]
+            return
+        cabecalho = self._cabecalho(ws, aba, [str(c) for c in df.columns])
+        ws.append_rows(
+            linhas_para_envio(df, cabecalho),
+            value_input_option="USER_ENTERED",
+            insert_data_option="INSERT_ROWS",
+            table_range="A1"
+        )
+
+    def _linhas_por_id(self, ws, aba, ids):
+        """Lê só a coluna de ids e devolve {id: número da linha na aba}."""
+        cabecalho = self._cabecalho(ws, aba, [COLUNA_ID])
+        col_id = cabecalho.index(COLUNA_ID) + 1
+        procurados = set(ids)
+        return {
+            valor: numero for numero, valor in enumerate(self._leitura_auxiliar(ws.col_values(col_id)), start=1)
+            if numero > 1 and valor in procurados
+        }, cabecalho
+
+    def preencher_coluna(self, aba, coluna, valores):
+        """Grava uma coluna inteira numa única chamada, um valor por linha com dados, na ordem da leitura.
+
+        A leitura (conn.read) descarta as linhas em branco, então a posição em `valores` não é o número
+        da linha: a aba é lida crua para achar as linhas reais, e cada trecho contínuo vira um intervalo.
+        """
+        ws = self._aba(aba)
+        cabecalho = self._cabecalho(ws, aba, [coluna])
+        letra = _letra_coluna(cabecalho.index(coluna) + 1)
+        grade = ws.get_all_values()
+        self._leitura_auxiliar([celula for linha in grade for celula in linha])
+        numeros = [numero for numero, linha in enumerate(grade, start=1) if numero > 1 and any(str(c).strip() for c in linha)]
+        if len(numeros) != len(valores):
+            # A aba mudou desde a leitura e gravar por posição poria valores nas linhas erradas. Nada é
+            # gravado: a revalidação vê a revisão nova, baixa a aba e gera os ids que faltarem de novo
+            return
+        trechos = []
+        for numero, valor in zip(numeros, valores):
+            if trechos and trechos[-1]["fim"] == numero - 1:
+                trechos[-1]["fim"] = numero
+            else:
+                trechos.append({"inicio": numero, "fim": numero, "values": []})
+            trechos[-1]["values"].append([_valor_celula(valor)])
+        if trechos:
+            ws.batch_update(
+                [{"range": f"{letra}{t['inicio']}:{letra}{t['fim']}", "values": t["values"]} for t in trechos],
+                value_input_option="RAW"
+            )
+
+    def atualizar_por_id(self, aba, atualizacoes):
+        """Atualiza só as células alteradas: {id: {coluna: valor}}. Devolve os ids não encontrados."""
+        if not atualizacoes: return []
+        ws = self._aba(aba)
+        colunas = {c for dados in atualizacoes.values() for c in dados}
+        self._cabecalho(ws, aba, sorted(colunas))
+        linhas, cabecalho = self._linhas_por_id(ws, aba, atualizacoes.keys())
+        celulas = []
+        for id_lanc, dados in atualizacoes.items():
+            if id_lanc not in linhas: continue
+            for coluna, valor in dados.items():
+                celulas.append({
+                    "range": f"{_letra_coluna(cabecalho.index(coluna) + 1)}{linhas[id_lanc]}",
+                    "values": [[_valor_celula(valor)]]
+                })
+        if celulas:
+            ws.batch_update(celulas, value_input_option="USER_ENTERED")
+        return [i for i in atualizacoes if i not in linhas]
+
+    def excluir_por_id(self, aba, ids):
+        """Remove as linhas dos ids informados numa única requisição. Devolve os ids não encontrados."""
+        ids = list(ids)
+        if not ids: return []
+        ws = self._aba(aba)
+        linhas, _ = self._linhas_por_id(ws, aba, ids)
+        # De baixo para cima, para que cada exclusão não desloque as linhas seguintes
+        requisicoes = [{
+            "deleteDimension": {
+                "range": {"sheetId": ws.id, "dimension": "ROWS", "startIndex": numero - 1, "endIndex": numero}
+            }
+        } for numero in sorted(linhas.values(), reverse=True)]
+        if requisicoes:
+            ws.spreadsheet.batch_update({"requests": requisicoes})
+        return [i for i in ids if i not in linhas]
+
+
+class PlanilhaFake:
+    """Planilha em memória com a mesma interface da PlanilhaGoogle.
+
+    `latencia_chamada` e `latencia_celula` (em segundos) simulam o custo de rede de cada
+    chamada e de cada célula trafegada, para medir as rotinas de gravação sem o Google.
+    """
+
+    def __init__(self, abas=None, latencia_chamada=0.0, latencia_celula=0.0):
+        self.latencia_chamada = latencia_chamada
+        self.latencia_celula = latencia_celula
+        self.cabecalhos = {}
+        self.linhas = {}
+        self.chamadas = []
+        self.celulas_trafegadas = 0
+        # Sobe a cada gravação, como a data de modificação da planilha no Drive
+        self.revisao = 0
+        self.ao_ler = None
+        for aba, df in (abas or {}).items():
+            self._gravar(aba, df)
+
+    def _registrar(self, operacao, aba, celulas):
+        self.chamadas.append((operacao, aba, celulas))
+        self.celulas_trafegadas += celulas
+        if operacao not in ("ler", "ler_coluna", "ultima_alteracao"):
+            self.revisao += 1
+        espera = self.latencia_chamada + self.latencia_celula * celulas
+        if espera: time.sleep(espera)
+
+    def _gravar(self, aba, df):
+        self.cabecalhos[aba] = [str(c) for c in df.columns]
+        self.linhas[aba] = linhas_para_envio(df, self.cabecalhos[aba])
+
+    def ler(self, aba, ttl=None):
+        if aba not in self.cabecalhos:
+            raise KeyError(f"Aba '{aba}' não encontrada")
+        linhas = self.linhas[aba]
+        self._registrar("ler", aba, len(linhas) * len(self.cabecalhos[aba]))
+        return pd.DataFrame(linhas, columns=self.cabecalhos[aba]).replace("", np.nan)
+
+    def ultima_alteracao(self):
+        self._registrar("ultima_alteracao", None, 0)
+        return str(self.revisao)
+
+    def sobrescrever(self, aba, df):
+        self._registrar("sobrescrever", aba, df.size)
+        self._gravar(aba, df)
+
+    def anexar_linhas(self, aba, df):
+        if df.empty: return
+        cabecalho = self.cabecalhos.setdefault(aba, [])
+        if aba not in self.linhas: self.linhas[aba] = []
+        faltantes = [str(c) for c in df.columns if str(c) not in cabecalho]
+        if faltantes:
+            cabecalho.extend(faltantes)
+            for linha in self.linhas[aba]: linha.extend([""] * len(faltantes))
+        novas = linhas_para_envio(df, cabecalho)
+        self._registrar("anexar", aba, len(novas) * len(cabecalho))
+        self.linhas[aba].extend(novas)
+
+    def _linhas_por_id(self, aba, ids):
+        cabecalho = self.cabecalhos[aba]
+        if COLUNA_ID not in cabecalho: return {}
+        col_id = cabecalho.index(COLUNA_ID)
+        self._registrar("ler_coluna", aba, len(self.linhas[aba]))
+        if self.ao_ler is not None: self.ao_ler([COLUNA_ID] + [linha[col_id] for linha in self.linhas[aba]])
+        procurados = set(ids)
+        return {linha[col_id]: pos for pos, linha in enumerate(self.linhas[aba]) if linha[col_id] in procurados}
+
+    def _garantir_colunas(self, aba, colunas):
+        cabecalho = self.cabecalhos[aba]
+        for coluna in colunas:
+            if coluna not in cabecalho:
+                cabecalho.append(coluna)
+                for linha in self.linhas[aba]: linha.append("")
+
+    def preencher_coluna(self, aba, coluna, valores):
+        self._garantir_colunas(aba, [coluna])
+        pos = self.cabecalhos[aba].index(coluna)
+        self._registrar("preencher_coluna", aba, len(valores))
+        for linha, valor in zip(self.linhas[aba], valores):
+            linha[pos] = _valor_celula(valor)
+
+    def atualizar_por_id(self, aba, atualizacoes):
+        if not atualizacoes: return []
+        self._garantir_colunas(aba, sorted({c for dados in atualizacoes.values() for c in dados}))
+        linhas = self._linhas_por_id(aba, atualizacoes.keys())
+        cabecalho = self.cabecalhos[aba]
+        celulas = 0
+        for id_lanc, dados in atualizacoes.items():
+            if id_lanc not in linhas: continue
+            for coluna, valor in dados.items():
+                self.linhas[aba][linhas[id_lanc]][cabecalho.index(coluna)] = _valor_celula(valor)
+                celulas += 1
+        if celulas: self._registrar("atualizar", aba, celulas)
+        return [i for i in atualizacoes if i not in linhas]
+
+    def excluir_por_id(self, aba, ids):
+        ids = list(ids)
+        if not ids: return []
+        linhas = self._linhas_por_id(aba, ids)
+        if linhas:
+            self._registrar("excluir", aba, len(linhas))
+            remover = set(linhas.values())
+            self.linhas[aba] = [l for pos, l in enumerate(self.linhas[aba]) if pos not in remover]
+        return [i for i in ids if i not in linhas]
@@ -0,0 +1,938 @@
+import functools
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from planilhas import COLUNA_ID, gerar_id
+
+# --- BASE LOCAL (SQLite) COM A PLANILHA COMO ESPELHO ---
+# Leituras e gravações do app acontecem nesta base local. Cada gravação também registra uma
+# pendência na mesma transação; uma thread em segundo plano envia as pendências para o Google
+# Sheets, na ordem em que foram feitas. A planilha só é baixada na primeira carga de cada aba
+# (ou quando o usuário pede para atualizar os dados). Antes de cada envio as pendências acumuladas
+# são compactadas: várias gravações seguidas na mesma aba viram uma única chamada ao Sheets.
+# Alterações feitas na planilha por outros operadores são trazidas pela revalidação: um marcador
+# de revisão da planilha diz se algo mudou, e nos lançamentos só as linhas incluídas, alteradas ou
+# excluídas lá são aplicadas aqui, conferindo o hash de cada linha.
+# Na base local os lançamentos são particionados pelo ano de competência: cada ano tem versão,
+# quantidade e faixa de datas de liquidação próprias (tabela particoes, mantida por gatilhos),
+# então as telas carregam e guardam em cache só os anos de que precisam.
+
+COLUNAS_LANCAMENTOS = [
+    COLUNA_ID, "data_registro", "tipo", "valor", "fornecedor", "data_liquidacao",
+    "competencia", "status", "categoria", "observacao"
+]
+COLUNAS_FORNECEDORES = ["nome", "cnpj", "telefone", "login_app", "senha_app"]
+COLUNAS_CATEGORIAS = ["nome"]
+# Livro da conciliação: cada transação do banco (conta + FITID) já tratada aponta para o
+# lançamento correspondente, ou fica com situacao "ignorado". O histórico do banco fica guardado
+# para o índice de sugestões aprender fornecedor/categoria a partir das escolhas passadas.
+COLUNAS_CONCILIACOES = ["conta", "fitid", "lancamento_id", "situacao", "data_registro", "historico"]
+COLUNAS_POR_ABA = {
+    "lancamentos": COLUNAS_LANCAMENTOS,
+    "fornecedores": COLUNAS_FORNECEDORES,
+    "categorias": COLUNAS_CATEGORIAS,
+    "conciliacoes": COLUNAS_CONCILIACOES,
+}
+# Abas que podem ainda não existir na planilha: começam vazias e são criadas no primeiro envio
+ABAS_OPCIONAIS = {"conciliacoes"}
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS lancamentos (
+    id TEXT PRIMARY KEY,
+    data_registro TEXT, tipo TEXT, valor REAL, fornecedor TEXT, data_liquidacao TEXT,
+    competencia TEXT, status TEXT, categoria TEXT, observacao TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_lanc_competencia ON lancamentos (competencia);
+CREATE INDEX IF NOT EXISTS idx_lanc_data_liquidacao ON lancamentos (data_liquidacao);
+CREATE INDEX IF NOT EXISTS idx_lanc_tipo ON lancamentos (tipo);
+CREATE INDEX IF NOT EXISTS idx_lanc_fornecedor ON lancamentos (fornecedor);
+CREATE INDEX IF NOT EXISTS idx_lanc_ano ON lancamentos (substr(COALESCE(competencia, ''), 1, 4));
+
+-- Partições por ano de competência (ano '' reúne os sem competência). A versão é a da aba de
+-- lançamentos na última gravação que tocou o ano; a faixa de liquidação só cresce até a próxima
+-- carga completa, o que basta para escolher as partições de um período.
+CREATE TABLE IF NOT EXISTS particoes (
+    ano TEXT PRIMARY KEY, versao INTEGER NOT NULL, qtd INTEGER NOT NULL,
+    liquidacao_min TEXT, liquidacao_max TEXT
+);
+
+-- Cubo mensal: somas (em centavos, para não acumular erro de arredondamento) e quantidades por
+-- competência x tipo x categoria x fornecedor x status, mantido pelos gatilhos (GATILHOS_CUBO).
+CREATE TABLE IF NOT EXISTS cubo_mensal (
+    competencia TEXT NOT NULL, tipo TEXT NOT NULL, categoria TEXT NOT NULL,
+    fornecedor TEXT NOT NULL, status TEXT NOT NULL,
+    soma_centavos INTEGER NOT NULL, qtd INTEGER NOT NULL,
+    PRIMARY KEY (competencia, tipo, categoria, fornecedor, status)
+);
+
+CREATE TABLE IF NOT EXISTS fornecedores (nome TEXT, cnpj TEXT, telefone TEXT, login_app TEXT, senha_app TEXT);
+CREATE TABLE IF NOT EXISTS categorias (nome TEXT);
+CREATE TABLE IF NOT EXISTS conciliacoes (
+    conta TEXT NOT NULL, fitid TEXT NOT NULL, lancamento_id TEXT, situacao TEXT NOT NULL, data_registro TEXT,
+    historico TEXT,
+    PRIMARY KEY (conta, fitid)
+);
+CREATE INDEX IF NOT EXISTS idx_conc_lancamento ON conciliacoes (lancamento_id);
+
+CREATE TABLE IF NOT EXISTS abas_carregadas (aba TEXT PRIMARY KEY, carregada_em TEXT NOT NULL);
+-- Impressão digital do conteúdo da planilha na última carga de cada aba, para a revalidação,
+-- precedida da versão local da aba naquele momento ("versão:hash")
+CREATE TABLE IF NOT EXISTS impressoes_planilha (aba TEXT PRIMARY KEY, impressao TEXT NOT NULL);
+-- Identificação desta base: junto com a versão da aba, forma a assinatura dos instantâneos em disco
+CREATE TABLE IF NOT EXISTS base (chave TEXT PRIMARY KEY, valor TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS versoes (aba TEXT PRIMARY KEY, versao INTEGER NOT NULL);
+-- Ids alterados em cada versão (id nulo: a versão trocou a aba inteira), para o app atualizar
+-- o quadro já montado em vez de remontá-lo
+CREATE TABLE IF NOT EXISTS alteracoes (aba TEXT NOT NULL, versao INTEGER NOT NULL, id TEXT);
+CREATE INDEX IF NOT EXISTS idx_alteracoes ON alteracoes (aba, versao);
+CREATE TABLE IF NOT EXISTS pendencias_sync (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    aba TEXT NOT NULL,
+    operacao TEXT NOT NULL,
+    dados TEXT NOT NULL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    erro TEXT
+);
+"""
+
+
+# Atualizam o cubo linha a linha nas gravações do dia a dia. Na carga completa da planilha eles
+# (e os das partições) são removidos e o cubo é remontado de uma vez, o que é bem mais rápido.
+GATILHOS_CUBO = {
+    "cubo_inclusao": """
+    CREATE TRIGGER IF NOT EXISTS cubo_inclusao AFTER INSERT ON lancamentos BEGIN
+        INSERT INTO cubo_mensal VALUES (
+            COALESCE(NEW.competencia, ''), COALESCE(NEW.tipo, ''), COALESCE(NEW.categoria, ''),
+            COALESCE(NEW.fornecedor, ''), COALESCE(NEW.status, ''),
+            CAST(ROUND(COALESCE(NEW.valor, 0) * 100) AS INTEGER), 1
+        ) ON CONFLICT (competencia, tipo, categoria, fornecedor, status)
+        DO UPDATE SET soma_centavos = soma_centavos + excluded.soma_centavos, qtd = qtd + 1;
+    END;
+    """,
+    "cubo_exclusao": """
+    CREATE TRIGGER IF NOT EXISTS cubo_exclusao AFTER DELETE ON lancamentos BEGIN
+        UPDATE cubo_mensal
+        SET soma_centavos = soma_centavos - CAST(ROUND(COALESCE(OLD.valor, 0) * 100) AS INTEGER), qtd = qtd - 1
+        WHERE competencia = COALESCE(OLD.competencia, '') AND tipo = COALESCE(OLD.tipo, '')
+          AND categoria = COALESCE(OLD.categoria, '') AND fornecedor = COALESCE(OLD.fornecedor, '')
+          AND status = COALESCE(OLD.status, '');
+        DELETE FROM cubo_mensal WHERE qtd <= 0;
+    END;
+    """,
+    "cubo_alteracao": """
+    CREATE TRIGGER IF NOT EXISTS cubo_alteracao AFTER UPDATE OF competencia, tipo, categoria, fornecedor, status, valor ON lancamentos BEGIN
+        UPDATE cubo_mensal
+        SET soma_centavos = soma_centavos - CAST(ROUND(COALESCE(OLD.valor, 0) * 100) AS INTEGER), qtd = qtd - 1
+        WHERE competencia = COALESCE(OLD.competencia, '') AND tipo = COALESCE(OLD.tipo, '')
+          AND categoria = COALESCE(OLD.categoria, '') AND fornecedor = COALESCE(OLD.fornecedor, '')
+          AND status = COALESCE(OLD.status, '');
+        DELETE FROM cubo_mensal WHERE qtd <= 0;
+        INSERT INTO cubo_mensal VALUES (
+            COALESCE(NEW.competencia, ''), COALESCE(NEW.tipo, ''), COALESCE(NEW.categoria, ''),
+            COALESCE(NEW.fornecedor, ''), COALESCE(NEW.status, ''),
+            CAST(ROUND(COALESCE(NEW.valor, 0) * 100) AS INTEGER), 1
+        ) ON CONFLICT (competencia, tipo, categoria, fornecedor, status)
+        DO UPDATE SET soma_centavos = soma_centavos + excluded.soma_centavos, qtd = qtd + 1;
+    END;
+    """,
+}
+
+# Quantas versões de cada aba ficam no registro de alterações, e quantos ids uma versão registra
+# (acima disso ela conta como troca da aba inteira)
+VERSOES_NO_REGISTRO = 50
+MAX_IDS_POR_VERSAO = 10_000
+
+# Expressão da partição de um lançamento (igual à do índice idx_lanc_ano, para que ele seja usado)
+ANO_PARTICAO = "substr(COALESCE(competencia, ''), 1, 4)"
+_PROXIMA_VERSAO = "(SELECT COALESCE(MAX(versao), 0) + 1 FROM versoes WHERE aba = 'lancamentos')"
+_LIQUIDACAO_VALIDA = "CASE WHEN NEW.data_liquidacao LIKE '____-__-__' THEN NEW.data_liquidacao END"
+_INCLUIR_NA_PARTICAO = f"""
+        INSERT INTO particoes (ano, versao, qtd, liquidacao_min, liquidacao_max) VALUES (
+            substr(COALESCE(NEW.competencia, ''), 1, 4), {_PROXIMA_VERSAO}, 1, {_LIQUIDACAO_VALIDA}, {_LIQUIDACAO_VALIDA}
+        ) ON CONFLICT (ano) DO UPDATE SET
+            versao = excluded.versao, qtd = qtd + 1,
+            liquidacao_min = COALESCE(MIN(liquidacao_min, excluded.liquidacao_min), liquidacao_min, excluded.liquidacao_min),
+            liquidacao_max = COALESCE(MAX(liquidacao_max, excluded.liquidacao_max), liquidacao_max, excluded.liquidacao_max);
+"""
+_RETIRAR_DA_PARTICAO = f"""
+        UPDATE particoes SET versao = {_PROXIMA_VERSAO}, qtd = qtd - 1
+        WHERE ano = substr(COALESCE(OLD.competencia, ''), 1, 4);
+"""
+# Qualquer coluna alterada muda o conteúdo da partição, então a alteração não filtra colunas
+GATILHOS_PARTICOES = {
+    "particao_inclusao": f"CREATE TRIGGER IF NOT EXISTS particao_inclusao AFTER INSERT ON lancamentos BEGIN {_INCLUIR_NA_PARTICAO} END;",
+    "particao_exclusao": f"CREATE TRIGGER IF NOT EXISTS particao_exclusao AFTER DELETE ON lancamentos BEGIN {_RETIRAR_DA_PARTICAO} END;",
+    "particao_alteracao": f"CREATE TRIGGER IF NOT EXISTS particao_alteracao AFTER UPDATE ON lancamentos BEGIN {_RETIRAR_DA_PARTICAO} {_INCLUIR_NA_PARTICAO} END;",
+}
+GATILHOS = {**GATILHOS_CUBO, **GATILHOS_PARTICOES}
+
+# Carga completa: todas as partições ganham a versão nova; as que ficaram sem linhas, quantidade zero
+SQL_RECONSTRUIR_PARTICOES = [
+    f"UPDATE particoes SET versao = {_PROXIMA_VERSAO}, qtd = 0, liquidacao_min = NULL, liquidacao_max = NULL",
+    f"""
+    INSERT INTO particoes (ano, versao, qtd, liquidacao_min, liquidacao_max)
+    SELECT {ANO_PARTICAO}, {_PROXIMA_VERSAO}, COUNT(*),
+           MIN(CASE WHEN data_liquidacao LIKE '____-__-__' THEN data_liquidacao END),
+           MAX(CASE WHEN data_liquidacao LIKE '____-__-__' THEN data_liquidacao END)
+    FROM lancamentos WHERE true GROUP BY 1
+    ON CONFLICT (ano) DO UPDATE SET
+        versao = excluded.versao, qtd = excluded.qtd,
+        liquidacao_min = excluded.liquidacao_min, liquidacao_max = excluded.liquidacao_max
+    """,
+]
+
+SQL_RECONSTRUIR_CUBO = """
+    INSERT INTO cubo_mensal
+    SELECT COALESCE(competencia, ''), COALESCE(tipo, ''), COALESCE(categoria, ''),
+           COALESCE(fornecedor, ''), COALESCE(status, ''),
+           SUM(CAST(ROUND(COALESCE(valor, 0) * 100) AS INTEGER)), COUNT(*)
+    FROM lancamentos GROUP BY 1, 2, 3, 4, 5
+"""
+
+
+def _registros(df, colunas):
+    df = df.reindex(columns=colunas).astype(object)
+    return list(df.where(df.notna(), None).itertuples(index=False, name=None))
+
+
+def _impressao(df):
+    """Hash do conteúdo da aba como veio da planilha (colunas e valores, na ordem das linhas)."""
+    texto = df.astype("string").fillna("")
+    hashes = pd.util.hash_pandas_object(texto, index=False).to_numpy()
+    return hashlib.sha1("|".join(map(str, df.columns)).encode() + hashes.tobytes()).hexdigest()
+
+
+def _valores_float(valores):
+    # Só com inteiros a planilha chega como Int64 ("150") e a base devolve REAL ("150.0")
+    return pd.to_numeric(valores, errors="coerce").astype("float64")
+
+
+def _hashes_linhas(df):
+    """Hash do conteúdo de cada lançamento, indexado pelo id (valores comparados como float)."""
+    df = df.reindex(columns=COLUNAS_LANCAMENTOS)
+    texto = df.assign(valor=_valores_float(df["valor"])).astype("string").fillna("")
+    hashes = pd.util.hash_pandas_object(texto.drop(columns=COLUNA_ID), index=False).to_numpy()
+    return pd.Series(hashes, index=pd.Index(texto[COLUNA_ID].to_numpy()))
+
+
+def _normalizar_lancamentos(df):
+    df = df.reindex(columns=COLUNAS_LANCAMENTOS).copy()
+    df["valor"] = _valores_float(df["valor"])
+    datas = pd.to_datetime(df["data_liquidacao"], errors="coerce")
+    df["data_liquidacao"] = datas.dt.strftime("%Y-%m-%d").where(datas.notna(), df["data_liquidacao"])
+    return df
+
+
+def tipar_lancamentos(df, nomes_meses):
+    """Monta o quadro de lançamentos usado pelas telas, indexado por id e já com os tipos certos.
+
+    valor em float, datas em datetime64, competência como Period mensal (mais ano/mês derivados)
+    e as colunas repetitivas como category, que guardam cada texto distinto uma única vez.
+    """
+    df = df.set_index(COLUNA_ID)
+    competencia = pd.to_datetime(df["competencia"].astype("string").str[:7], format="%Y-%m", errors="coerce")
+    mes = competencia.dt.month.astype("Int8")
+    return pd.DataFrame({
+        "data_registro": df["data_registro"],
+        "tipo": df["tipo"].astype("category"),
+        "valor": pd.to_numeric(df["valor"], errors="coerce").astype("float64"),
+        "fornecedor": df["fornecedor"].astype("category"),
+        "data_liquidacao": pd.to_datetime(df["data_liquidacao"], errors="coerce"),
+        "competencia": competencia.dt.to_period("M"),
+        "status": df["status"].astype("category"),
+        "categoria": df["categoria"].astype("category"),
+        "observacao": df["observacao"],
+        "ano_comp": competencia.dt.strftime("%Y").astype("category"),
+        "mes_comp_num": mes,
+        "mes_comp_nome": mes.map(nomes_meses).astype("category"),
+    }, index=df.index)
+
+
+def atualizar_tipados(df, ids, brutos, nomes_meses):
+    """Aplica ao quadro de tipar_lancamentos() as linhas `ids`, relidas da base em `brutos`.
+
+    Ids ausentes de `brutos` foram excluídos; os alterados ficam no mesmo lugar e os incluídos
+    entram no fim. Devolve um quadro novo; `df` não é alterado.
+    """
+    novos = tipar_lancamentos(brutos, nomes_meses)
+    afetados = pd.Index(list(ids)).get_indexer(df.index) >= 0
+    no_novo = novos.index.get_indexer(df.index)
+    # Posições no quadro [df, novos]: linhas antigas mantidas ou trocadas pela relida, depois as incluídas
+    posicoes = np.where(no_novo >= 0, len(df) + no_novo, np.arange(len(df)))[~afetados | (no_novo >= 0)]
+    incluidos = np.flatnonzero(df.index.get_indexer(novos.index) == -1)
+    posicoes = np.concatenate([posicoes, len(df) + incluidos])
+    categoricas = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    uniao = {c: df[c].cat.categories.union(novos[c].cat.categories) for c in categoricas}
+    juntos = pd.concat([
+        parte.assign(**{c: parte[c].cat.set_categories(uniao[c]) for c in categoricas})
+        for parte in (df, novos)
+    ]).take(posicoes)
+    return juntos.assign(**{c: juntos[c].cat.remove_unused_categories() for c in categoricas})
+
+
+def juntar_tipados(quadros):
+    """Junta quadros de tipar_lancamentos() (ex.: um por partição) num só, mantendo as colunas category."""
+    if len(quadros) == 1: return quadros[0]
+    categoricas = [c for c in quadros[0].columns if isinstance(quadros[0][c].dtype, pd.CategoricalDtype)]
+    uniao = {c: functools.reduce(pd.Index.union, (q[c].cat.categories for q in quadros)) for c in categoricas}
+    return pd.concat([
+        quadro.assign(**{c: quadro[c].cat.set_categories(uniao[c]) for c in categoricas}) for quadro in quadros
+    ])
+
+
+def _compactar(pendencias):
+    """Junta as pendências [(aba, operacao, dados)] no menor número de chamadas equivalente."""
+    lotes = []
+    abertos = {}
+    for aba, operacao, dados in pendencias:
+        grupo = abertos.setdefault(aba, {})
+        if operacao == "preencher_coluna":
+            # Muda a identificação das linhas: nada depois dela pode ser juntado com o que veio antes
+            lotes.append([aba, operacao, dados])
+            abertos[aba] = {}
+        elif operacao == "substituir":
+            # A tabela inteira vai junto, então gravações anteriores ainda não enviadas ficam obsoletas
+            lotes = [lote for lote in lotes if lote[0] != aba]
+            lote = [aba, operacao, list(dados)]
+            lotes.append(lote)
+            abertos[aba] = {"substituir": lote}
+        elif operacao == "anexar":
+            if "substituir" in grupo:
+                grupo["substituir"][2].extend(dados)
+                continue
+            if "anexar" not in grupo:
+                grupo["anexar"] = [aba, operacao, []]
+                grupo["ids"] = {}
+                lotes.append(grupo["anexar"])
+            for registro in dados:
+                registro = dict(registro)
+                grupo["anexar"][2].append(registro)
+                if registro.get(COLUNA_ID):
+                    grupo["ids"][registro[COLUNA_ID]] = registro
+        elif operacao == "atualizar":
+            for id_lanc, campos in dados.items():
+                if id_lanc in grupo.get("ids", {}):
+                    # Linha ainda não enviada: a edição já vai dentro dela
+                    grupo["ids"][id_lanc].update(campos)
+                    continue
+                if id_lanc in grupo.get("excluir", [None, None, []])[2]:
+                    continue
+                if "atualizar" not in grupo:
+                    grupo["atualizar"] = [aba, operacao, {}]
+                    lotes.append(grupo["atualizar"])
+                grupo["atualizar"][2].setdefault(id_lanc, {}).update(campos)
+        elif operacao == "excluir":
+            for id_lanc in dados:
+                if id_lanc in grupo.get("ids", {}):
+                    grupo["ids"].pop(id_lanc)["__excluido"] = True
+                    continue
+                if "atualizar" in grupo:
+                    grupo["atualizar"][2].pop(id_lanc, None)
+                if "excluir" not in grupo:
+                    grupo["excluir"] = [aba, operacao, []]
+                    lotes.append(grupo["excluir"])
+                grupo["excluir"][2].append(id_lanc)
+        else:
+            lotes.append([aba, operacao, dados])
+            abertos[aba] = {}
+
+    compactados = []
+    for aba, operacao, dados in lotes:
+        if operacao == "anexar":
+            dados = [r for r in dados if not r.get("__excluido")]
+        if dados or operacao == "substituir":
+            compactados.append((aba, operacao, dados))
+    return compactados
+
+
+class Repositorio:
+    """Base SQLite (modo WAL) usada por todas as leituras e gravações do app."""
+
+    def __init__(self, caminho, planilha):
+        self.caminho = caminho
+        self.planilha = planilha
+        self._local = threading.local()
+        self._trava = threading.Lock()
+        self._sincronizador = None
+        self.ultimo_envio = None
+        # (versão da base, hash de cada linha) dos lançamentos na planilha, na última revalidação
+        self._hashes_planilha = {}
+        self._conexao().executescript(ESQUEMA)
+        self._incluir_colunas_novas()
+        self._conexao().execute("INSERT OR IGNORE INTO base (chave, valor) VALUES ('id', ?)", (gerar_id(),))
+        self.id_base = self._conexao().execute("SELECT valor FROM base WHERE chave = 'id'").fetchone()[0]
+        for sql in GATILHOS.values():
+            self._conexao().execute(sql)
+        self._reconstruir_cubo_se_vazio()
+        self._reconstruir_particoes_se_vazio()
+
+    def _conexao(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.caminho, isolation_level=None, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    @contextmanager
+    def _transacao(self):
+        with self._trava:
+            con = self._conexao()
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                yield con
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+
+    def _incluir_colunas_novas(self):
+        # Bases criadas antes de uma coluna existir: CREATE TABLE IF NOT EXISTS não a acrescenta
+        con = self._conexao()
+        for aba, colunas in COLUNAS_POR_ABA.items():
+            existentes = {linha[1] for linha in con.execute(f"PRAGMA table_info({aba})")}
+            for coluna in colunas:
+                if coluna not in existentes:
+                    con.execute(f"ALTER TABLE {aba} ADD COLUMN {coluna} TEXT")
+
+    def _reconstruir_cubo_se_vazio(self):
+        # Bases criadas antes do cubo existir: monta o cubo uma vez a partir dos lançamentos
+        con = self._conexao()
+        if con.execute("SELECT 1 FROM cubo_mensal LIMIT 1").fetchone(): return
+        if not con.execute("SELECT 1 FROM lancamentos LIMIT 1").fetchone(): return
+        with self._transacao() as con:
+            con.execute(SQL_RECONSTRUIR_CUBO)
+
+    def _reconstruir_particoes_se_vazio(self):
+        # Bases criadas antes das partições; a versão da aba sobe junto, para não repetir a de nenhuma partição
+        con = self._conexao()
+        if con.execute("SELECT 1 FROM particoes LIMIT 1").fetchone(): return
+        if not con.execute("SELECT 1 FROM lancamentos LIMIT 1").fetchone(): return
+        with self._transacao() as con:
+            for sql in SQL_RECONSTRUIR_PARTICOES:
+                con.execute(sql)
+            self._nova_versao(con, "lancamentos")
+
+    def _nova_versao(self, con, aba, ids=None):
+        """Sobe a versão da aba registrando os ids alterados (None: a aba inteira mudou)."""
+        versao = con.execute(
+            "INSERT INTO versoes (aba, versao) VALUES (?, 1) ON CONFLICT(aba) DO UPDATE SET versao = versao + 1 RETURNING versao",
+            (aba,)
+        ).fetchone()[0]
+        ids = None if ids is None else list(ids)
+        if ids is None or len(ids) > MAX_IDS_POR_VERSAO:
+            con.execute("INSERT INTO alteracoes (aba, versao, id) VALUES (?, ?, NULL)", (aba, versao))
+        else:
+            con.executemany("INSERT INTO alteracoes (aba, versao, id) VALUES (?, ?, ?)", [(aba, versao, i) for i in ids])
+        con.execute("DELETE FROM alteracoes WHERE aba = ? AND versao <= ?", (aba, versao - VERSOES_NO_REGISTRO))
+
+    def versao(self, aba):
+        """Número que muda a cada alteração da aba; serve de chave para os caches do app."""
+        linha = self._conexao().execute("SELECT versao FROM versoes WHERE aba = ?", (aba,)).fetchone()
+        return linha[0] if linha else 0
+
+    def assinatura(self, aba):
+        """Versão da aba que não se repete entre bases diferentes (ex.: depois de apagar o arquivo local)."""
+        return f"{self.id_base}-{self.versao(aba)}"
+
+    def ids_alterados(self, aba, de, ate):
+        """Ids alterados da versão `de` (exclusive) até `ate`.
+
+        None quando alguma dessas versões trocou a aba inteira ou já saiu do registro.
+        """
+        linhas = self._conexao().execute(
+            "SELECT versao, id FROM alteracoes WHERE aba = ? AND versao > ? AND versao <= ?", (aba, de, ate)
+        ).fetchall()
+        if len({versao for versao, _ in linhas}) != ate - de or any(i is None for _, i in linhas):
+            return None
+        return {i for _, i in linhas}
+
+    def _pendencia(self, con, aba, operacao, dados, ids=None):
+        # Toda alteração local gera uma pendência, então a versão da aba sobe aqui
+        self._nova_versao(con, aba, ids)
+        con.execute(
+            "INSERT INTO pendencias_sync (aba, operacao, dados) VALUES (?, ?, ?)",
+            (aba, operacao, json.dumps(dados, default=str))
+        )
+        if self._sincronizador is not None:
+            self._sincronizador.acordar.set()
+
+    # === CARGA A PARTIR DA PLANILHA ===
+    def aba_carregada(self, aba):
+        return self._conexao().execute("SELECT 1 FROM abas_carregadas WHERE aba = ?", (aba,)).fetchone() is not None
+
+    def garantir_carregada(self, aba):
+        if not self.aba_carregada(aba):
+            self.carregar_da_planilha(aba)
+
+    def carregar_da_planilha(self, aba, somente_se_mudou=False):
+        """Substitui a cópia local da aba pelo conteúdo atual da planilha.
+
+        Com `somente_se_mudou`, nada é feito se a planilha está igual à da última carga ou se a aba
+        tem gravações locais ainda não enviadas, e nos lançamentos já carregados só as linhas que
+        mudaram são aplicadas. Devolve se a cópia local foi alterada.
+        """
+        colunas = COLUNAS_POR_ABA[aba]
+        try:
+            df = self.planilha.ler(aba, ttl=0)
+        except KeyError:
+            if aba not in ABAS_OPCIONAIS: raise
+            df = pd.DataFrame(columns=colunas)
+        impressao = _impressao(df)
+        # Só vale enquanto a aba não mudou aqui: uma gravação local desfeita lá deixa a planilha igual
+        if somente_se_mudou and f"{self.versao(aba)}:{impressao}" == self._impressao_salva(aba):
+            return False
+        preencher_ids = None
+        if aba == "lancamentos":
+            if COLUNA_ID not in df.columns:
+                df[COLUNA_ID] = None
+            sem_id = df[COLUNA_ID].isna() | (df[COLUNA_ID].astype(str).str.strip() == "")
+            if sem_id.any():
+                # Linhas antigas recebem id uma única vez; a planilha é atualizada pela sincronização
+                df = df.copy()
+                df.loc[sem_id, COLUNA_ID] = [gerar_id() for _ in range(int(sem_id.sum()))]
+                preencher_ids = df[COLUNA_ID].tolist()
+            df = _normalizar_lancamentos(df).dropna(subset=[COLUNA_ID])
+            if somente_se_mudou and not preencher_ids and self.aba_carregada(aba):
+                return self._aplicar_diferencas(df, impressao)
+        else:
+            df = df.reindex(columns=colunas).dropna(how="all")
+            if aba == "conciliacoes":
+                df[["conta", "fitid"]] = df[["conta", "fitid"]].fillna("").astype(str)
+
+        with self._transacao() as con:
+            if somente_se_mudou and con.execute("SELECT 1 FROM pendencias_sync WHERE aba = ? LIMIT 1", (aba,)).fetchone():
+                # Gravações locais feitas durante o download: a planilha baixada já está desatualizada
+                return False
+            if aba == "lancamentos":
+                self._hashes_planilha.pop(aba, None)
+                for nome in GATILHOS:
+                    con.execute(f"DROP TRIGGER IF EXISTS {nome}")
+            con.execute(f"DELETE FROM {aba}")
+            con.executemany(
+                f"INSERT OR REPLACE INTO {aba} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+                _registros(df, colunas)
+            )
+            if aba == "lancamentos":
+                con.execute("DELETE FROM cubo_mensal")
+                con.execute(SQL_RECONSTRUIR_CUBO)
+                for sql in SQL_RECONSTRUIR_PARTICOES:
+                    con.execute(sql)
+                for sql in GATILHOS.values():
+                    con.execute(sql)
+            con.execute(
+                "INSERT OR REPLACE INTO abas_carregadas (aba, carregada_em) VALUES (?, ?)",
+                (aba, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            # Uma única versão nova por carga (a pendência dos ids também sobe a versão)
+            if preencher_ids:
+                self._pendencia(con, aba, "preencher_coluna", {"coluna": COLUNA_ID, "valores": preencher_ids})
+            else:
+                self._nova_versao(con, aba)
+            self._guardar_impressao(con, aba, impressao)
+        return True
+
+    def _aplicar_diferencas(self, df, impressao):
+        """Leva para a base local só os lançamentos incluídos, alterados ou excluídos na planilha."""
+        df = df.drop_duplicates(subset=[COLUNA_ID], keep="last").reset_index(drop=True)
+        versao = self.versao("lancamentos")
+        # Leituras fora da transação; se a base mudar enquanto isso, fica para a próxima revalidação
+        remotas = _hashes_linhas(df)
+        # Planilha na revalidação anterior e o que mudou na base desde então
+        versao_anterior, anteriores = self._hashes_planilha.get("lancamentos", (None, None))
+        alterados_aqui = None if anteriores is None else self.ids_alterados("lancamentos", versao_anterior, versao)
+        if alterados_aqui is None:
+            # Logo após iniciar (ou depois de uma troca completa): compara com a cópia local inteira
+            locais = _hashes_linhas(pd.read_sql_query(f"SELECT {', '.join(COLUNAS_LANCAMENTOS)} FROM lancamentos", self._conexao()))
+            candidatas = np.ones(len(df), dtype=bool)
+        else:
+            # Só as linhas que mudaram na planilha ou na base desde a revalidação anterior são
+            # conferidas; as gravações do próprio app voltam iguais ao que já está aqui e são descartadas
+            na_anterior = anteriores.index.get_indexer(remotas.index)
+            candidatas = na_anterior == -1
+            candidatas[~candidatas] = remotas.to_numpy()[~candidatas] != anteriores.to_numpy()[na_anterior[~candidatas]]
+            candidatas |= pd.Index(list(alterados_aqui)).get_indexer(remotas.index) >= 0
+            conhecidas = anteriores.index.append(pd.Index(list(alterados_aqui)))
+            sumidas = conhecidas[remotas.index.get_indexer(conhecidas) == -1].unique()
+            locais = _hashes_linhas(self.ler_lancamentos_por_id([*df.loc[candidatas, COLUNA_ID], *sumidas]))
+        na_base = locais.index.get_indexer(remotas.index)
+        incluidos = df[candidatas & (na_base == -1)]
+        diferentes = np.zeros(len(df), dtype=bool)
+        existe = candidatas & (na_base >= 0)
+        diferentes[existe] = remotas.to_numpy()[existe] != locais.to_numpy()[na_base[existe]]
+        alterados = df[diferentes]
+        if alterados_aqui is None:
+            excluidos = locais.index[remotas.index.get_indexer(locais.index) == -1].tolist()
+        else:
+            excluidos = [i for i in sumidas if i in locais.index]
+
+        demais = [c for c in COLUNAS_LANCAMENTOS if c != COLUNA_ID]
+        with self._transacao() as con:
+            if con.execute("SELECT 1 FROM pendencias_sync WHERE aba = 'lancamentos' LIMIT 1").fetchone():
+                return False
+            if self.versao("lancamentos") != versao:
+                return False
+            if incluidos.empty and alterados.empty and not excluidos:
+                self._guardar_impressao(con, "lancamentos", impressao)
+                self._hashes_planilha["lancamentos"] = (versao, remotas)
+                return False
+            con.executemany(
+                f"INSERT INTO lancamentos ({', '.join(COLUNAS_LANCAMENTOS)}) VALUES ({', '.join('?' * len(COLUNAS_LANCAMENTOS))})",
+                _registros(incluidos, COLUNAS_LANCAMENTOS)
+            )
+            con.executemany(
+                f"UPDATE lancamentos SET {', '.join(f'{c} = ?' for c in demais)} WHERE id = ?",
+                _registros(alterados, demais + [COLUNA_ID])
+            )
+            con.executemany("DELETE FROM lancamentos WHERE id = ?", [(i,) for i in excluidos])
+            con.execute(
+                "INSERT OR REPLACE INTO abas_carregadas (aba, carregada_em) VALUES ('lancamentos', ?)",
+                (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),)
+            )
+            self._nova_versao(con, "lancamentos", [*incluidos[COLUNA_ID], *alterados[COLUNA_ID], *excluidos])
+            self._guardar_impressao(con, "lancamentos", impressao)
+            self._hashes_planilha["lancamentos"] = (self.versao("lancamentos"), remotas)
+        return True
+
+    def _guardar_impressao(self, con, aba, impressao):
+        con.execute(
+            "INSERT OR REPLACE INTO impressoes_planilha (aba, impressao) VALUES (?, ?)",
+            (aba, f"{self.versao(aba)}:{impressao}")
+        )
+
+    def _impressao_salva(self, aba):
+        linha = self._conexao().execute("SELECT impressao FROM impressoes_planilha WHERE aba = ?", (aba,)).fetchone()
+        return linha[0] if linha else None
+
+    def revalidar(self):
+        """Confere as abas já carregadas com a planilha e recarrega só as que mudaram lá.
+
+        Se o marcador de revisão da planilha é o mesmo da última revalidação, nada é baixado.
+        Devolve as abas recarregadas. Abas com gravações pendentes ficam para a próxima vez.
+        """
+        revisao = self.planilha.ultima_alteracao()
+        if revisao is not None and revisao == self._valor_base("revisao_planilha"):
+            return []
+        abas = [linha[0] for linha in self._conexao().execute("SELECT aba FROM abas_carregadas ORDER BY aba")]
+        recarregadas = [aba for aba in abas if aba in COLUNAS_POR_ABA and self.carregar_da_planilha(aba, somente_se_mudou=True)]
+        # Com pendências, alguma aba pode ter ficado para depois; o envio delas muda a revisão de qualquer forma
+        if revisao is not None and not self.qtd_pendencias():
+            self._guardar_revisao(revisao)
+        return recarregadas
+
+    def _guardar_revisao(self, revisao):
+        with self._trava:
+            self._conexao().execute("INSERT OR REPLACE INTO base (chave, valor) VALUES ('revisao_planilha', ?)", (revisao,))
+
+    def _valor_base(self, chave):
+        linha = self._conexao().execute("SELECT valor FROM base WHERE chave = ?", (chave,)).fetchone()
+        return linha[0] if linha else None
+
+    def recarregar_da_planilha(self, abas):
+        """Baixa novamente as abas. Só é feito sem pendências, para não perder gravações locais."""
+        if self.qtd_pendencias():
+            return False
+        for aba in abas:
+            self.carregar_da_planilha(aba)
+        return True
+
+    # === LEITURAS ===
+    def ler(self, aba):
+        self.garantir_carregada(aba)
+        colunas = COLUNAS_POR_ABA[aba]
+        return pd.read_sql_query(f"SELECT {', '.join(colunas)} FROM {aba} ORDER BY rowid", self._conexao())
+
+    def particoes(self):
+        """Anos de competência com lançamentos: versão, quantidade e faixa de datas de liquidação."""
+        self.garantir_carregada("lancamentos")
+        return pd.read_sql_query(
+            "SELECT ano, versao, qtd, liquidacao_min, liquidacao_max FROM particoes WHERE qtd > 0 ORDER BY ano",
+            self._conexao()
+        )
+
+    def ler_particoes(self, anos):
+        """Lançamentos dos anos de competência informados, na ordem da base."""
+        self.garantir_carregada("lancamentos")
+        anos = list(anos)
+        return pd.read_sql_query(
+            f"SELECT {', '.join(COLUNAS_LANCAMENTOS)} FROM lancamentos WHERE {ANO_PARTICAO} IN ({', '.join('?' * len(anos))}) ORDER BY rowid",
+            self._conexao(), params=anos
+        )
+
+    def ler_lancamentos_por_id(self, ids, anos=None):
+        """Lançamentos dos ids informados (os que ainda existem), na ordem da base.
+
+        Com `anos`, só os que estão nessas partições.
+        """
+        self.garantir_carregada("lancamentos")
+        ids = list(ids)
+        filtro_anos, parametros_anos = "", []
+        if anos is not None:
+            parametros_anos = list(anos)
+            filtro_anos = f" AND {ANO_PARTICAO} IN ({', '.join('?' * len(parametros_anos))})"
+        # Em lotes, abaixo do limite de parâmetros por consulta do SQLite
+        partes = [
+            pd.read_sql_query(
+                f"SELECT rowid AS ordem, {', '.join(COLUNAS_LANCAMENTOS)} FROM lancamentos "
+                f"WHERE id IN ({', '.join('?' * len(lote))}){filtro_anos}",
+                self._conexao(), params=[*lote, *parametros_anos]
+            )
+            for lote in (ids[i:i + 900] for i in range(0, len(ids), 900))
+        ]
+        if not partes:
+            return pd.DataFrame(columns=COLUNAS_LANCAMENTOS)
+        return pd.concat(partes).sort_values("ordem").drop(columns="ordem").reset_index(drop=True)
+
+    def ler_cubo(self):
+        """Cubo mensal com valor em reais; textos vazios voltam como nulos."""
+        self.garantir_carregada("lancamentos")
+        cubo = pd.read_sql_query(
+            "SELECT competencia, tipo, categoria, fornecedor, status, soma_centavos, qtd FROM cubo_mensal",
+            self._conexao()
+        )
+        cubo["valor"] = cubo.pop("soma_centavos") / 100
+        chaves = ["competencia", "tipo", "categoria", "fornecedor", "status"]
+        cubo[chaves] = cubo[chaves].replace("", None)
+        return cubo
+
+    def limites_data_liquidacao(self):
+        self.garantir_carregada("lancamentos")
+        return self._conexao().execute(
+            "SELECT MIN(data_liquidacao), MAX(data_liquidacao) FROM lancamentos WHERE data_liquidacao LIKE '____-__-__'"
+        ).fetchone()
+
+    def consultar_lancamentos(self, tipo=None, status=None, data_de=None, data_ate=None,
+                              competencia_de=None, competencia_ate=None, fornecedor=None, anos=None):
+        """Consulta indexada de lançamentos; datas em 'AAAA-MM-DD', competências em 'AAAA-MM' e
+        `anos` (partições) como lista de 'AAAA'."""
+        self.garantir_carregada("lancamentos")
+        condicoes, parametros = [], []
+        for coluna, operador, valor in (
+            ("tipo", "=", tipo), ("status", "=", status), ("fornecedor", "=", fornecedor),
+            ("data_liquidacao", ">=", data_de), ("data_liquidacao", "<=", data_ate),
+            ("competencia", ">=", competencia_de), ("competencia", "<=", competencia_ate),
+        ):
+            if valor is not None:
+                condicoes.append(f"{coluna} {operador} ?")
+                parametros.append(str(valor))
+        if anos is not None:
+            anos = list(anos)
+            condicoes.append(f"{ANO_PARTICAO} IN ({', '.join('?' * len(anos))})")
+            parametros.extend(anos)
+        sql = f"SELECT {', '.join(COLUNAS_LANCAMENTOS)} FROM lancamentos"
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicoes)
+        return pd.read_sql_query(sql + " ORDER BY rowid", self._conexao(), params=parametros)
+
+    # === GRAVAÇÕES ===
+    def anexar(self, aba, df):
+        if df.empty: return
+        self.garantir_carregada(aba)
+        colunas = COLUNAS_POR_ABA[aba]
+        if aba == "lancamentos":
+            df = _normalizar_lancamentos(df)
+        with self._transacao() as con:
+            con.executemany(
+                f"INSERT INTO {aba} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+                _registros(df, colunas)
+            )
+            ids = df[COLUNA_ID] if COLUNA_ID in df.columns else None
+            self._pendencia(
+                con, aba, "anexar", json.loads(df.reindex(columns=colunas).to_json(orient="records")),
+                ids=None if ids is None or ids.isna().any() else ids.tolist()
+            )
+
+    def salvar_lancamentos(self, df):
+        """Grava lançamentos novos com ids gerados aqui (caminho de gravação do app). Devolve os ids, na ordem das linhas."""
+        df = df.copy()
+        df.insert(0, COLUNA_ID, [gerar_id() for _ in range(len(df))])
+        self.anexar("lancamentos", df)
+        return df[COLUNA_ID].tolist()
+
+    def atualizar_lancamentos(self, atualizacoes):
+        """{id: {coluna: valor}} -> devolve os ids que não existem na base."""
+        self.garantir_carregada("lancamentos")
+        nao_encontrados = []
+        with self._transacao() as con:
+            for id_lanc, dados in atualizacoes.items():
+                dados = {c: v for c, v in dados.items() if c in COLUNAS_LANCAMENTOS and c != COLUNA_ID}
+                if not dados: continue
+                cursor = con.execute(
+                    f"UPDATE lancamentos SET {', '.join(f'{c} = ?' for c in dados)} WHERE id = ?",
+                    [*dados.values(), id_lanc]
+                )
+                if cursor.rowcount == 0:
+                    nao_encontrados.append(id_lanc)
+            encontrados = {i: d for i, d in atualizacoes.items() if i not in nao_encontrados}
+            if encontrados:
+                self._pendencia(con, "lancamentos", "atualizar", encontrados, ids=encontrados)
+        return nao_encontrados
+
+    def excluir_lancamentos(self, ids):
+        self.garantir_carregada("lancamentos")
+        ids = list(ids)
+        with self._transacao() as con:
+            existentes = {
+                linha[0] for linha in con.execute(
+                    f"SELECT id FROM lancamentos WHERE id IN ({', '.join('?' * len(ids))})", ids
+                )
+            } if ids else set()
+            if existentes:
+                con.executemany("DELETE FROM lancamentos WHERE id = ?", [(i,) for i in existentes])
+                self._pendencia(con, "lancamentos", "excluir", sorted(existentes), ids=existentes)
+        return [i for i in ids if i not in existentes]
+
+    def substituir(self, aba, df):
+        """Troca a tabela inteira (usado pelos editores de fornecedores e categorias)."""
+        colunas = COLUNAS_POR_ABA[aba]
+        df = df.reindex(columns=colunas)
+        with self._transacao() as con:
+            con.execute(f"DELETE FROM {aba}")
+            con.executemany(
+                f"INSERT INTO {aba} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+                _registros(df, colunas)
+            )
+            con.execute(
+                "INSERT OR REPLACE INTO abas_carregadas (aba, carregada_em) VALUES (?, ?)",
+                (aba, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            self._pendencia(con, aba, "substituir", json.loads(df.to_json(orient="records")))
+
+    # === SINCRONIZAÇÃO COM A PLANILHA ===
+    def qtd_pendencias(self):
+        return self._conexao().execute("SELECT COUNT(*) FROM pendencias_sync").fetchone()[0]
+
+    def status_sincronizacao(self):
+        pendentes, tentativas = self._conexao().execute(
+            "SELECT COUNT(*), COALESCE(MAX(tentativas), 0) FROM pendencias_sync"
+        ).fetchone()
+        erro = self._conexao().execute(
+            "SELECT erro FROM pendencias_sync WHERE erro IS NOT NULL ORDER BY seq LIMIT 1"
+        ).fetchone()
+        return {
+            "pendentes": pendentes,
+            "tentativas": tentativas,
+            "erro": erro[0] if erro else None,
+            "ultimo_envio": self.ultimo_envio,
+        }
+
+    def compactar_pendencias(self):
+        """Reescreve a fila de pendências já compactada. Devolve quantas pendências restaram."""
+        with self._transacao() as con:
+            linhas = con.execute("SELECT seq, aba, operacao, dados, tentativas, erro FROM pendencias_sync ORDER BY seq").fetchall()
+            if len(linhas) < 2:
+                return len(linhas)
+            lotes = _compactar([(aba, operacao, json.loads(dados)) for _, aba, operacao, dados, _, _ in linhas])
+            if len(lotes) >= len(linhas):
+                return len(linhas)
+            tentativas = max(linha[4] for linha in linhas)
+            erro = next((linha[5] for linha in linhas if linha[5]), None)
+            con.execute("DELETE FROM pendencias_sync")
+            for posicao, (aba, operacao, dados) in enumerate(lotes):
+                con.execute(
+                    "INSERT INTO pendencias_sync (aba, operacao, dados, tentativas, erro) VALUES (?, ?, ?, ?, ?)",
+                    (aba, operacao, json.dumps(dados, default=str), tentativas if posicao == 0 else 0, erro if posicao == 0 else None)
+                )
+            return len(lotes)
+
+    def _aplicar_na_planilha(self, aba, operacao, dados):
+        if operacao == "anexar":
+            self.planilha.anexar_linhas(aba, pd.DataFrame(dados, columns=COLUNAS_POR_ABA[aba]))
+        elif operacao == "atualizar":
+            self.planilha.atualizar_por_id(aba, dados)
+        elif operacao == "excluir":
+            self.planilha.excluir_por_id(aba, dados)
+        elif operacao == "substituir":
+            self.planilha.sobrescrever(aba, pd.DataFrame(dados, columns=COLUNAS_POR_ABA[aba]))
+        elif operacao == "preencher_coluna":
+            self.planilha.preencher_coluna(aba, dados["coluna"], dados["valores"])
+        else:
+            raise ValueError(f"Operação de sincronização desconhecida: {operacao}")
+
+    def sincronizar_pendencias(self):
+        """Envia as pendências para a planilha, da mais antiga para a mais nova.
+
+        Os envios também mudam o marcador de revisão da planilha. Se ela não tinha mudado por fora
+        desde a última revalidação, o marcador novo é guardado: a revalidação seguinte só baixa as
+        abas quando outra pessoa alterar a planilha.
+        """
+        self.compactar_pendencias()
+        con = self._conexao()
+        pendencias = con.execute("SELECT seq, aba, operacao, dados FROM pendencias_sync ORDER BY seq").fetchall()
+        if not pendencias: return 0
+        revisao = self.planilha.ultima_alteracao()
+        sem_mudanca_externa = revisao is not None and revisao == self._valor_base("revisao_planilha")
+        enviadas = 0
+        for seq, aba, operacao, dados in pendencias:
+            try:
+                self._aplicar_na_planilha(aba, operacao, json.loads(dados))
+            except Exception as e:
+                with self._trava:
+                    con.execute(
+                        "UPDATE pendencias_sync SET tentativas = tentativas + 1, erro = ? WHERE seq = ?",
+                        (str(e), seq)
+                    )
+                raise
+            with self._trava:
+                con.execute("DELETE FROM pendencias_sync WHERE seq = ?", (seq,))
+            enviadas += 1
+            self.ultimo_envio = datetime.now()
+        if sem_mudanca_externa:
+            self._guardar_revisao(self.planilha.ultima_alteracao())
+        return enviadas
+
+    def sincronizar_agora(self):
+        if self._sincronizador is not None:
+            self._sincronizador.acordar.set()
+
+    def iniciar_sincronizacao(self, intervalo=5, agrupamento=1.0, revalidacao=60):
+        nome = f"sincronizacao:{self.caminho}"
+        # Um recarregamento do app não pode deixar duas threads enviando as mesmas pendências
+        for thread in threading.enumerate():
+            if thread.name == nome and isinstance(thread, _Sincronizador):
+                thread.parar.set()
+                thread.acordar.set()
+                thread.join(timeout=30)
+        self._sincronizador = _Sincronizador(self, nome, intervalo, agrupamento, revalidacao)
+        self._sincronizador.start()
+
+
+class _Sincronizador(threading.Thread):
+    def __init__(self, repositorio, nome, intervalo, agrupamento, revalidacao):
+        super().__init__(name=nome, daemon=True)
+        self.repositorio = repositorio
+        self.intervalo = intervalo
+        self.agrupamento = agrupamento
+        # A cada `revalidacao` segundos (e logo ao iniciar) confere se a planilha mudou por fora;
+        # sem mudança, custa só a consulta do marcador de revisão
+        self.revalidacao = revalidacao
+        self.ultima_revalidacao = None
+        self.acordar = threading.Event()
+        self.parar = threading.Event()
+
+    def run(self):
+        espera = self.intervalo
+        while not self.parar.is_set():
+            self.acordar.wait(espera)
+            self.acordar.clear()
+            # Espera um instante para que gravações em sequência saiam numa única chamada
+            if self.parar.wait(self.agrupamento): break
+            try:
+                self.repositorio.sincronizar_pendencias()
+                agora = time.monotonic()
+                if self.revalidacao and (self.ultima_revalidacao is None or agora - self.ultima_revalidacao >= self.revalidacao):
+                    self.ultima_revalidacao = agora
+                    self.repositorio.revalidar()
+                espera = self.intervalo
+            except Exception:
+                # Sem conexão ou cota excedida: tenta de novo com espera crescente
+                espera = min(espera * 2, 300)
@@ -0,0 +1,43 @@
+import io
+
+from ofx import ler_transacoes_ofx
+
+_SGML = """OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+ENCODING:USASCII
+CHARSET:1252
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS>
+<BANKACCTFROM><BANKID>001<BRANCHID>1234<ACCTID>56789-0</BANKACCTFROM>
+<BANKTRANLIST>
+{transacoes}
+</BANKTRANLIST>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+_TARIFA = "<STMTTRN><TRNTYPE>FEE<DTPOSTED>20240305<TRNAMT>-12.90<MEMO>TARIFA PACOTE</STMTTRN>"
+
+
+def _ler(texto):
+    return list(ler_transacoes_ofx(io.BytesIO(texto.encode("cp1252"))))
+
+
+def test_linhas_identicas_sem_fitid_continuam_separadas():
+    transacoes = _ler(_SGML.format(transacoes=_TARIFA * 2))
+    assert len(transacoes) == 2
+    primeira, segunda = (t.fitid for t in transacoes)
+    assert primeira.startswith("SEM-FITID-")
+    assert segunda == primeira + "-2"
+
+
+def test_fitid_sintetico_se_repete_no_reenvio():
+    extrato = _SGML.format(transacoes=_TARIFA * 2)
+    assert [t.fitid for t in _ler(extrato)] == [t.fitid for t in _ler(extrato)]
+
+
+def test_encoding_utf8_no_cabecalho_sgml_vale_sobre_charset_none():
+    extrato = _SGML.replace("ENCODING:USASCII", "ENCODING:UTF-8").replace("CHARSET:1252", "CHARSET:NONE")
+    extrato = extrato.format(transacoes=_TARIFA.replace("TARIFA PACOTE", "Café <NAME>Padaria São João"))
+    [transacao] = ler_transacoes_ofx(io.BytesIO(extrato.encode("utf-8")))
+    assert (transacao.memo, transacao.nome) == ("Café", "Padaria São João")